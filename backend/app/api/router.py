@@ -2,6 +2,7 @@ from fastapi import APIRouter
 from .routes.portfolio import router as portfolio_router
 from .routes.stocks import router as stocks_router
 from .routes.analysis import router as analysis_router
+from .routes.debug import router as debug_router
 
 # Create the main API router
 api_router = APIRouter()
@@ -10,3 +11,4 @@ api_router = APIRouter()
 api_router.include_router(portfolio_router, prefix="/portfolios", tags=["portfolios"])
 api_router.include_router(stocks_router, prefix="/stocks", tags=["stocks"])
 api_router.include_router(analysis_router, prefix="/analysis", tags=["analysis"])
+api_router.include_router(debug_router, prefix="/debug", tags=["debug"])
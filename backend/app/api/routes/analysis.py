@@ -1,21 +1,101 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
 from typing import Dict, Any, List, Optional
-from ...models.portfolio import Portfolio, PortfolioAnalysis
+from ...models.portfolio import Portfolio, PortfolioAnalysis, StressTestRequest, WhatIfRequest
 from ...services.analysis_service import (
     analyze_portfolio_service,
+    get_risk_model_service,
+    get_simulated_var_service,
+    get_rolling_metrics_service,
+    get_drawdowns_service,
+    get_series_export_service,
+    run_stress_test_service,
+    what_if_analysis_service,
     mock_analyze_portfolio_service
 )
+from ...utils.stress_test import PREDEFINED_SCENARIOS
+from ...utils.series_export import (
+    SERIES_FORMATS, MEDIA_TYPES, FILE_EXTENSIONS, ExportFormatUnavailableError, export_series
+)
+from ...utils.monte_carlo import DEFAULT_SCENARIOS, MAX_SCENARIOS
+from ...utils.benchmarks import DEFAULT_BENCHMARK, BENCHMARK_NAMES, get_available_benchmarks, get_benchmark
+from ..timing import TimedRoute
 from datetime import datetime
 import logging
 
-router = APIRouter(prefix="/analysis", tags=["analysis"])
+router = APIRouter(prefix="/analysis", tags=["analysis"], route_class=TimedRoute)
+
+BENCHMARK_QUERY_DESCRIPTION = "Benchmark code (see /benchmarks)"
+
+def validate_benchmark(benchmark: str) -> str:
+    """检查基准代码是否已配置，返回标准化（大写）的代码"""
+    code = benchmark.strip().upper()
+    if code not in get_available_benchmarks():
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown benchmark: {benchmark}. Supported: {', '.join(get_available_benchmarks())}"
+        )
+    return code
+
+@router.get("/benchmarks", response_model=List[Dict[str, Any]])
+async def get_benchmarks():
+    """
+    获取可选基准列表及其数据范围
+    """
+    benchmarks = []
+    for code in get_available_benchmarks():
+        entry = get_benchmark(code)
+        benchmarks.append({
+            "code": code,
+            "name": BENCHMARK_NAMES.get(code, code),
+            "available": entry is not None,
+            "startDate": entry["dates"][0].strftime("%Y-%m-%d") if entry else None,
+            "endDate": entry["dates"][-1].strftime("%Y-%m-%d") if entry else None
+        })
+    return benchmarks
+
+@router.get("/stress/scenarios", response_model=List[Dict[str, Any]])
+async def get_stress_scenarios():
+    """
+    获取预定义的压力测试情景库
+    """
+    return PREDEFINED_SCENARIOS
+
+@router.post("/stress")
+async def run_stress_test(
+    request: StressTestRequest,
+    benchmark: str = Query(DEFAULT_BENCHMARK, description=BENCHMARK_QUERY_DESCRIPTION)
+):
+    """
+    压力测试：在因子冲击或历史情景重演下计算一个或多个组合的损益（未指定情景时运行全部预定义情景）
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("压力测试请求 - 组合: %s, 情景: %s", len(request.portfolio_ids) + len(request.portfolios),
+                len(request.scenario_ids) + len(request.scenarios))
+    
+    try:
+        return await run_stress_test_service(
+            request.portfolio_ids,
+            request.portfolios,
+            request.scenario_ids,
+            [scenario.dict() for scenario in request.scenarios],
+            request.horizon,
+            validate_benchmark(benchmark)
+        )
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/{portfolio_id}", response_model=PortfolioAnalysis)
-async def get_portfolio_analysis(portfolio_id: str):
+async def get_portfolio_analysis(
+    portfolio_id: str,
+    benchmark: str = Query(DEFAULT_BENCHMARK, description=BENCHMARK_QUERY_DESCRIPTION)
+):
     """
     获取投资组合分析数据，包括风险指标、资产配置、基准比较、因子暴露和历史趋势
     """
-    analysis = await analyze_portfolio_service(portfolio_id)
+    analysis = await analyze_portfolio_service(portfolio_id, benchmark=validate_benchmark(benchmark))
     if not analysis:
         raise HTTPException(status_code=404, detail=f"Portfolio with ID {portfolio_id} not found")
     return analysis
@@ -26,7 +106,7 @@ async def get_portfolio_risk_metrics(portfolio_id: str):
     获取投资组合的风险指标数据
     """
     logger = logging.getLogger(__name__)
-    logger.info(f"风险指标请求 - 组合ID: {portfolio_id}")
+    logger.info("风险指标请求 - 组合ID: %s", portfolio_id)
     
     analysis = await analyze_portfolio_service(portfolio_id)
     
@@ -34,36 +114,37 @@ async def get_portfolio_risk_metrics(portfolio_id: str):
         raise HTTPException(status_code=404, detail=f"Portfolio with ID {portfolio_id} not found")
     
     if not analysis.risk:
-        logger.error(f"组合 {portfolio_id} 没有可用的风险指标数据")
+        logger.error("组合 %s 没有可用的风险指标数据", portfolio_id)
         raise HTTPException(status_code=404, detail="Risk metrics data not available")
     
-    logger.info(f"成功获取组合 {portfolio_id} 的风险指标，指标数量: {len(analysis.risk)}")
+    logger.info("成功获取组合 %s 的风险指标，指标数量: %s", portfolio_id, len(analysis.risk))
     return analysis.risk
 
 @router.get("/{portfolio_id}/trends")
 async def get_portfolio_historical_trends(portfolio_id: str, 
                                       period: Optional[str] = Query("5year", 
-                                                                 description="Time period (ytd, 1year, 3year, 5year)")):
+                                                                 description="Time period (ytd, 1year, 3year, 5year)"),
+                                      benchmark: str = Query(DEFAULT_BENCHMARK, description=BENCHMARK_QUERY_DESCRIPTION)):
     """
     获取投资组合的历史趋势数据，用于图表展示
     """
     logger = logging.getLogger(__name__)
-    logger.info(f"历史趋势请求 - 组合ID: {portfolio_id}, 时间段: {period}")
+    logger.info("历史趋势请求 - 组合ID: %s, 时间段: %s", portfolio_id, period)
     
-    analysis = await analyze_portfolio_service(portfolio_id, period)
+    analysis = await analyze_portfolio_service(portfolio_id, period, validate_benchmark(benchmark))
     
     if not analysis:
         raise HTTPException(status_code=404, detail=f"Portfolio with ID {portfolio_id} not found")
     
     if not analysis.historical_trends:
-        logger.error(f"组合 {portfolio_id} 没有可用的历史趋势数据")
+        logger.error("组合 %s 没有可用的历史趋势数据", portfolio_id)
         raise HTTPException(status_code=404, detail="Historical trends data not available")
     
     # 获取月度收益和累计收益数据
     monthly_returns = analysis.historical_trends.get("monthlyReturns", [])
     cumulative_returns = analysis.historical_trends.get("cumulativeReturns", [])
     
-    logger.info(f"原始月度收益数据点: {len(monthly_returns)}个, 累计收益数据点: {len(cumulative_returns)}个")
+    logger.info("原始月度收益数据点: %s个, 累计收益数据点: %s个", len(monthly_returns), len(cumulative_returns))
     
     # 根据请求的时间段筛选数据
     # 考虑交易日：后端已根据交易日计算好合适的月份数量
@@ -95,7 +176,7 @@ async def get_portfolio_historical_trends(portfolio_id: str,
             filtered_monthly = monthly_returns
             filtered_cumulative = cumulative_returns
     
-    logger.info(f"筛选后月度收益数据点: {len(filtered_monthly)}个, 累计收益数据点: {len(filtered_cumulative)}个")
+    logger.info("筛选后月度收益数据点: %s个, 累计收益数据点: %s个", len(filtered_monthly), len(filtered_cumulative))
     
     return {
         "monthlyReturns": filtered_monthly,
@@ -108,7 +189,7 @@ async def get_portfolio_factor_exposure(portfolio_id: str):
     获取投资组合的因子暴露数据（风格、行业、国家等）
     """
     logger = logging.getLogger(__name__)
-    logger.info(f"因子暴露请求 - 组合ID: {portfolio_id}")
+    logger.info("因子暴露请求 - 组合ID: %s", portfolio_id)
     
     analysis = await analyze_portfolio_service(portfolio_id)
     
@@ -116,14 +197,163 @@ async def get_portfolio_factor_exposure(portfolio_id: str):
         raise HTTPException(status_code=404, detail=f"Portfolio with ID {portfolio_id} not found")
     
     if not analysis.factors:
-        logger.error(f"组合 {portfolio_id} 没有可用的因子暴露数据")
+        logger.error("组合 %s 没有可用的因子暴露数据", portfolio_id)
         # 尝试加载模拟数据
         from ...utils.market_data import get_mock_factor_exposure
         return get_mock_factor_exposure()
     
-    logger.info(f"成功获取组合 {portfolio_id} 的因子暴露数据")
+    logger.info("成功获取组合 %s 的因子暴露数据", portfolio_id)
     return analysis.factors
 
+@router.get("/{portfolio_id}/risk-model")
+async def get_portfolio_risk_model(portfolio_id: str):
+    """
+    获取投资组合的因子模型风险分解：总预测波动率、因子/特异风险拆分、
+    因子和资产的边际/成分风险贡献以及相对基准的跟踪误差
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("风险模型请求 - 组合ID: %s", portfolio_id)
+    
+    risk_model = await get_risk_model_service(portfolio_id)
+    if not risk_model:
+        raise HTTPException(status_code=404, detail=f"Portfolio with ID {portfolio_id} not found")
+    
+    return risk_model
+
+@router.get("/{portfolio_id}/var")
+async def get_portfolio_simulated_var(
+    portfolio_id: str,
+    scenarios: int = Query(DEFAULT_SCENARIOS, ge=100, le=MAX_SCENARIOS,
+                           description="Number of simulated scenarios (latency/accuracy trade-off)"),
+    horizon: int = Query(10, ge=1, le=252, description="Holding period in trading days"),
+    confidence: float = Query(0.95, gt=0.5, lt=1, description="Confidence level"),
+    mode: str = Query("historical", pattern="^(historical|parametric)$",
+                      description="Scenario generation: historical bootstrap or factor-model parametric"),
+    seed: Optional[int] = Query(None, ge=0, description="Random seed for reproducible results"),
+    benchmark: str = Query(DEFAULT_BENCHMARK, description=BENCHMARK_QUERY_DESCRIPTION)
+):
+    """
+    获取投资组合基于蒙特卡洛模拟的VaR/CVaR（预期损失）及基准对比
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("模拟VaR请求 - 组合ID: %s, 模式: %s, 情景数: %s, 持有期: %s", portfolio_id, mode, scenarios, horizon)
+    
+    result = await get_simulated_var_service(portfolio_id, scenarios, horizon, confidence, mode, seed,
+                                             validate_benchmark(benchmark))
+    if not result:
+        raise HTTPException(status_code=404, detail=f"Portfolio with ID {portfolio_id} not found")
+    
+    return result
+
+ROLLING_METRICS = ("return", "vol", "beta", "sharpe", "te")
+
+@router.get("/{portfolio_id}/rolling")
+async def get_portfolio_rolling_metrics(
+    portfolio_id: str,
+    window: int = Query(63, ge=2, le=1260, description="Rolling window in trading days"),
+    metrics: str = Query("vol,beta,sharpe,te", description=f"Comma-separated metrics: {', '.join(ROLLING_METRICS)}"),
+    points: Optional[int] = Query(None, ge=2, le=5000, description="Downsample the series to this many points"),
+    benchmark: str = Query(DEFAULT_BENCHMARK, description=BENCHMARK_QUERY_DESCRIPTION)
+):
+    """
+    获取投资组合的滚动风险与业绩指标（波动率、贝塔、夏普比率、跟踪误差等），用于图表展示
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("滚动指标请求 - 组合ID: %s, 窗口: %s, 指标: %s", portfolio_id, window, metrics)
+    
+    metric_list = [m.strip() for m in metrics.split(",") if m.strip()]
+    unknown = [m for m in metric_list if m not in ROLLING_METRICS]
+    if not metric_list or unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown metrics: {', '.join(unknown)}. Supported: {', '.join(ROLLING_METRICS)}"
+        )
+    
+    result = await get_rolling_metrics_service(portfolio_id, window, metric_list, points, validate_benchmark(benchmark))
+    if not result:
+        raise HTTPException(status_code=404, detail=f"Portfolio with ID {portfolio_id} not found")
+    
+    return result
+
+@router.get("/{portfolio_id}/series")
+async def get_portfolio_series(
+    portfolio_id: str,
+    format: str = Query("csv", description=f"Output format: {', '.join(SERIES_FORMATS)}"),
+    window: int = Query(63, ge=2, le=1260, description="Rolling window in trading days"),
+    metrics: str = Query("vol,beta,sharpe,te", description=f"Comma-separated rolling metrics: {', '.join(ROLLING_METRICS)}"),
+    benchmark: str = Query(DEFAULT_BENCHMARK, description=BENCHMARK_QUERY_DESCRIPTION)
+):
+    """
+    以列式格式（csv、Arrow IPC 流或 Parquet）导出组合日收益、基准收益、净值和滚动指标，供下游量化分析使用
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("时间序列导出请求 - 组合ID: %s, 格式: %s, 窗口: %s", portfolio_id, format, window)
+    
+    format = format.strip().lower()
+    if format not in SERIES_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}. Supported: {', '.join(SERIES_FORMATS)}")
+    metric_list = [m.strip() for m in metrics.split(",") if m.strip()]
+    unknown = [m for m in metric_list if m not in ROLLING_METRICS]
+    if not metric_list or unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown metrics: {', '.join(unknown)}. Supported: {', '.join(ROLLING_METRICS)}"
+        )
+    
+    columns = await get_series_export_service(portfolio_id, window, metric_list, validate_benchmark(benchmark))
+    if columns is None:
+        raise HTTPException(status_code=404, detail=f"Portfolio with ID {portfolio_id} not found")
+    
+    try:
+        chunks = export_series(columns, format)
+    except ExportFormatUnavailableError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    
+    filename = f"{portfolio_id}_series.{FILE_EXTENSIONS[format]}"
+    return StreamingResponse(chunks, media_type=MEDIA_TYPES[format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@router.get("/{portfolio_id}/drawdowns")
+async def get_portfolio_drawdowns(
+    portfolio_id: str,
+    top: int = Query(5, ge=1, le=50, description="Number of worst drawdown episodes to return"),
+    points: Optional[int] = Query(None, ge=2, le=5000, description="Downsample the underwater series to this many points"),
+    benchmark: str = Query(DEFAULT_BENCHMARK, description=BENCHMARK_QUERY_DESCRIPTION)
+):
+    """
+    获取投资组合与基准的回撤分析：最大回撤、持续时间、恢复时间和最深的回撤区间
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("回撤分析请求 - 组合ID: %s, 区间数: %s", portfolio_id, top)
+    
+    result = await get_drawdowns_service(portfolio_id, top, points, validate_benchmark(benchmark))
+    if not result:
+        raise HTTPException(status_code=404, detail=f"Portfolio with ID {portfolio_id} not found")
+    
+    return result
+
+@router.post("/{portfolio_id}/what-if")
+async def get_portfolio_what_if(
+    portfolio_id: str,
+    request: WhatIfRequest,
+    benchmark: str = Query(DEFAULT_BENCHMARK, description=BENCHMARK_QUERY_DESCRIPTION)
+):
+    """
+    权重调整的增量分析：在缓存的组合状态上计算新权重下的业绩与风险，无需重新加载价格
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("增量分析请求 - 组合ID: %s, 目标权重: %s, 权重变化: %s", portfolio_id, request.weights, request.deltas)
+    
+    try:
+        result = await what_if_analysis_service(portfolio_id, request.weights, request.deltas,
+                                                validate_benchmark(benchmark))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not result:
+        raise HTTPException(status_code=404, detail=f"Portfolio with ID {portfolio_id} not found")
+    
+    return result
+
 @router.post("/mock", response_model=PortfolioAnalysis)
 async def mock_analyze_portfolio(portfolio: Portfolio):
     """Analyze a portfolio without saving it"""
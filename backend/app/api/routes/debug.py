@@ -0,0 +1,69 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import PlainTextResponse
+import asyncio
+import hmac
+import logging
+import os
+from ...utils.profiler import SamplingProfiler, ProfilerBusyError, DEFAULT_SAMPLE_INTERVAL_MS
+
+# 设置日志
+logger = logging.getLogger("app.api.routes.debug")
+
+# 调试接口的管理员令牌（请求头 X-Admin-Token），未配置时调试接口全部禁用
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+MAX_PROFILE_SECONDS = 60
+
+router = APIRouter()
+
+
+def is_admin_request(request: Request) -> bool:
+    """请求是否带有正确的管理员令牌（未配置 ADMIN_TOKEN 时始终为 False）"""
+    expected = os.environ.get("ADMIN_TOKEN")
+    provided = request.headers.get(ADMIN_TOKEN_HEADER)
+    if not expected or not provided:
+        return False
+    return hmac.compare_digest(provided.encode(), expected.encode())
+
+
+def require_admin(request: Request):
+    """Dependency that rejects requests without a valid admin token"""
+    if not os.environ.get("ADMIN_TOKEN"):
+        raise HTTPException(status_code=403, detail="Debug endpoints are disabled (ADMIN_TOKEN is not configured)")
+    if not is_admin_request(request):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+def profile_response(profiler: SamplingProfiler, **headers) -> PlainTextResponse:
+    """Collapsed-stack response with the sampling summary in X-Profile-* headers"""
+    summary = profiler.summary()
+    response_headers = {
+        "X-Profile-Samples": str(summary["samples"]),
+        "X-Profile-Idle-Samples": str(summary["idleSamples"]),
+        "X-Profile-Duration": str(summary["durationSeconds"]),
+        "X-Profile-Interval-Ms": str(summary["intervalMs"]),
+        **headers,
+    }
+    return PlainTextResponse(profiler.collapsed(), headers=response_headers)
+
+
+@router.post("/profile", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def profile_live_traffic(
+    seconds: float = Query(10, gt=0, le=MAX_PROFILE_SECONDS, description="Sampling duration in seconds"),
+    interval_ms: float = Query(DEFAULT_SAMPLE_INTERVAL_MS, ge=0.5, le=1000, description="Sampling interval"),
+    include_idle: bool = Query(False, description="Keep stacks of threads blocked waiting (IO, queues, locks, sleep)")
+):
+    """
+    Sample the stacks of all server threads for the given duration and return them in the
+    collapsed-stack format (one `frame;frame;... count` line per stack) for flamegraph tools
+    """
+    profiler = SamplingProfiler(interval_ms=interval_ms, include_idle=include_idle)
+    try:
+        profiler.start()
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.stop()
+    logger.info("Profiled live traffic for %ss: %s samples", seconds, profiler.samples)
+    return profile_response(profiler)
@@ -1,21 +1,25 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, UploadFile, File
+from fastapi.responses import JSONResponse
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import logging
-from ...models.portfolio import Portfolio, PortfolioInDB, PortfolioResponse, PortfolioAnalysis
+from ...models.portfolio import Portfolio, PortfolioInDB, PortfolioResponse, PortfolioAnalysis, OptimizeRequest
 from ...services.portfolio_service import (
     create_portfolio_service,
     get_portfolios_service,
     get_portfolio_service,
     update_portfolio_service,
-    delete_portfolio_service
+    delete_portfolio_service,
+    import_portfolios_service
 )
-from ...services.analysis_service import analyze_portfolio_service
+from ...utils.portfolio_import import IMPORT_FORMATS, ImportFormatUnavailableError, infer_format
+from ...services.analysis_service import analyze_portfolio_service, optimize_portfolio_service, get_frontier_service
+from ..timing import TimedRoute
 
 # 设置日志
 logger = logging.getLogger("app.api.routes.portfolio")
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 @router.get("/", response_model=List[PortfolioResponse])
 async def get_portfolios():
@@ -43,6 +47,46 @@ async def create_portfolio(portfolio: Portfolio):
     
     return await create_portfolio_service(portfolio)
 
+@router.post("/optimize")
+async def optimize_portfolio(request: OptimizeRequest):
+    """Optimize portfolio weights (min-variance, max-Sharpe or min tracking error) under constraints"""
+    logger.info("Portfolio optimization requested: objective=%s, portfolio=%s, symbols=%s, universe=%s",
+                request.objective, request.portfolio_id, len(request.symbols), request.universe)
+    try:
+        result = await optimize_portfolio_service(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not result:
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+    return result
+
+@router.post("/import")
+async def import_portfolios(
+    file: UploadFile = File(..., description="Long-format holdings file with portfolio, symbol and weight columns"),
+    format: Optional[str] = Query(None, description="File format (csv or parquet); inferred from the file name by default"),
+    atomic: bool = Query(False, description="Reject the whole file if any portfolio is invalid"),
+    dry_run: bool = Query(False, description="Validate only, do not save")
+):
+    """Bulk-create portfolios from a CSV/Parquet file, reporting validation errors per portfolio"""
+    format = (format or infer_format(file.filename)).lower()
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}. Supported: {', '.join(IMPORT_FORMATS)}")
+    data = await file.read()
+    logger.info("Portfolio import requested: file=%s, format=%s, bytes=%s, atomic=%s, dry_run=%s",
+                file.filename, format, len(data), atomic, dry_run)
+    try:
+        report = await import_portfolios_service(data, format, atomic=atomic, dry_run=dry_run)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ImportFormatUnavailableError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if report["errors"] and not report["committed"] and not dry_run:
+        # 有错误且没有写入任何组合（atomic 模式或全部无效）
+        return JSONResponse(status_code=422, content=report)
+    return report
+
 @router.put("/{portfolio_id}", response_model=PortfolioResponse)
 async def update_portfolio(portfolio_id: str, portfolio: Portfolio):
     """Update an existing portfolio"""
@@ -74,8 +118,24 @@ async def analyze_portfolio_compatibility(
     period: Optional[str] = Query("5year", description="Time period (ytd, 1year, 3year, 5year)")
 ):
     """Analyze a portfolio (backward compatibility endpoint)"""
-    logger.info(f"Portfolio analysis requested for {portfolio_id} with period: {period}")
+    logger.info("Portfolio analysis requested for %s with period: %s", portfolio_id, period)
     analysis = await analyze_portfolio_service(portfolio_id, period)
     if not analysis:
         raise HTTPException(status_code=404, detail="Portfolio not found or analysis failed")
-    return analysis 
\ No newline at end of file
+    return analysis 
+
+@router.get("/{portfolio_id}/frontier")
+async def get_portfolio_frontier(
+    portfolio_id: str,
+    points: int = Query(50, ge=2, le=200, description="Number of points on the frontier"),
+    max_weight: float = Query(1.0, gt=0, le=1, description="Maximum weight per stock")
+):
+    """Efficient frontier for the portfolio's stocks and where the portfolio sits relative to it"""
+    logger.info("Efficient frontier requested for %s: points=%s, max_weight=%s", portfolio_id, points, max_weight)
+    try:
+        result = await get_frontier_service(portfolio_id, points, max_weight)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not result:
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+    return result
@@ -4,8 +4,9 @@ from ...services.stocks_service import (
     get_available_stocks_service,
     get_stocks_data_service
 )
+from ..timing import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 @router.get("/available", response_model=List[Dict[str, Any]])
 async def get_available_stocks():
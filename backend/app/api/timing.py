@@ -0,0 +1,52 @@
+"""
+路由计时 - 区分接口函数本身的耗时和 FastAPI 的参数校验、响应序列化耗时
+
+使用 TimedRoute 作为路由类的接口会记录两个 span:
+    handler: 接口函数（含其中的各分析阶段）
+    serialize: 路由处理总耗时减去 handler，即请求解析、参数校验和响应模型序列化
+"""
+
+import time
+from functools import wraps
+
+from fastapi.routing import APIRoute
+
+from ..utils import timing
+
+
+def _timed_endpoint(endpoint):
+    # include_router 会用同一个接口函数重新创建路由，避免重复包装
+    if getattr(endpoint, "_timed", False):
+        return endpoint
+
+    @wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        if not timing.TIMING_ENABLED:
+            return await endpoint(*args, **kwargs)
+        with timing.span("handler"):
+            return await endpoint(*args, **kwargs)
+    wrapper._timed = True
+    return wrapper
+
+
+class TimedRoute(APIRoute):
+    """记录 handler 和 serialize 两个 span 的路由类（仅支持协程接口函数）"""
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            if not timing.TIMING_ENABLED:
+                return await handler(request)
+            before = timing.get_request_span("handler") or 0.0
+            start = time.perf_counter()
+            response = await handler(request)
+            elapsed = time.perf_counter() - start
+            endpoint_time = (timing.get_request_span("handler") or 0.0) - before
+            timing.record_span("serialize", max(elapsed - endpoint_time, 0.0))
+            return response
+
+        return timed_handler
@@ -0,0 +1,46 @@
+"""
+批量导入投资组合的命令行入口
+
+用法:
+    python -m app.import_portfolios holdings.csv
+    python -m app.import_portfolios holdings.parquet --atomic
+    python -m app.import_portfolios holdings.csv --dry-run
+
+输入文件格式见 app.utils.portfolio_import；结果报告以 JSON 输出到标准输出，
+有组合被拒绝时退出码为 1。
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+from .services.portfolio_service import import_portfolios_service
+from .utils.portfolio_import import IMPORT_FORMATS, ImportFormatUnavailableError, infer_format
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-import portfolios from a long-format holdings file")
+    parser.add_argument("file", type=Path, help="CSV or Parquet file with portfolio, symbol and weight columns")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="File format (default: inferred from the extension)")
+    parser.add_argument("--atomic", action="store_true", help="Import nothing if any portfolio is invalid")
+    parser.add_argument("--dry-run", action="store_true", help="Validate only, do not save")
+    args = parser.parse_args(argv)
+
+    try:
+        data = args.file.read_bytes()
+        report = asyncio.run(import_portfolios_service(
+            data, args.format or infer_format(args.file.name), atomic=args.atomic, dry_run=args.dry_run,
+        ))
+    except (OSError, ValueError, ImportFormatUnavailableError, RuntimeError) as e:
+        print(f"Import failed: {e}", file=sys.stderr)
+        return 2
+
+    json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+    print()
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,20 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import os
+import json
+import time
 import logging
 import logging.config
 from .api.router import api_router
+from .utils import timing
+from .utils.logging_config import enable_queue_logging
+from .utils.metrics import render_metrics
+from .utils.profiler import SamplingProfiler, ProfilerBusyError
+from .api.routes.debug import is_admin_request, profile_response
+from .utils.market_data_provider import start_background_refresh, stop_background_refresh
+from .utils.monte_carlo import shutdown_executor
 from dotenv import load_dotenv
 
 # 加载环境变量
@@ -12,6 +22,13 @@ load_dotenv()
 
 # 配置日志系统
 DEBUG_MODE = os.environ.get("DEBUG_MODE", "False").lower() == "true"
+# 日志输出格式：text 或 json（每行一个 JSON 对象）
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()
+# 日志处理器在后台线程中执行，请求路径上只做入队
+LOG_QUEUE = os.environ.get("LOG_QUEUE", "True").lower() == "true"
+# 重复消息采样：同一消息模板每个窗口（秒）内最多输出的条数，0 表示不采样
+LOG_SAMPLE_BURST = int(os.environ.get("LOG_SAMPLE_BURST", 5))
+LOG_SAMPLE_WINDOW = float(os.environ.get("LOG_SAMPLE_WINDOW", 60))
 
 # 配置日志
 logging_config = {
@@ -19,17 +36,30 @@ logging_config = {
     "disable_existing_loggers": False,
     "formatters": {
         "standard": {
+            "()": "app.utils.logging_config.TextFormatter",
             "format": "%(levelname)s:%(name)s:%(message)s"
         },
         "detailed": {
+            "()": "app.utils.logging_config.TextFormatter",
             "format": "%(asctime)s [%(levelname)s] %(name)s:%(message)s"
         },
+        "json": {
+            "()": "app.utils.logging_config.JsonFormatter"
+        },
+    },
+    "filters": {
+        "sampling": {
+            "()": "app.utils.logging_config.SamplingFilter",
+            "burst": LOG_SAMPLE_BURST,
+            "window": LOG_SAMPLE_WINDOW
+        },
     },
     "handlers": {
         "console": {
             "class": "logging.StreamHandler",
             "level": "INFO",
-            "formatter": "standard",
+            "formatter": "json" if LOG_FORMAT == "json" else "standard",
+            "filters": ["sampling"],
             "stream": "ext://sys.stdout"
         },
     },
@@ -53,6 +83,8 @@ logging_config = {
 
 # 应用日志配置
 logging.config.dictConfig(logging_config)
+if LOG_QUEUE:
+    enable_queue_logging(["", "app", "app.utils.market_data"])
 logger = logging.getLogger("app")
 
 # 显示应用程序启动信息
@@ -81,14 +113,83 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 单个请求的采样分析：管理员请求带 ?profile=1 时，返回该请求期间的折叠栈而不是原响应
+@app.middleware("http")
+async def request_profiling(request: Request, call_next):
+    if request.query_params.get("profile") != "1":
+        return await call_next(request)
+    if not is_admin_request(request):
+        return JSONResponse(status_code=403, content={"detail": "Admin token required for profiling"})
+    profiler = SamplingProfiler()
+    try:
+        profiler.start()
+    except ProfilerBusyError as e:
+        return JSONResponse(status_code=409, content={"detail": str(e)})
+    try:
+        response = await call_next(request)
+        # 读完响应体，使流式响应的生成也计入采样
+        async for _ in response.body_iterator:
+            pass
+    finally:
+        profiler.stop()
+    return profile_response(profiler, **{"X-Profile-Status": str(response.status_code)})
+
+# 请求计时：收集各阶段 span，写入 Server-Timing 响应头，慢请求记录结构化日志
+@app.middleware("http")
+async def request_timing(request: Request, call_next):
+    if not timing.TIMING_ENABLED:
+        return await call_next(request)
+    token = timing.start_request()
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        total_ms = (time.perf_counter() - start) * 1000
+        spans = timing.finish_request(token)
+    # 按路由模板统计延迟（未匹配的路径归为一类，避免标签数量无限增长）
+    route = request.scope.get("route")
+    timing.observe("request", total_ms, (("method", request.method),
+                                         ("route", getattr(route, "path", "unmatched"))))
+    response.headers["Server-Timing"] = timing.server_timing_header(spans, total_ms)
+    if total_ms > timing.SLOW_REQUEST_THRESHOLD_MS:
+        logging.getLogger("app.timing").warning(json.dumps({
+            "event": "slow_request",
+            "method": request.method,
+            "path": request.url.path,
+            "status": response.status_code,
+            "durationMs": round(total_ms, 3),
+            "thresholdMs": timing.SLOW_REQUEST_THRESHOLD_MS,
+            "spans": spans,
+        }, ensure_ascii=False))
+    return response
+
 # 注册API路由
 app.include_router(api_router, prefix="/api")
 
+# 行情数据后台刷新（远程行情请求只在后台任务中执行）
+@app.on_event("startup")
+async def start_market_data_refresh():
+    start_background_refresh()
+
+@app.on_event("shutdown")
+async def stop_market_data_refresh():
+    await stop_background_refresh()
+
+# 关闭蒙特卡洛模拟的共享进程池
+@app.on_event("shutdown")
+async def stop_simulation_pool():
+    shutdown_executor()
+
 # 健康检查端点
 @app.get("/api/health")
 async def health_check():
     return {"status": "ok", "message": "Server is running"}
 
+# Prometheus 指标端点
+@app.get("/api/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 3001))
     uvicorn.run("app.main:app", host="0.0.0.0", port=port, reload=True) 
\ No newline at end of file
@@ -99,4 +99,83 @@ class TickerData(BaseModel):
     sector: Optional[str] = None
     industry: Optional[str] = None
     country: Optional[str] = None
-    exchange: Optional[str] = None 
\ No newline at end of file
+    exchange: Optional[str] = None 
+
+class FactorShock(BaseModel):
+    factor: str = Field(..., description="Factor name, as in Factor_Covariance_Matrix.csv")
+    shock: float = Field(..., description="Shock size: standard deviations (sigma) or percent return (return)")
+    unit: str = Field("sigma", description="Shock unit", pattern="^(sigma|return)$")
+
+class StressScenario(BaseModel):
+    id: Optional[str] = Field(None, description="Scenario identifier")
+    name: Optional[str] = Field(None, description="Scenario name")
+    description: Optional[str] = Field(None, description="Scenario description")
+    type: str = Field("factor", description="Scenario type", pattern="^(factor|historical)$")
+    factorShocks: List[FactorShock] = Field(default_factory=list, description="Factor shocks")
+    sectorShocks: Dict[str, float] = Field(default_factory=dict, description="Sector price shocks in percent")
+    assetShocks: Dict[str, float] = Field(default_factory=dict, description="Single-stock price shocks in percent")
+    propagate: bool = Field(True, description="Propagate factor shocks to other factors through the covariance matrix")
+    startDate: Optional[str] = Field(None, description="Replay start date (historical scenarios)")
+    endDate: Optional[str] = Field(None, description="Replay end date (historical scenarios)")
+
+    @validator('endDate', always=True)
+    def validate_dates(cls, v, values):
+        if values.get('type') == 'historical' and (not v or not values.get('startDate')):
+            raise ValueError("Historical scenarios require startDate and endDate")
+        return v
+
+class StressTestRequest(BaseModel):
+    portfolio_ids: List[str] = Field(default_factory=list, description="Saved portfolio IDs")
+    portfolios: List[Portfolio] = Field(default_factory=list, description="Unsaved portfolios")
+    scenario_ids: List[str] = Field(default_factory=list, description="Predefined scenario IDs")
+    scenarios: List[StressScenario] = Field(default_factory=list, description="Custom scenarios")
+    horizon: int = Field(21, ge=1, le=252, description="Holding period in trading days for sigma shocks")
+
+    @validator('portfolios', always=True)
+    def validate_portfolios(cls, v, values):
+        if not v and not values.get('portfolio_ids'):
+            raise ValueError("At least one portfolio is required")
+        return v
+
+class WhatIfRequest(BaseModel):
+    weights: Dict[str, float] = Field(default_factory=dict, description="New target weights (0-1) for some tickers")
+    deltas: Dict[str, float] = Field(default_factory=dict, description="Weight changes (-1 to 1) for some tickers")
+
+    @validator('weights')
+    def validate_weights(cls, v):
+        if any(w < 0 or w > 1 for w in v.values()):
+            raise ValueError("Weight must be between 0 and 1")
+        return {symbol.upper(): w for symbol, w in v.items()}
+
+    @validator('deltas')
+    def validate_deltas(cls, v):
+        if any(d < -1 or d > 1 for d in v.values()):
+            raise ValueError("Weight change must be between -1 and 1")
+        return {symbol.upper(): d for symbol, d in v.items()}
+
+class OptimizeRequest(BaseModel):
+    objective: str = Field("min_variance", description="Optimization objective",
+                           pattern="^(min_variance|max_sharpe|min_tracking_error)$")
+    portfolio_id: Optional[str] = Field(None, description="Current portfolio: default universe and turnover reference")
+    symbols: List[str] = Field(default_factory=list, description="Candidate stocks (default: the current portfolio's stocks)")
+    universe: Optional[str] = Field(None, description="Add all benchmark constituents to the candidates", pattern="^benchmark$")
+    name: Optional[str] = Field(None, description="Name of the optimized portfolio")
+    max_weight: float = Field(1.0, description="Maximum weight per stock", gt=0, le=1)
+    sector_caps: Dict[str, float] = Field(default_factory=dict, description="Maximum weight per sector (0-1)")
+    turnover: Optional[float] = Field(None, description="Maximum turnover sum(|w - w0|) against the current portfolio", ge=0, le=2)
+    tracking_error_limit: Optional[float] = Field(None, description="Maximum annualized tracking error (decimal) for max_sharpe", gt=0)
+    expected_returns: Dict[str, float] = Field(default_factory=dict, description="Annualized expected return overrides (decimal)")
+
+    @validator('symbols')
+    def validate_symbols(cls, v):
+        return list(dict.fromkeys(symbol.upper() for symbol in v if symbol))
+
+    @validator('sector_caps')
+    def validate_sector_caps(cls, v):
+        if any(cap < 0 or cap > 1 for cap in v.values()):
+            raise ValueError("Sector cap must be between 0 and 1")
+        return v
+
+    @validator('expected_returns')
+    def validate_expected_returns(cls, v):
+        return {symbol.upper(): r for symbol, r in v.items()}
@@ -1,6 +1,8 @@
 """
 Analysis Service - Handles business logic for portfolio analysis operations
 """
+import asyncio
+from functools import partial
 import numpy as np
 import pandas as pd
 from typing import Dict, Any, List, Optional
@@ -8,24 +10,67 @@ from datetime import datetime, timedelta
 import random
 from pathlib import Path
 import logging
-from ..models.portfolio import Portfolio, PortfolioAnalysis
+from fastapi.concurrency import run_in_threadpool
+from ..models.portfolio import Portfolio, PortfolioAnalysis, Ticker
 from .portfolio_service import get_portfolio_service
-from .stocks_service import get_stock_history_service
+from .stocks_service import get_stock_history_service, PRICE_HISTORY_FILE
 import math
-from ..utils.market_data import get_portfolio_factor_exposure, get_real_asset_allocation
+from ..utils.market_data import get_portfolio_factor_exposure, get_real_asset_allocation, get_static_data, get_data_version
+from ..utils.risk_model import calculate_risk_decomposition, get_risk_model, get_portfolio_arrays
+from ..utils.timeseries import (
+    rolling_metrics,
+    downsample_index,
+    timeframe_performance,
+    aggregate_returns,
+    cumulative_returns,
+    drawdown_analysis,
+    drawdown_series,
+    TRADING_DAYS_PER_YEAR
+)
+from ..utils.benchmarks import DEFAULT_BENCHMARK, get_benchmark, benchmark_levels
+from ..utils.stress_test import (
+    DEFAULT_HORIZON,
+    PREDEFINED_SCENARIOS,
+    get_predefined_scenario,
+    stress_test_portfolios
+)
+from ..utils.what_if import build_base_state, apply_weight_delta, summarize_state
+from ..utils.optimizer import build_problem, optimize_portfolio, efficient_frontier, portfolio_statistics
+from ..utils.timing import span, timed
+from ..utils.series_export import build_series_columns
+from ..utils.corporate_actions import CORPORATE_ACTIONS_PATH, adjust_prices
+from ..utils.alignment import align_returns, portfolio_returns as aligned_portfolio_returns, filled_returns, common
+from ..utils.metrics import record_cache, register_cache_size
+from ..utils.monte_carlo import (
+    DEFAULT_SCENARIOS,
+    build_historical_params,
+    build_parametric_params,
+    calculate_simulated_var
+)
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# 价格数据中基准所在的列（所选基准统一放在该列）
+BENCHMARK_COLUMN = 'SPX'
+
+# 增量分析的基础状态缓存：(组合ID, 基准) -> 基础状态
+_what_if_cache = {}
+WHAT_IF_CACHE_SIZE = 32
+
+# 有效前沿缓存：(股票代码, 约束, 点数, 数据版本) -> 前沿
+_frontier_cache = {}
+FRONTIER_CACHE_SIZE = 32
+
+register_cache_size("what_if", lambda: len(_what_if_cache))
+register_cache_size("frontier", lambda: len(_frontier_cache))
+
 # Data path
 DATA_DIR = Path(__file__).parent.parent / "data"
 DATA_DIR.mkdir(exist_ok=True)
 
-async def analyze_portfolio_service(portfolio_id: str, period: str = "5year") -> Optional[PortfolioAnalysis]:
-    """Analyze a specific portfolio by ID"""
-    logger.debug(f"Analyzing portfolio with ID: {portfolio_id}, period: {period}")
-    
-    # Get portfolio
+async def _get_portfolio_for_analysis(portfolio_id: str) -> Optional[Portfolio]:
+    """Look up a portfolio by ID (with or without the 'port-' prefix) and convert it for analysis"""
     portfolio_response = await get_portfolio_service(portfolio_id)
     if not portfolio_response:
         # 尝试检查是否有"port-"前缀
@@ -42,16 +87,17 @@ async def analyze_portfolio_service(portfolio_id: str, period: str = "5year") ->
     logger.debug(f"Portfolio found: {portfolio_response.name}, with {len(portfolio_response.tickers)} tickers")
     
     # Convert to Portfolio object for analysis
-    portfolio = Portfolio(
+    return Portfolio(
         name=portfolio_response.name,
         tickers=portfolio_response.tickers
     )
-    
+
+def _period_to_days(period: str) -> int:
+    """Number of trading days of history to load for a time period"""
     # 根据时间段确定需要获取的历史数据天数
     # 考虑交易日：平均每月约21个交易日
     trading_days_per_month = 21
     trading_days_per_year = trading_days_per_month * 12
-    
     if period == "ytd":
         # 年初至今
         start_of_year = datetime(datetime.now().year, 1, 1)
@@ -68,52 +114,74 @@ async def analyze_portfolio_service(portfolio_id: str, period: str = "5year") ->
         # 默认5年
         days = 5 * trading_days_per_year + 40
     
-    logger.debug(f"Using {days} trading days for period: {period} (with {trading_days_per_month} trading days per month)")
+    return days
+
+async def analyze_portfolio_service(portfolio_id: str, period: str = "5year",
+                                    benchmark: str = DEFAULT_BENCHMARK) -> Optional[PortfolioAnalysis]:
+    """Analyze a specific portfolio by ID"""
+    logger.debug(f"Analyzing portfolio with ID: {portfolio_id}, period: {period}")
+    
+    # Get portfolio
+    portfolio = await _get_portfolio_for_analysis(portfolio_id)
+    if not portfolio:
+        return None
+    
+    days = _period_to_days(period)
+    
+    logger.debug(f"Using {days} trading days for period: {period}")
     
     # Return analysis with specified time period
     logger.debug(f"Generating analysis for portfolio {portfolio_id}")
-    return await analyze_portfolio(portfolio, days, period)
+    return await analyze_portfolio(portfolio, days, period, benchmark)
 
-async def analyze_portfolio(portfolio: Portfolio, days: int, period: str) -> PortfolioAnalysis:
+async def analyze_portfolio(portfolio: Portfolio, days: int, period: str,
+                            benchmark: str = DEFAULT_BENCHMARK) -> PortfolioAnalysis:
     """Generate analysis for a portfolio using real price data"""
     # Extract tickers and weights
     tickers = [t.symbol for t in portfolio.tickers]
     weights = [t.weight for t in portfolio.tickers]
     
     # Get historical data
-    historical_data = await _get_historical_data(tickers, days)
+    historical_data = await _get_historical_data(tickers, days, benchmark)
     
     # Calculate performance metrics
-    performance = _calculate_statistics(historical_data, weights)
+    with span("returns"):
+        performance = _calculate_statistics(historical_data, weights, tickers)
     
     # Calculate allocation
-    allocation = _calculate_allocation(portfolio.tickers)
+    with span("allocation"):
+        allocation = _calculate_allocation(portfolio.tickers)
     
     # Calculate risk metrics
-    risk = _calculate_risk_metrics(historical_data, weights)
+    with span("risk"):
+        risk = _calculate_risk_metrics(historical_data, weights, tickers)
     logger.debug(f"Calculate risk metrics completed, returned {len(risk)} metrics")
     
     # Calculate comparison with benchmarks
-    comparison = _calculate_comparison(historical_data, weights)
+    with span("comparison"):
+        comparison = _calculate_comparison(historical_data, weights, tickers)
     
     # Calculate factor exposure
-    factors = _calculate_factor_exposure(tickers)
+    with span("factors"):
+        factors = _calculate_factor_exposure(tickers)
     
     # 明确记录当前请求的时间段
     logger.debug(f"Calculating historical trends for period: {period} (days: {days})")
     
     # Calculate historical trends data - 直接传递请求的天数到历史趋势计算函数
-    historical_trends = _calculate_historical_trends(historical_data, weights, days)
+    with span("trends"):
+        historical_trends = _calculate_historical_trends(historical_data, weights, days, tickers)
     
     # 添加日志记录分析结果包含的项目
-    analysis_result = PortfolioAnalysis(
-        performance=performance,
-        allocation=allocation,
-        risk=risk,
-        comparison=comparison,
-        factors=factors,
-        historical_trends=historical_trends
-    )
+    with span("build_model"):
+        analysis_result = PortfolioAnalysis(
+            performance=performance,
+            allocation=allocation,
+            risk=risk,
+            comparison=comparison,
+            factors=factors,
+            historical_trends=historical_trends
+        )
     
     logger.debug(f"Portfolio analysis completed with components: performance={bool(performance)}, "
                 f"allocation={bool(allocation)}, risk={bool(risk)} ({len(risk) if risk else 0} metrics), "
@@ -122,6 +190,537 @@ async def analyze_portfolio(portfolio: Portfolio, days: int, period: str) -> Por
     
     return analysis_result
 
+async def get_risk_model_service(portfolio_id: str) -> Optional[Dict[str, Any]]:
+    """Factor-model risk decomposition for a specific portfolio by ID"""
+    portfolio = await _get_portfolio_for_analysis(portfolio_id)
+    if not portfolio:
+        return None
+    
+    return calculate_risk_decomposition(
+        [t.symbol for t in portfolio.tickers],
+        [t.weight for t in portfolio.tickers]
+    )
+
+async def get_simulated_var_service(portfolio_id: str, scenarios: int = DEFAULT_SCENARIOS, horizon: int = 10,
+                                    confidence: float = 0.95, mode: str = "historical",
+                                    seed: Optional[int] = None,
+                                    benchmark: str = DEFAULT_BENCHMARK) -> Optional[Dict[str, Any]]:
+    """Simulation-based VaR/CVaR for a specific portfolio by ID, alongside the benchmark"""
+    portfolio = await _get_portfolio_for_analysis(portfolio_id)
+    if not portfolio:
+        return None
+    
+    symbols = [t.symbol for t in portfolio.tickers]
+    weights = [t.weight for t in portfolio.tickers]
+    
+    if mode == "parametric":
+        # 因子模型参数法：基准作为一个额外"资产"，其暴露度为 bᵀX，特异方差为 bᵀDb
+        model = get_risk_model()
+        arrays = get_portfolio_arrays(symbols, weights, model)
+        exposures = np.vstack([arrays["exposures"], model["benchmark_exposure"]])
+        specific_var = np.append(arrays["specific_var"], model["benchmark_specific_var"])
+        params = build_parametric_params(exposures, model["covariance"], specific_var, horizon)
+        asset_weights = arrays["weights"]
+    else:
+        # 历史自助法：组合与SPX使用相同的抽样交易日
+        historical_data = await _get_historical_data(symbols, _period_to_days("5year"), benchmark)
+        aligned = align_returns(historical_data, BENCHMARK_COLUMN)
+        asset_weights = _align_weights(aligned["symbols"], symbols, weights)
+        if asset_weights.sum() > 0:
+            asset_weights = asset_weights / asset_weights.sum()
+        else:
+            asset_weights = np.full(len(asset_weights), 1.0 / len(asset_weights))
+        
+        # 按对齐策略得到完整的资产收益矩阵，组合与基准使用相同的抽样交易日
+        keep, asset_returns, _ = filled_returns(aligned, asset_weights)
+        if aligned["benchmark"] is not None:
+            asset_returns = np.column_stack([asset_returns, aligned["benchmark"][keep].filled(0.0)])
+        else:
+            logger.warning("SPX data not available, benchmark VaR will not be simulated")
+        params = build_historical_params(asset_returns, horizon)
+    
+    # 权重矩阵：第一列为组合，第二列（如有）为基准
+    n_assets = len(asset_weights)
+    has_benchmark = mode == "parametric" or params["log_returns"].shape[1] > n_assets
+    weight_matrix = np.zeros((n_assets + int(has_benchmark), 1 + int(has_benchmark)))
+    weight_matrix[:n_assets, 0] = asset_weights
+    labels = ["portfolio"]
+    if has_benchmark:
+        weight_matrix[n_assets, 1] = 1.0
+        labels.append("benchmark")
+    
+    # 模拟是 CPU 密集的，在执行器中运行（大请求再分发到共享进程池），避免阻塞事件循环
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, partial(calculate_simulated_var, mode, params, weight_matrix, labels,
+                                                      scenarios=scenarios, confidence=confidence, seed=seed))
+    result["horizonDays"] = horizon
+    if not has_benchmark:
+        result["benchmark"] = None
+    return result
+
+def _align_weights(columns, symbols, weights):
+    """Portfolio weights aligned to price columns by symbol (duplicates summed, columns without a weight get 0)"""
+    weight_map = pd.Series(weights, index=symbols, dtype=float).groupby(level=0).sum()
+    return weight_map.reindex(columns, fill_value=0.0).to_numpy()
+
+def _align_portfolio(historical_data, weights, symbols=None):
+    """
+    Daily returns under the configured missing-data alignment policy, and the portfolio return series
+    
+    Weights are matched to price columns by symbol; without symbols they are taken in column order.
+    
+    Returns:
+        Tuple of (align_returns result, masked portfolio returns), or None when there is no portfolio data
+    """
+    aligned = align_returns(historical_data, BENCHMARK_COLUMN)
+    if not aligned["symbols"] or not len(aligned["dates"]):
+        return None
+    if symbols is None:
+        symbols = aligned["symbols"][:len(weights)]
+        weights = list(weights)[:len(symbols)]
+    portfolio = aligned_portfolio_returns(aligned, _align_weights(aligned["symbols"], symbols, weights))
+    if not portfolio.count():
+        return None
+    return aligned, portfolio
+
+def _get_return_series(historical_data, symbols, weights):
+    """
+    Daily portfolio and benchmark returns from price history, with weights aligned by symbol
+    
+    Dates on which the portfolio return cannot be computed under the alignment policy are dropped;
+    missing benchmark returns on the remaining dates count as 0.
+    
+    Returns:
+        Tuple of (date index, portfolio returns array, benchmark returns array or None)
+    """
+    result = _align_portfolio(historical_data, weights, symbols)
+    if result is None:
+        return pd.DatetimeIndex([]), np.array([]), None
+    aligned, portfolio = result
+    keep = ~np.ma.getmaskarray(portfolio)
+    benchmark_returns = None
+    if aligned["benchmark"] is not None:
+        benchmark_returns = aligned["benchmark"][keep].filled(0.0)
+    return aligned["dates"][keep], portfolio.compressed(), benchmark_returns
+
+async def get_rolling_metrics_service(portfolio_id: str, window: int = 63,
+                                      metrics: Optional[List[str]] = None,
+                                      points: Optional[int] = None,
+                                      benchmark: str = DEFAULT_BENCHMARK) -> Optional[Dict[str, Any]]:
+    """Rolling-window risk and performance metrics over the full price history of a portfolio"""
+    portfolio = await _get_portfolio_for_analysis(portfolio_id)
+    if not portfolio:
+        return None
+    
+    metrics = metrics or ["vol", "beta", "sharpe", "te"]
+    symbols = [t.symbol for t in portfolio.tickers]
+    weights = [t.weight for t in portfolio.tickers]
+    
+    historical_data = await _get_historical_data(symbols, _period_to_days("5year"), benchmark)
+    dates, portfolio_returns, benchmark_returns = _get_return_series(historical_data, symbols, weights)
+    
+    rolling = rolling_metrics(portfolio_returns, benchmark_returns, window=window, metrics=metrics)
+    length = max(len(portfolio_returns) - window + 1, 0)
+    selected = downsample_index(length, points)
+    
+    # 波动率、收益率和跟踪误差转换为百分比，beta和夏普比率保留原值
+    scale = {"return": 100, "vol": 100, "te": 100, "beta": 1, "sharpe": 1}
+    window_end_dates = dates[window - 1:][selected].strftime("%Y-%m-%d").tolist() if length else []
+    columns = {
+        metric: np.round(rolling[metric][selected] * scale[metric], 4).tolist()
+        for metric in metrics
+    }
+    
+    series = []
+    for i, date in enumerate(window_end_dates):
+        item = {"date": date}
+        for metric in metrics:
+            value = columns[metric][i]
+            item[metric] = value if math.isfinite(value) else None
+        series.append(item)
+    
+    return {
+        "window": window,
+        "metrics": metrics,
+        "hasBenchmark": benchmark_returns is not None,
+        "totalPoints": length,
+        "series": series
+    }
+
+async def get_series_export_service(portfolio_id: str, window: int = 63,
+                                    metrics: Optional[List[str]] = None,
+                                    benchmark: str = DEFAULT_BENCHMARK) -> Optional[Dict[str, np.ndarray]]:
+    """Daily return, cumulative index and rolling metric columns for columnar export (decimal units)"""
+    portfolio = await _get_portfolio_for_analysis(portfolio_id)
+    if not portfolio:
+        return None
+    
+    symbols = [t.symbol for t in portfolio.tickers]
+    weights = [t.weight for t in portfolio.tickers]
+    
+    historical_data = await _get_historical_data(symbols, _period_to_days("5year"), benchmark)
+    dates, portfolio_returns, benchmark_returns = _get_return_series(historical_data, symbols, weights)
+    
+    return build_series_columns(dates, portfolio_returns, benchmark_returns, window=window,
+                                metrics=metrics or ["vol", "beta", "sharpe", "te"])
+
+def _format_drawdown_analysis(analysis):
+    """Convert drawdown_analysis output to the frontend format (percent values, without the full series)"""
+    formatted = {key: value for key, value in analysis.items() if key not in ("drawdown", "episodes")}
+    formatted["maxDrawdown"] = round(analysis["maxDrawdown"] * 100, 2) + 0.0
+    formatted["currentDrawdown"] = round(analysis["currentDrawdown"] * 100, 2) + 0.0
+    formatted["episodes"] = [
+        {**episode, "depth": round(episode["depth"] * 100, 2) + 0.0}
+        for episode in analysis["episodes"]
+    ]
+    return formatted
+
+async def get_drawdowns_service(portfolio_id: str, top: int = 5, points: Optional[int] = None,
+                                benchmark: str = DEFAULT_BENCHMARK) -> Optional[Dict[str, Any]]:
+    """Drawdown analytics (max drawdown, durations, recovery and worst episodes) for a portfolio and its benchmark"""
+    portfolio = await _get_portfolio_for_analysis(portfolio_id)
+    if not portfolio:
+        return None
+    
+    symbols = [t.symbol for t in portfolio.tickers]
+    weights = [t.weight for t in portfolio.tickers]
+    
+    historical_data = await _get_historical_data(symbols, _period_to_days("5year"), benchmark)
+    dates, portfolio_returns, benchmark_returns = _get_return_series(historical_data, symbols, weights)
+    
+    portfolio_analysis = drawdown_analysis(dates, portfolio_returns, top_n=top)
+    benchmark_analysis = None
+    if benchmark_returns is not None:
+        benchmark_analysis = drawdown_analysis(dates, benchmark_returns, top_n=top)
+    
+    # 水下曲线（百分比），用于图表展示
+    selected = downsample_index(len(dates), points)
+    portfolio_curve = (np.round(portfolio_analysis["drawdown"][selected] * 100, 2) + 0.0).tolist()
+    benchmark_curve = None
+    if benchmark_analysis is not None:
+        benchmark_curve = (np.round(benchmark_analysis["drawdown"][selected] * 100, 2) + 0.0).tolist()
+    
+    series = []
+    for i, date in enumerate(dates[selected].strftime("%Y-%m-%d")):
+        item = {"date": date, "portfolio": portfolio_curve[i]}
+        if benchmark_curve is not None:
+            item["benchmark"] = benchmark_curve[i]
+        series.append(item)
+    
+    return {
+        "portfolio": _format_drawdown_analysis(portfolio_analysis),
+        "benchmark": _format_drawdown_analysis(benchmark_analysis) if benchmark_analysis else None,
+        "hasBenchmark": benchmark_analysis is not None,
+        "totalPoints": len(dates),
+        "series": series
+    }
+
+async def run_stress_test_service(portfolio_ids: List[str], portfolios: List[Portfolio],
+                                  scenario_ids: List[str], scenarios: List[Dict[str, Any]],
+                                  horizon: int = DEFAULT_HORIZON,
+                                  benchmark: str = DEFAULT_BENCHMARK) -> Dict[str, Any]:
+    """
+    Stress test one or many portfolios under factor-shock and historical-replay scenarios
+    
+    Raises:
+        LookupError: a portfolio or predefined scenario does not exist
+        ValueError: a custom scenario is invalid
+    """
+    targets = []
+    for portfolio_id in portfolio_ids:
+        portfolio = await _get_portfolio_for_analysis(portfolio_id)
+        if not portfolio:
+            raise LookupError(f"Portfolio with ID {portfolio_id} not found")
+        targets.append((portfolio_id, portfolio))
+    for i, portfolio in enumerate(portfolios):
+        targets.append((f"custom-{i + 1}", portfolio))
+    
+    selected = []
+    for scenario_id in scenario_ids:
+        scenario = get_predefined_scenario(scenario_id)
+        if scenario is None:
+            raise LookupError(f"Scenario {scenario_id} not found")
+        selected.append(scenario)
+    selected.extend(scenarios)
+    if not selected:
+        selected = list(PREDEFINED_SCENARIOS)
+    
+    specs = [
+        {
+            "id": portfolio_id,
+            "name": portfolio.name,
+            "symbols": [t.symbol for t in portfolio.tickers],
+            "weights": [t.weight for t in portfolio.tickers]
+        }
+        for portfolio_id, portfolio in targets
+    ]
+    
+    # 历史情景需要覆盖最早开始日期的价格数据
+    prices = None
+    start_dates = [pd.Timestamp(s["startDate"]) for s in selected if s.get("type") == "historical"]
+    if start_dates:
+        symbols = sorted({symbol for spec in specs for symbol in spec["symbols"]})
+        days = max((datetime.now() - min(start_dates)).days + 1, 1)
+        prices = await _get_historical_data(symbols, days, benchmark)
+        if prices.attrs.get("mock"):
+            # 随机生成的价格不能用于历史重演，这些情景标记为不可用
+            logger.warning("No price history for the stress test portfolios, historical scenarios are unavailable")
+            prices = None
+    
+    return stress_test_portfolios(specs, selected, prices, benchmark_column=BENCHMARK_COLUMN, horizon=horizon)
+
+async def _get_what_if_state(portfolio_id: str, portfolio: Portfolio, benchmark: str) -> Dict[str, Any]:
+    """Base state for incremental analysis, rebuilt only when the portfolio, the risk model or the price data changes"""
+    weight_map = pd.Series([t.weight for t in portfolio.tickers],
+                           index=[t.symbol for t in portfolio.tickers], dtype=float).groupby(level=0, sort=False).sum()
+    fingerprint = tuple(weight_map.items())
+    key = (portfolio_id, benchmark)
+    state = _what_if_cache.get(key)
+    price_version = get_data_version(PRICE_HISTORY_FILE, CORPORATE_ACTIONS_PATH)
+    if (state is not None and state["fingerprint"] == fingerprint
+            and state["version"] == get_risk_model()["version"] and state["priceVersion"] == price_version):
+        record_cache("what_if", "hit")
+        return state
+    record_cache("what_if", "miss")
+    
+    symbols = weight_map.index.tolist()
+    historical_data = await _get_historical_data(symbols, _period_to_days("5year"), benchmark)
+    aligned = align_returns(historical_data, BENCHMARK_COLUMN)
+    keep, asset_returns, _ = filled_returns(aligned, _align_weights(aligned["symbols"], symbols, weight_map.to_numpy()))
+    benchmark_returns = None
+    if aligned["benchmark"] is not None:
+        benchmark_returns = aligned["benchmark"][keep].filled(0.0)
+    # 没有价格数据的股票收益记为0（与完整分析一致）
+    asset_returns = pd.DataFrame(asset_returns, columns=aligned["symbols"]).reindex(
+        columns=symbols, fill_value=0.0).to_numpy(dtype=float)
+    
+    state = build_base_state(aligned["dates"][keep], asset_returns, symbols, weight_map.to_numpy(), benchmark_returns)
+    state["fingerprint"] = fingerprint
+    state["priceVersion"] = price_version
+    if _what_if_cache.pop(key, None) is not None:
+        record_cache("what_if", "eviction")
+    if len(_what_if_cache) >= WHAT_IF_CACHE_SIZE:
+        _what_if_cache.pop(next(iter(_what_if_cache)))
+        record_cache("what_if", "eviction")
+    _what_if_cache[key] = state
+    return state
+
+async def what_if_analysis_service(portfolio_id: str, weights: Dict[str, float], deltas: Dict[str, float],
+                                   benchmark: str = DEFAULT_BENCHMARK) -> Optional[Dict[str, Any]]:
+    """
+    Incremental re-analysis after a weight change, using low-rank updates on a cached base state
+    
+    Raises:
+        ValueError: a ticker is not in the portfolio or a weight becomes negative
+    """
+    portfolio = await _get_portfolio_for_analysis(portfolio_id)
+    if not portfolio:
+        return None
+    
+    state = await _get_what_if_state(portfolio_id, portfolio, benchmark)
+    
+    # 目标权重转换为相对基础组合（标准化后）权重的变化量
+    delta = dict(deltas)
+    for symbol, weight in weights.items():
+        base = state["weights"][state["index"][symbol]] if symbol in state["index"] else 0.0
+        delta[symbol] = delta.get(symbol, 0.0) + weight - base
+    
+    base_summary = summarize_state(state)
+    what_if_summary = summarize_state(state, apply_weight_delta(state, delta))
+    for summary in (base_summary, what_if_summary):
+        summary["performance"]["timeFrames"] = _format_timeframes(summary["performance"]["timeFrames"])
+    
+    changes = {
+        f"{section}.{field}": round(what_if_summary[section][field] - base_summary[section][field], 2) + 0.0
+        for section, fields in (("performance", ("annualizedReturn", "volatility", "maxDrawdown")),
+                                ("risk", ("totalRisk", "factorRisk", "specificRisk", "trackingError")))
+        for field in fields
+    }
+    
+    return {
+        "base": base_summary,
+        "whatIf": what_if_summary,
+        "changes": changes,
+        "hasBenchmark": state["benchmark_returns"] is not None
+    }
+
+async def _estimate_expected_returns(symbols: List[str], overrides: Dict[str, float]) -> np.ndarray:
+    """Annualized expected returns from the price history mean, with user overrides"""
+    expected = pd.Series(np.nan, index=symbols, dtype=float)
+    missing = [symbol for symbol in symbols if symbol not in overrides]
+    if missing:
+        historical_data = await _get_historical_data(missing, _period_to_days("5year"))
+        # 与分析流程使用相同的对齐策略，每只股票的均值只取其有数据的日期
+        aligned = align_returns(historical_data, BENCHMARK_COLUMN)
+        means = aligned["returns"].mean(axis=0) * TRADING_DAYS_PER_YEAR
+        expected.update(pd.Series(np.ma.filled(means.astype(float), np.nan), index=aligned["symbols"]))
+    expected.update(pd.Series(overrides, dtype=float))
+    # 没有价格数据的股票使用横截面平均值
+    fill = expected.mean() if expected.notna().any() else 0.0
+    return expected.fillna(fill).to_numpy()
+
+async def optimize_portfolio_service(request) -> Optional[Dict[str, Any]]:
+    """
+    Optimize portfolio weights with the factor-model covariance under long-only, max-weight,
+    sector-cap and turnover constraints
+    
+    Returns:
+        Optimized portfolio (saveable as is) with its statistics, or None if the current portfolio is not found
+    
+    Raises:
+        ValueError: no candidate stocks, or the constraints are infeasible
+    """
+    current = None
+    if request.portfolio_id:
+        current = await _get_portfolio_for_analysis(request.portfolio_id)
+        if not current:
+            return None
+    
+    current_weights = {}
+    if current:
+        for ticker in current.tickers:
+            current_weights[ticker.symbol] = current_weights.get(ticker.symbol, 0.0) + ticker.weight
+    
+    symbols = list(request.symbols) or list(current_weights)
+    if request.universe == "benchmark":
+        model = get_risk_model()
+        constituents = [ticker for ticker, row in model["ticker_index"].items() if model["benchmark_weights"][row] > 0]
+        symbols = list(dict.fromkeys(symbols + constituents))
+    # 换手率以当前组合为基准，当前持仓必须在候选范围内
+    symbols = list(dict.fromkeys(symbols + list(current_weights)))
+    if not symbols:
+        raise ValueError("No candidate stocks: provide symbols, a portfolio_id or universe=benchmark")
+    
+    static_data = get_static_data()
+    sectors = static_data["sector"].reindex(symbols).fillna("Other").tolist()
+    
+    expected_returns = None
+    if request.objective == "max_sharpe":
+        expected_returns = await _estimate_expected_returns(symbols, request.expected_returns)
+    
+    anchor = None
+    if current_weights:
+        anchor = np.array([current_weights.get(symbol, 0.0) for symbol in symbols])
+        anchor = anchor / anchor.sum() if anchor.sum() > 0 else None
+    if request.turnover is not None and anchor is None:
+        raise ValueError("Turnover limit requires a portfolio_id")
+    
+    problem = build_problem(symbols, expected_returns, max_weight=request.max_weight, sectors=sectors,
+                            sector_caps=request.sector_caps, current_weights=anchor, turnover=request.turnover)
+    # 求解是 CPU 密集的，放到线程池中执行，避免阻塞事件循环
+    result = await run_in_threadpool(optimize_portfolio, problem, request.objective, request.tracking_error_limit)
+    
+    # 去掉可忽略的权重，保留6位小数
+    weights = result["weights"]
+    held = np.flatnonzero(weights > 1e-6)
+    held = held[np.argsort(-weights[held])]
+    names = static_data["name"].reindex(symbols) if "name" in static_data else pd.Series(index=symbols, dtype=object)
+    tickers = [
+        Ticker(
+            symbol=symbols[i],
+            weight=round(float(weights[i]), 6),
+            name=names.iloc[i] if isinstance(names.iloc[i], str) else None,
+            sector=sectors[i]
+        )
+        for i in held
+    ]
+    portfolio = Portfolio(
+        name=request.name or f"{current.name if current else 'Portfolio'} ({request.objective.replace('_', ' ')})",
+        tickers=tickers
+    )
+    
+    def percent(value):
+        return None if value is None else round(value * 100, 2) + 0.0
+    
+    return {
+        "portfolio": portfolio,
+        "objective": request.objective,
+        "statistics": {
+            "expectedReturn": percent(result["expectedReturn"]),
+            "risk": percent(result["risk"]),
+            "sharpeRatio": None if result["sharpeRatio"] is None else round(result["sharpeRatio"], 2) + 0.0,
+            "trackingError": percent(result["trackingError"]),
+            "turnover": percent(result["turnover"]),
+        },
+        "sectorWeights": {
+            sector: round(float(weight) * 100, 2)
+            for sector, weight in pd.Series(weights).groupby(pd.Series(sectors)).sum().items()
+            if weight > 1e-6
+        },
+        "candidates": len(symbols),
+        "iterations": result["iterations"],
+        "converged": result["converged"],
+        "notes": result["notes"],
+        "unmappedTickers": problem["unmapped"]
+    }
+
+async def get_frontier_service(portfolio_id: str, points: int = 50,
+                               max_weight: float = 1.0) -> Optional[Dict[str, Any]]:
+    """Efficient frontier for the portfolio's universe, with the portfolio's own position on the risk/return plane"""
+    portfolio = await _get_portfolio_for_analysis(portfolio_id)
+    if not portfolio:
+        return None
+    
+    current_weights = {}
+    for ticker in portfolio.tickers:
+        current_weights[ticker.symbol] = current_weights.get(ticker.symbol, 0.0) + ticker.weight
+    symbols = list(current_weights)
+    
+    key = (tuple(sorted(symbols)), max_weight, points,
+           get_risk_model()["version"], get_data_version(PRICE_HISTORY_FILE, CORPORATE_ACTIONS_PATH))
+    frontier = _frontier_cache.get(key)
+    if frontier is None:
+        record_cache("frontier", "miss")
+        symbols = list(key[0])
+        expected_returns = await _estimate_expected_returns(symbols, {})
+        problem = build_problem(symbols, expected_returns, max_weight=max_weight)
+        frontier = {"problem": problem, "points": await run_in_threadpool(efficient_frontier, problem, points)}
+        if len(_frontier_cache) >= FRONTIER_CACHE_SIZE:
+            _frontier_cache.pop(next(iter(_frontier_cache)))
+            record_cache("frontier", "eviction")
+        _frontier_cache[key] = frontier
+    else:
+        record_cache("frontier", "hit")
+        logger.debug(f"Frontier cache hit for {portfolio_id}")
+    
+    problem, frontier_points = frontier["problem"], frontier["points"]
+    symbols = problem["symbols"]
+    weights = np.array([current_weights[symbol] for symbol in symbols])
+    weights = weights / weights.sum() if weights.sum() > 0 else np.full(len(weights), 1.0 / len(weights))
+    current = portfolio_statistics(problem, weights)
+    
+    def format_point(stats, point_weights=None):
+        item = {
+            "risk": round(stats["risk"] * 100, 2),
+            "return": round(stats["expectedReturn"] * 100, 2) + 0.0,
+            "sharpeRatio": round(stats["sharpeRatio"], 2) + 0.0 if stats["sharpeRatio"] is not None else None,
+        }
+        if point_weights is not None:
+            item["weights"] = {
+                symbol: round(float(w) * 100, 2) for symbol, w in zip(symbols, point_weights) if w > 1e-6
+            }
+        return item
+    
+    formatted = [format_point(point, point["weights"]) for point in frontier_points]
+    sharpe = [point["sharpeRatio"] if point["sharpeRatio"] is not None else -np.inf for point in frontier_points]
+    
+    # 组合与前沿的距离：相同风险下前沿可达到的收益（线性插值）
+    risks = np.array([point["risk"] for point in frontier_points])
+    returns = np.array([point["expectedReturn"] for point in frontier_points])
+    frontier_return = float(np.interp(current["risk"], risks, returns)) if current["risk"] <= risks[-1] else None
+    
+    return {
+        "points": formatted,
+        "minVarianceIndex": 0,
+        "maxSharpeIndex": int(np.argmax(sharpe)),
+        "portfolio": {
+            **format_point(current),
+            "frontierReturn": round(frontier_return * 100, 2) + 0.0 if frontier_return is not None else None,
+        },
+        "maxWeight": max_weight,
+        "unmappedTickers": problem["unmapped"]
+    }
+
 async def mock_analyze_portfolio_service(portfolio: Portfolio) -> PortfolioAnalysis:
     """Generate mock analysis for a portfolio (fallback if real data is not available)"""
     # Extract tickers and weights
@@ -132,16 +731,16 @@ async def mock_analyze_portfolio_service(portfolio: Portfolio) -> PortfolioAnaly
     historical_data = _generate_historical_data(tickers)
     
     # Calculate performance metrics
-    performance = _calculate_statistics(historical_data, weights)
+    performance = _calculate_statistics(historical_data, weights, tickers)
     
     # Calculate allocation
     allocation = _calculate_allocation(portfolio.tickers)
     
     # Calculate risk metrics
-    risk = _calculate_risk_metrics(historical_data, weights)
+    risk = _calculate_risk_metrics(historical_data, weights, tickers)
     
     # Calculate comparison with benchmarks
-    comparison = _calculate_comparison(historical_data, weights)
+    comparison = _calculate_comparison(historical_data, weights, tickers)
     
     # Calculate factor exposure
     factors = _calculate_factor_exposure(tickers)
@@ -154,32 +753,31 @@ async def mock_analyze_portfolio_service(portfolio: Portfolio) -> PortfolioAnaly
         factors=factors
     )
 
-async def _get_historical_data(tickers, days=365):
-    """Get real historical price data for tickers"""
-    logger.debug(f"Getting historical data for {len(tickers)} tickers over {days} days")
+@timed("prices")
+async def _get_historical_data(tickers, days=365, benchmark=DEFAULT_BENCHMARK):
+    """
+    Get real historical price data for tickers
     
-    # Create empty DataFrame to store results
-    data = pd.DataFrame()
+    The selected benchmark is added as the BENCHMARK_COLUMN column, taken from the precomputed
+    benchmark registry and aligned to the portfolio dates.
+    """
+    logger.debug("Getting historical data for %s tickers over %s days", len(tickers), days)
     
-    # 确保SPX数据也被获取
-    all_tickers = tickers.copy()
-    if 'SPX' not in all_tickers:
-        all_tickers.append('SPX')
-        logger.debug("Added SPX to the list of tickers for benchmark comparison")
+    # 每只股票的价格序列，最后按日期外连接（不以第一只股票的日期为准）
+    series_by_ticker = {}
     
     # 改为仅记录未获取到数据的ticker，避免每个都记录
     missing_tickers = []
+    # 拆股和分红调整因子按价格文件版本缓存
+    price_version = get_data_version(PRICE_HISTORY_FILE)
     
-    for ticker in all_tickers:
+    for ticker in tickers:
         try:
             # Get historical data for this ticker
             ticker_history = await get_stock_history_service(ticker, days)
             
             if not ticker_history:
-                if ticker == 'SPX':
-                    logger.warning("No SPX data found, benchmark comparisons will use mock data")
-                else:
-                    missing_tickers.append(ticker)
+                missing_tickers.append(ticker)
                 continue
                 
             # Convert to DataFrame
@@ -190,44 +788,39 @@ async def _get_historical_data(tickers, days=365):
             ticker_df = ticker_df.set_index('date')
             
             # Extract price column based on ticker
-            if ticker == 'SPX' and 'value' in ticker_df.columns:
-                # For SPX use value column if available
-                prices = ticker_df['value']
-                data[ticker] = prices
-            elif 'PRC' in ticker_df.columns:
+            if 'PRC' in ticker_df.columns:
                 # For normal stocks use PRC column
                 prices = ticker_df['PRC']
-                data[ticker] = prices
+                series_by_ticker[ticker] = adjust_prices(ticker, prices, price_version)
             else:
                 # Try to use any available numeric column
                 for col in ticker_df.columns:
                     if pd.api.types.is_numeric_dtype(ticker_df[col]):
-                        prices = ticker_df[col]
-                        data[ticker] = prices
+                        series_by_ticker[ticker] = ticker_df[col]
                         break
                 else:
-                    logger.warning(f"No suitable price column found for {ticker}")
+                    logger.warning("No suitable price column found for %s", ticker)
         except Exception as e:
-            if ticker == 'SPX':
-                logger.error(f"Error getting SPX benchmark data: {e}")
-            else:
-                logger.error(f"Error getting data for {ticker}: {e}")
+            logger.error("Error getting data for %s: %s", ticker, e)
     
     # 只在有未获取到数据的ticker时才记录日志
     if missing_tickers:
-        logger.warning(f"No historical data found for {len(missing_tickers)} tickers: {', '.join(missing_tickers[:5])}{'...' if len(missing_tickers) > 5 else ''}")
+        logger.warning("No historical data found for %s tickers: %s%s", len(missing_tickers), ', '.join(missing_tickers[:5]), '...' if len(missing_tickers) > 5 else '')
     
     # If we have no data, generate mock data
-    if data.empty:
+    if not series_by_ticker:
         logger.warning("No historical data found for any tickers, using mock data")
         return _generate_historical_data(tickers, days)
     
-    # Check if we have SPX data
-    if 'SPX' not in data.columns:
-        logger.warning("SPX data not available in final dataset, benchmark comparisons will use mock data")
-        
-    # Sort index by date
-    data = data.sort_index()
+    # 外连接所有日期并排序，缺失价格为 NaN，由 align_returns 按对齐策略处理
+    data = pd.concat(series_by_ticker, axis=1).sort_index()
+    
+    # 从基准注册表获取预先计算的基准净值并对齐到组合日期
+    benchmark_entry = get_benchmark(benchmark)
+    if benchmark_entry is not None:
+        data[BENCHMARK_COLUMN] = benchmark_levels(benchmark_entry, data.index)
+    else:
+        logger.warning(f"Benchmark {benchmark} data not available, benchmark comparisons will use mock data")
     
     return data
 
@@ -264,55 +857,21 @@ def _generate_historical_data(tickers, days=365):
         # Set as Series in dataframe
         data[ticker] = prices
     
+    # 标记为模拟数据，历史情景重演等不能使用随机价格的分析据此跳过
+    data.attrs["mock"] = True
     return data
 
-def _calculate_statistics(historical_data, weights):
+def _calculate_statistics(historical_data, weights, symbols=None):
     """Calculate performance statistics for portfolio"""
-    # Create daily returns - 明确指定fill_method
-    returns = historical_data.pct_change(fill_method=None).dropna()
+    # 按缺失数据对齐策略计算日收益率（不再删除任一股票缺失的日期）
+    dates, portfolio_values, benchmark_returns = _get_return_series(historical_data, symbols, weights)
     
     # Check if returns is empty
-    if returns.empty:
+    if not len(dates):
         logger.warning("Empty returns data, generating mock statistics")
         return _generate_mock_statistics()
     
-    # Filter out non-portfolio columns (like SPX)
-    portfolio_tickers = [ticker for ticker in returns.columns if ticker != 'SPX']
-    if not portfolio_tickers:
-        logger.warning("No portfolio tickers found in data, generating mock statistics")
-        return _generate_mock_statistics()
-    
-    # Filter returns to only include portfolio tickers
-    portfolio_returns_data = returns[portfolio_tickers]
-    
-    # Adjust weights to match available tickers
-    adjusted_weights = []
-    for i, ticker in enumerate(portfolio_tickers):
-        if i < len(weights):
-            adjusted_weights.append(weights[i])
-        else:
-            adjusted_weights.append(0)
-    
-    # Make sure we have enough weights to match columns
-    if len(adjusted_weights) < len(portfolio_tickers):
-        logger.warning(f"Not enough weights provided ({len(adjusted_weights)}) for tickers ({len(portfolio_tickers)}). Padding with zeros.")
-        while len(adjusted_weights) < len(portfolio_tickers):
-            adjusted_weights.append(0)
-    
-    # Normalize weights to sum to 1
-    if sum(adjusted_weights) > 0:
-        adjusted_weights = [w/sum(adjusted_weights) for w in adjusted_weights]
-    else:
-        # If all weights are zero, distribute equally
-        adjusted_weights = [1/len(adjusted_weights)] * len(adjusted_weights)
-    
-    logger.debug(f"Portfolio returns data shape: {portfolio_returns_data.shape}, Adjusted weights length: {len(adjusted_weights)}")
-    
-    # Calculate portfolio returns with adjusted weights
-    portfolio_returns = portfolio_returns_data.dot(adjusted_weights)
-    
-    # 检查并处理无效值
-    portfolio_returns = portfolio_returns.replace([np.inf, -np.inf], np.nan).fillna(0)
+    portfolio_returns = pd.Series(portfolio_values, index=dates)
     
     # Calculate metrics
     annual_return = portfolio_returns.mean() * 252
@@ -336,40 +895,25 @@ def _calculate_statistics(historical_data, weights):
     
     # Calculate drawdown
     cum_returns = (1 + portfolio_returns).cumprod()
-    running_max = cum_returns.cummax()
-    drawdown = (cum_returns / running_max) - 1
-    max_drawdown = drawdown.min()
+    max_drawdown = drawdown_series(portfolio_returns.to_numpy()).min() if len(portfolio_returns) else np.nan
     
     # 检查最大回撤是否有效
     if pd.isna(max_drawdown) or np.isinf(max_drawdown):
         logger.warning("Invalid max drawdown detected, using default value")
         max_drawdown = -0.15  # 默认最大回撤 -15%
     
-    # Generate monthly returns for the chart
-    monthly_returns = []
-    
-    # Get returns for the last 12 months
-    now = datetime.now()
-    for i in range(12):
-        month = now.month - i - 1
-        year = now.year
-        
-        if month <= 0:
-            month += 12
-            year -= 1
-            
-        month_name = f"{year}-{month:02d}"
-        portfolio_return = round(random.uniform(-0.1, 0.15), 4)
-        benchmark_return = round(random.uniform(-0.1, 0.15), 4)
-        
-        monthly_returns.append({
-            "month": month_name,
-            "return": portfolio_return * 100,  # 转换为百分比
-            "benchmark": benchmark_return * 100  # 转换为百分比
-        })
+    # 各时间段的真实业绩（一次前缀和计算所有时间段）
+    timeframes = timeframe_performance(dates, portfolio_values, benchmark_returns)
     
-    # 确保按月份排序
-    monthly_returns.sort(key=lambda x: x["month"])
+    # Monthly returns for the chart (last 12 months)
+    series = [portfolio_values] + ([benchmark_returns] if benchmark_returns is not None else [])
+    months, period_returns, _ = aggregate_returns(dates, np.column_stack(series))
+    monthly_returns = []
+    for month, values in zip(months[-12:].strftime("%Y-%m"), (np.round(period_returns[-12:] * 100, 2) + 0.0).tolist()):
+        month_data = {"month": month, "return": values[0]}  # 转换为百分比
+        if benchmark_returns is not None:
+            month_data["benchmark"] = values[1]
+        monthly_returns.append(month_data)
     
     # 获取累积收益率并检查是否有效
     total_return = cum_returns.iloc[-1] - 1 if len(cum_returns) > 0 else annual_return
@@ -386,97 +930,57 @@ def _calculate_statistics(historical_data, weights):
         "maxDrawdown": round(float(max_drawdown * 100), 2),
         "winRate": 49.62,  # 胜率，使用默认值
         "monthlyReturns": monthly_returns,
-        "timeFrames": {
-            "ytd": {
-                "return": round(float(annual_return * 100 * 0.5), 2),  # 年初至今回报
-                "annualized": round(float(annual_return * 100), 2),
-                "benchmarkReturn": round(float(annual_return * 0.8 * 100), 2),
-                "excessReturn": round(float(annual_return * 0.2 * 100), 2),
-                "volatility": round(float(annual_volatility * 100), 2),
-                "sharpe": round(float(sharpe_ratio), 2)
-            },
-            "oneYear": {
-                "return": round(float(annual_return * 100), 2),
-                "annualized": round(float(annual_return * 100), 2),
-                "benchmarkReturn": round(float(annual_return * 0.8 * 100), 2),
-                "excessReturn": round(float(annual_return * 0.2 * 100), 2),
-                "volatility": round(float(annual_volatility * 100), 2),
-                "sharpe": round(float(sharpe_ratio), 2)
-            },
-            "threeYear": {
-                "return": round(float(annual_return * 100 * 3), 2),  # 三年累计
-                "annualized": round(float(annual_return * 100), 2),
-                "benchmarkReturn": round(float(annual_return * 0.8 * 100 * 3), 2),
-                "excessReturn": round(float(annual_return * 0.2 * 100 * 3), 2),
-                "volatility": round(float(annual_volatility * 100 * 0.9), 2),  # 略有不同
-                "sharpe": round(float(sharpe_ratio * 0.9), 2)  # 略有不同
-            },
-            "fiveYear": {
-                "return": round(float(annual_return * 100 * 5), 2),  # 五年累计
-                "annualized": round(float(annual_return * 100 * 0.95), 2),  # 略有不同
-                "benchmarkReturn": round(float(annual_return * 0.8 * 100 * 5), 2),
-                "excessReturn": round(float(annual_return * 0.2 * 100 * 5), 2),
-                "volatility": round(float(annual_volatility * 100 * 0.85), 2),  # 略有不同
-                "sharpe": round(float(sharpe_ratio * 0.85), 2)  # 略有不同
-            }
-        }
+        "timeFrames": _format_timeframes(timeframes)
     }
     
     return result
 
+# 时间段指标中按百分比输出的字段，夏普比率保留原值
+_TIMEFRAME_FIELDS = {
+    "return": 100,
+    "annualized": 100,
+    "benchmarkReturn": 100,
+    "excessReturn": 100,
+    "volatility": 100,
+    "sharpe": 1,
+}
+
+def _format_timeframes(timeframes):
+    """
+    Convert timeframe_performance output to the frontend format (percent values)
+    
+    Timeframes without data and metrics that cannot be computed (e.g. annualized return for
+    windows shorter than a year) are omitted so the frontend falls back to the overall values.
+    """
+    formatted = {}
+    for name, frame in timeframes.items():
+        if frame is None:
+            continue
+        formatted[name] = {
+            field: round(frame[field] * scale, 2) + 0.0
+            for field, scale in _TIMEFRAME_FIELDS.items()
+            if frame.get(field) is not None
+        }
+    return formatted
+
 def _calculate_allocation(tickers):
     """Calculate portfolio allocation by sector"""
     # 调用专门的资产配置服务函数，获取真实数据
     logger.debug(f"调用get_real_asset_allocation计算资产配置，tickers类型: {type(tickers)}")
     return get_real_asset_allocation(tickers)
 
-def _calculate_risk_metrics(historical_data, weights):
+def _calculate_risk_metrics(historical_data, weights, symbols=None):
     """Calculate risk metrics for the portfolio"""
-    # Calculate daily returns - 明确指定fill_method
-    returns = historical_data.pct_change(fill_method=None).dropna()
+    # 按缺失数据对齐策略计算日收益率
+    result = _align_portfolio(historical_data, weights, symbols)
     
     # Check if returns is empty
-    if returns.empty:
+    if result is None:
         logger.warning("Empty returns data in risk metrics, generating mock risk metrics")
         return _generate_mock_risk_metrics()
     
-    # Filter out non-portfolio columns (like SPX)
-    portfolio_tickers = [ticker for ticker in returns.columns if ticker != 'SPX']
-    if not portfolio_tickers:
-        logger.warning("No portfolio tickers found in risk data, generating mock risk metrics")
-        return _generate_mock_risk_metrics()
-    
-    # Filter returns to only include portfolio tickers
-    portfolio_returns_data = returns[portfolio_tickers]
-    
-    # Adjust weights to match available tickers
-    adjusted_weights = []
-    for i, ticker in enumerate(portfolio_tickers):
-        if i < len(weights):
-            adjusted_weights.append(weights[i])
-        else:
-            adjusted_weights.append(0)
-    
-    # Make sure we have enough weights to match columns
-    if len(adjusted_weights) < len(portfolio_tickers):
-        logger.warning(f"Not enough weights provided ({len(adjusted_weights)}) for tickers ({len(portfolio_tickers)}) in risk metrics. Padding with zeros.")
-        while len(adjusted_weights) < len(portfolio_tickers):
-            adjusted_weights.append(0)
-    
-    # Normalize weights to sum to 1
-    if sum(adjusted_weights) > 0:
-        adjusted_weights = [w/sum(adjusted_weights) for w in adjusted_weights]
-    else:
-        # If all weights are zero, distribute equally
-        adjusted_weights = [1/len(adjusted_weights)] * len(adjusted_weights)
-    
-    logger.debug(f"Risk metrics: portfolio returns data shape: {portfolio_returns_data.shape}, Adjusted weights length: {len(adjusted_weights)}")
-    
-    # Calculate portfolio returns with adjusted weights
-    portfolio_returns = portfolio_returns_data.dot(adjusted_weights)
-    
-    # 处理无效值
-    portfolio_returns = portfolio_returns.replace([np.inf, -np.inf], np.nan).fillna(0)
+    aligned, portfolio = result
+    portfolio_returns = pd.Series(portfolio.compressed())
     
     # Calculate volatility (annualized)
     volatility = portfolio_returns.std() * np.sqrt(252)
@@ -502,23 +1006,16 @@ def _calculate_risk_metrics(historical_data, weights):
         var_95 = -volatility * 1.65
     
     # Calculate beta against "market" (use SPX if available)
-    if 'SPX' in returns.columns:
-        market_returns = returns['SPX']
-    else:
-        market_returns = returns.iloc[:, 0]
-    
-    # 处理市场收益率中的无效值
-    market_returns = market_returns.replace([np.inf, -np.inf], np.nan).fillna(0)
+    has_benchmark = aligned["benchmark"] is not None
+    market = aligned["benchmark"] if has_benchmark else aligned["returns"][:, 0]
     
-    # Ensure market_returns and portfolio_returns have the same index
-    common_index = portfolio_returns.index.intersection(market_returns.index)
-    if len(common_index) < 10:  # 需要至少10个数据点
+    # 组合与市场只使用两者都有数据的日期（pairwise）
+    port_returns_aligned, market_returns_aligned = common(portfolio, market)
+    common_count = len(port_returns_aligned)
+    if common_count < 10:  # 需要至少10个数据点
         logger.warning("Not enough common data points for beta calculation, using default value")
         beta = 1.0
     else:
-        port_returns_aligned = portfolio_returns.loc[common_index]
-        market_returns_aligned = market_returns.loc[common_index]
-        
         # 计算Beta
         try:
             cov = np.cov(port_returns_aligned, market_returns_aligned)[0, 1]
@@ -534,12 +1031,12 @@ def _calculate_risk_metrics(historical_data, weights):
             logger.error(f"Error calculating beta: {str(e)}")
             beta = 1.0  # 默认值
     
-    # Calculate maximum drawdown
+    # Calculate maximum drawdown (portfolio and, when available, SPX benchmark)
+    benchmark_max_drawdown = None
     try:
-        cumulative_returns = (1 + portfolio_returns).cumprod()
-        peak = cumulative_returns.expanding(min_periods=1).max()
-        drawdown = (cumulative_returns / peak) - 1
-        max_drawdown = drawdown.min()
+        max_drawdown = drawdown_series(portfolio_returns.to_numpy()).min()
+        if has_benchmark:
+            benchmark_max_drawdown = drawdown_series(market.compressed()).min()
         
         if pd.isna(max_drawdown) or np.isinf(max_drawdown) or max_drawdown < -1:
             logger.warning("Invalid max drawdown value, using default")
@@ -549,14 +1046,11 @@ def _calculate_risk_metrics(historical_data, weights):
         max_drawdown = -0.20  # 默认值
     
     # Calculate tracking error (difference between portfolio and benchmark returns)
-    if 'SPX' in returns.columns and len(common_index) >= 10:
+    if has_benchmark and common_count >= 10:
         try:
-            # Align market and portfolio returns
-            aligned_market = market_returns.loc[common_index]
-            aligned_portfolio = portfolio_returns.loc[common_index]
             # Calculate tracking error
-            tracking_diff = aligned_portfolio - aligned_market
-            tracking_error = tracking_diff.std() * np.sqrt(252)
+            tracking_diff = port_returns_aligned - market_returns_aligned
+            tracking_error = tracking_diff.std(ddof=1) * np.sqrt(252)
             
             if pd.isna(tracking_error) or np.isinf(tracking_error) or tracking_error < 0.001:
                 tracking_error = volatility * 0.4  # 估计值
@@ -567,11 +1061,9 @@ def _calculate_risk_metrics(historical_data, weights):
         tracking_error = volatility * 0.4  # 估计值
     
     # Calculate information ratio
-    if 'SPX' in returns.columns and len(common_index) >= 10:
+    if has_benchmark and common_count >= 10:
         try:
-            aligned_market = market_returns.loc[common_index]
-            aligned_portfolio = portfolio_returns.loc[common_index]
-            excess_return = aligned_portfolio.mean() - aligned_market.mean()
+            excess_return = port_returns_aligned.mean() - market_returns_aligned.mean()
             
             if tracking_error > 0:
                 information_ratio = (excess_return * 252) / tracking_error
@@ -648,7 +1140,7 @@ def _calculate_risk_metrics(historical_data, weights):
         {
             "name": "Maximum Drawdown",  # 最大回撤：值越低越好，表示从高点到最低点的最大跌幅
             "value": f"{round(abs(max_drawdown) * 100, 2)}%",
-            "benchmark": f"{round(abs(max_drawdown) * 100 * 1.2, 2)}%",
+            "benchmark": f"{round(abs(benchmark_max_drawdown if benchmark_max_drawdown is not None else max_drawdown * 1.2) * 100, 2)}%",
             "status": "bad" if abs(max_drawdown) > 0.25 else ("neutral" if abs(max_drawdown) > 0.15 else "good"),
             "percentage": 100 - min(int(abs(max_drawdown) * 300), 95)
         },
@@ -755,64 +1247,43 @@ def _generate_mock_risk_metrics():
     
     return risk_data
 
-def _calculate_comparison(historical_data, weights):
+def _calculate_comparison(historical_data, weights, symbols=None):
     """Calculate performance comparison with benchmarks"""
-    # Calculate daily returns - 明确指定fill_method
-    returns = historical_data.pct_change(fill_method=None).dropna()
-    
-    # Calculate portfolio returns
-    portfolio_tickers = [ticker for ticker in historical_data.columns if ticker != 'SPX']
-    if not portfolio_tickers:
+    # 按缺失数据对齐策略计算日收益率
+    result = _align_portfolio(historical_data, weights, symbols)
+    if result is None:
         logger.warning("No portfolio tickers found in historical data, using mock data")
         return _generate_mock_comparison(30)  # Generate 30 mock data points
     
-    # Filter returns to only include portfolio tickers
-    portfolio_returns_data = returns[portfolio_tickers]
-    
-    # Adjust weights if needed to match available tickers
-    adjusted_weights = []
-    for i, ticker in enumerate(portfolio_tickers):
-        if i < len(weights):
-            adjusted_weights.append(weights[i])
-        else:
-            adjusted_weights.append(0)
-    
-    # Normalize weights to sum to 1
-    if sum(adjusted_weights) > 0:
-        adjusted_weights = [w/sum(adjusted_weights) for w in adjusted_weights]
-    else:
-        adjusted_weights = [1/len(adjusted_weights)] * len(adjusted_weights)
-    
-    # Calculate portfolio returns
-    portfolio_returns = portfolio_returns_data.dot(adjusted_weights)
-    
-    # Generate cumulative returns
-    cumulative = (1 + portfolio_returns).cumprod()
+    aligned, portfolio = result
+    portfolio_mask = np.ma.getmaskarray(portfolio)
+    portfolio_returns = pd.Series(portfolio.compressed(), index=aligned["dates"][~portfolio_mask])
     
     # Check if SPX is in the data
     use_spx = False
-    if 'SPX' in historical_data.columns:
+    if aligned["benchmark"] is not None:
         logger.info("Using SPX as benchmark for comparison")
         try:
-            # Get SPX returns
-            benchmark_returns = historical_data['SPX'].pct_change().dropna()
-            
-            # Align benchmark returns with portfolio returns (same index)
-            common_index = portfolio_returns.index.intersection(benchmark_returns.index)
-            if len(common_index) > 10:  # 至少需要10个共同数据点
-                portfolio_returns = portfolio_returns.loc[common_index]
-                benchmark_returns = benchmark_returns.loc[common_index]
+            # 组合与基准只使用两者都有数据的日期
+            both = ~portfolio_mask & ~np.ma.getmaskarray(aligned["benchmark"])
+            if both.sum() > 10:  # 至少需要10个共同数据点
+                common_dates = aligned["dates"][both]
+                portfolio_returns = pd.Series(portfolio.data[both], index=common_dates)
+                benchmark_returns = pd.Series(aligned["benchmark"].data[both], index=common_dates)
                 
                 # Generate cumulative returns for benchmark
                 benchmark_cumulative = (1 + benchmark_returns).cumprod()
                 use_spx = True
             else:
-                logger.warning(f"Not enough common dates between portfolio and SPX benchmark ({len(common_index)} dates), using mock data")
+                logger.warning(f"Not enough common dates between portfolio and SPX benchmark ({both.sum()} dates), using mock data")
                 use_spx = False
         except Exception as e:
             logger.error(f"Error processing SPX benchmark data: {e}")
             use_spx = False
     
+    # Generate cumulative returns
+    cumulative = (1 + portfolio_returns).cumprod()
+    
     if not use_spx:
         logger.warning("Using mock S&P 500 benchmark data")
         # Generate benchmark data (S&P 500 simulation)
@@ -900,7 +1371,7 @@ def _calculate_factor_exposure(tickers):
     # 调用实际的因子暴露计算函数
     return get_portfolio_factor_exposure(tickers)
 
-def _calculate_historical_trends(historical_data, weights, days=1825):  # 默认最多5年数据
+def _calculate_historical_trends(historical_data, weights, days=1825, symbols=None):  # 默认最多5年数据
     """Calculate historical performance trends for portfolio"""
     logger.debug(f"Calculating historical trends for portfolio with {len(weights)} assets")
     
@@ -909,69 +1380,38 @@ def _calculate_historical_trends(historical_data, weights, days=1825):  # 默认
         logger.warning("No historical data found, generating mock data for trends")
         return _generate_mock_historical_trends(days)
     
-    # 排除SPX数据获取投资组合收益率
-    portfolio_tickers = [ticker for ticker in historical_data.columns if ticker != 'SPX']
-    if not portfolio_tickers:
+    # 按缺失数据对齐策略计算组合日收益率，使用所有可用日期
+    result = _align_portfolio(historical_data, weights, symbols)
+    if result is None:
         logger.warning("No portfolio tickers found in historical data, using mock data")
         return _generate_mock_historical_trends(days)
     
-    # 计算日收益率 - 明确指定fill_method
-    returns = historical_data[portfolio_tickers].pct_change(fill_method=None).dropna()
-    
-    # 调整权重以匹配可用数据
-    adjusted_weights = []
-    for i, ticker in enumerate(portfolio_tickers):
-        if i < len(weights):
-            adjusted_weights.append(weights[i])
-        else:
-            adjusted_weights.append(0)
-    
-    # 确保有足够的权重匹配列数
-    if len(adjusted_weights) < len(portfolio_tickers):
-        logger.warning(f"Not enough weights provided ({len(adjusted_weights)}) for tickers ({len(portfolio_tickers)}) in historical trends. Padding with zeros.")
-        while len(adjusted_weights) < len(portfolio_tickers):
-            adjusted_weights.append(0)
-    
-    # 标准化权重和为1
-    if sum(adjusted_weights) > 0:
-        adjusted_weights = [w/sum(adjusted_weights) for w in adjusted_weights]
-    else:
-        adjusted_weights = [1/len(adjusted_weights)] * len(adjusted_weights)
-    
-    logger.debug(f"Historical trends: portfolio returns data shape: {returns.shape}, Adjusted weights length: {len(adjusted_weights)}")
-    
-    # 计算投资组合收益率
-    portfolio_returns = returns.dot(adjusted_weights)
+    aligned, portfolio = result
+    keep = ~np.ma.getmaskarray(portfolio)
+    portfolio_returns = pd.Series(portfolio.compressed(), index=aligned["dates"][keep])
     
     # 生成月度数据
     # 将日期转换为月度并分组计算月收益率
     monthly_data = []
     
     try:
-        # 尝试使用实际数据生成月度收益率
-        portfolio_returns.index = pd.to_datetime(portfolio_returns.index)
-        monthly_portfolio = portfolio_returns.resample('M').apply(lambda x: (1 + x).prod() - 1)
-        
         # 使用SPX作为基准的标志
         use_spx_benchmark = False
         
         # 检查SPX是否在数据中，如果是则使用它作为基准
-        if 'SPX' in historical_data.columns:
+        if aligned["benchmark"] is not None:
             try:
                 logger.info("Using SPX as benchmark for historical trends")
-                # 获取SPX收益率
-                benchmark_returns = historical_data['SPX'].pct_change().dropna()
-                
-                # 将基准收益率转换为月度数据
-                benchmark_returns.index = pd.to_datetime(benchmark_returns.index)
-                monthly_benchmark = benchmark_returns.resample('M').apply(lambda x: (1 + x).prod() - 1)
+                # SPX收益率与投资组合日期对齐，缺失的日期收益记为0
+                benchmark_values = aligned["benchmark"][keep]
+                benchmark_returns = pd.Series(benchmark_values.filled(0.0), index=portfolio_returns.index)
                 
                 # 检查是否有足够的共同数据点
-                common_months = monthly_portfolio.index.intersection(monthly_benchmark.index)
-                if len(common_months) >= 6:  # 至少需要6个月的共同数据
+                common_months = portfolio_returns.index[~np.ma.getmaskarray(benchmark_values)].to_period('M').nunique()
+                if common_months >= 6:  # 至少需要6个月的共同数据
                     use_spx_benchmark = True
                 else:
-                    logger.warning(f"Not enough common months between portfolio and SPX benchmark ({len(common_months)} months), using mock benchmark")
+                    logger.warning(f"Not enough common months between portfolio and SPX benchmark ({common_months} months), using mock benchmark")
             except Exception as e:
                 logger.error(f"Error processing SPX benchmark data for trends: {e}")
         
@@ -982,68 +1422,34 @@ def _calculate_historical_trends(historical_data, weights, days=1825):  # 默认
             benchmark_alpha = -0.001  # 稍微降低基准收益率
             benchmark_noise = np.random.normal(0, 0.005, len(portfolio_returns))
             benchmark_returns = portfolio_returns * benchmark_beta + benchmark_alpha + benchmark_noise
-            monthly_benchmark = benchmark_returns.resample('M').apply(lambda x: (1 + x).prod() - 1)
         
-        # 转换为月度数据列表
-        for date, port_return in monthly_portfolio.items():
-            if date in monthly_benchmark.index:
-                bench_return = monthly_benchmark[date]
-                
-                # 确保数据在合理范围内及不是NaN或Infinity
-                if pd.isna(port_return) or np.isinf(port_return):
-                    port_return = 0.0
-                else:
-                    port_return = min(max(port_return, -0.3), 0.3)  # 限制在-30%到30%之间
-                
-                if pd.isna(bench_return) or np.isinf(bench_return):
-                    bench_return = 0.0
-                else:
-                    bench_return = min(max(bench_return, -0.25), 0.25)  # 限制在-25%到25%之间
-                
-                monthly_data.append({
-                    "month": date.strftime("%Y-%m"),
-                    "return": round(float(port_return * 100), 2),  # 转换为百分比
-                    "benchmark": round(float(bench_return * 100), 2)  # 转换为百分比
-                })
+        # 组合与基准共用同一组月份边界，一次聚合同时得到月度收益率和累积收益率
+        months, monthly_returns, cumulative = aggregate_returns(
+            portfolio_returns.index,
+            np.column_stack([portfolio_returns.to_numpy(), benchmark_returns.to_numpy()])
+        )
+        month_labels = months.strftime("%Y-%m")
+        # 只对展示的月度收益率限制范围（组合-30%到30%，基准-25%到25%），累积收益率使用未截断的值
+        monthly_percent = np.round(np.clip(monthly_returns, [-0.3, -0.25], [0.3, 0.25]) * 100, 2) + 0.0
+        cumulative_percent = np.round(cumulative * 100, 2) + 0.0
         
-        # 确保我们至少有一些数据点
-        if len(monthly_data) < 12:
-            logger.warning(f"Only {len(monthly_data)} months of data available, adding mock data")
-            monthly_data.extend(_generate_mock_monthly_returns(60 - len(monthly_data)))  # 确保至少有60个月的数据
+        # 转换为月度数据列表
+        monthly_data = [
+            {"month": month, "return": port_return, "benchmark": bench_return}
+            for month, (port_return, bench_return) in zip(month_labels, monthly_percent.tolist())
+        ]
+        cumulative_data = [
+            {"month": month, "portfolio": port_cumulative, "benchmark": bench_cumulative}
+            for month, (port_cumulative, bench_cumulative) in zip(month_labels, cumulative_percent.tolist())
+        ]
     except Exception as e:
         logger.error(f"Error generating monthly returns from historical data: {e}")
         monthly_data = _generate_mock_monthly_returns(60)  # 生成60个月的模拟数据
+        cumulative_data = _calculate_cumulative_performance(monthly_data)
     
-    # 确保按月份排序
-    monthly_data.sort(key=lambda x: x["month"])
-    
-    # 计算累积表现数据
-    cumulative_data = _calculate_cumulative_performance(monthly_data)
-    
-    # 确保有足够的数据以支持前端的显示
-    # 如果数据量不足，则添加模拟数据进行补充
+    # 数据不足请求的月数时只返回实际可用的月份，不再用模拟数据补齐
     # 考虑交易日：平均每月约21-22个交易日，而不是30个日历日
     trading_days_per_month = 21
-    required_months = days // trading_days_per_month
-    
-    # 确保最小要求的月数为12个月
-    required_months = max(12, required_months)
-    
-    logger.debug(f"Requested months based on days ({days}): {required_months} months (using {trading_days_per_month} trading days per month)")
-    
-    if len(monthly_data) < required_months:
-        logger.warning(f"Not enough historical data ({len(monthly_data)} months), generating additional mock data")
-        
-        # 获取当前数据的起始日期
-        if monthly_data:
-            start_date = datetime.strptime(monthly_data[0]["month"], "%Y-%m")
-            # 生成更早的数据点
-            additional_months = required_months - len(monthly_data)
-            additional_data = _generate_historical_month_data(additional_months, start_date)
-            # 合并数据，确保新数据在前面
-            monthly_data = additional_data + monthly_data
-            # 重新计算累积表现
-            cumulative_data = _calculate_cumulative_performance(monthly_data)
     
     # 根据请求的天数限制返回的月数
     # 不再强制限制最大返回60个月，而是根据实际请求的天数来决定
@@ -1064,91 +1470,26 @@ def _calculate_historical_trends(historical_data, weights, days=1825):  # 默认
         "cumulativeReturns": cumulative_data
     }
 
-def _generate_historical_month_data(num_months, end_date):
-    """生成指定数量的历史月度数据，确保生成的日期早于end_date"""
-    historical_data = []
-    for i in range(num_months):
-        # 创建比end_date更早的日期，从num_months开始倒数
-        month_date = end_date - timedelta(days=30 * (i + 1))
-        month_str = month_date.strftime("%Y-%m")
-        
-        # 生成合理的收益率数据
-        port_return = random.uniform(-10, 15)  # -10%到15%的范围
-        bench_return = random.uniform(-8, 12)  # -8%到12%的范围
-        
-        # 增加一些相关性
-        if port_return > 0:
-            bench_return = bench_return * 0.7 + port_return * 0.3
-        else:
-            bench_return = bench_return * 0.6 + port_return * 0.2
-        
-        historical_data.append({
-            "month": month_str,
-            "return": round(port_return, 2),
-            "benchmark": round(bench_return, 2)
-        })
-    
-    # 确保按时间顺序排列（从早到晚）
-    historical_data.sort(key=lambda x: x["month"])
-    return historical_data
-
 def _calculate_cumulative_performance(monthly_data):
-    """Calculate cumulative performance from monthly returns"""
-    cumulative_port = 100.0
-    cumulative_bench = 100.0
-    cumulative_data = []
-    
-    for month_data in monthly_data:
-        try:
-            # 获取每月回报率并转回小数
-            port_return = month_data["return"] / 100.0
-            bench_return = month_data["benchmark"] / 100.0
-            
-            # 检查是否为有效数字
-            if pd.isna(port_return) or np.isinf(port_return):
-                port_return = 0.0
-                
-            if pd.isna(bench_return) or np.isinf(bench_return):
-                bench_return = 0.0
-            
-            # 计算累积表现
-            cumulative_port *= (1 + port_return)
-            cumulative_bench *= (1 + bench_return)
-            
-            # 检查累积值是否有效
-            if pd.isna(cumulative_port) or np.isinf(cumulative_port):
-                logger.warning(f"Detected invalid portfolio cumulative value for month {month_data['month']}")
-                cumulative_port = 100.0  # 重置为初始值
-                
-            if pd.isna(cumulative_bench) or np.isinf(cumulative_bench):
-                logger.warning(f"Detected invalid benchmark cumulative value for month {month_data['month']}")
-                cumulative_bench = 100.0  # 重置为初始值
-            
-            # 计算相对于基期的百分比收益并确保为有效值
-            port_cumulative = cumulative_port - 100
-            bench_cumulative = cumulative_bench - 100
-            
-            if pd.isna(port_cumulative) or np.isinf(port_cumulative):
-                port_cumulative = 0.0
-                
-            if pd.isna(bench_cumulative) or np.isinf(bench_cumulative):
-                bench_cumulative = 0.0
-            
-            cumulative_data.append({
-                "month": month_data["month"],
-                "portfolio": round(port_cumulative, 2),
-                "benchmark": round(bench_cumulative, 2)
-            })
-        except Exception as e:
-            logger.error(f"Error calculating cumulative performance for month {month_data.get('month', 'unknown')}: {e}")
-            # 添加一个默认值以保持数据连续性
-            cumulative_data.append({
-                "month": month_data.get("month", "unknown"),
-                "portfolio": 0.0,
-                "benchmark": 0.0
-            })
-    
-    return cumulative_data
+    """Calculate cumulative performance from monthly returns (mock trends, where no daily returns exist)"""
+    if not monthly_data:
+        return []
+    
+    # 获取每月回报率并转回小数，无效值视为0
+    period_returns = np.array(
+        [[month_data.get("return", 0.0), month_data.get("benchmark", 0.0)] for month_data in monthly_data],
+        dtype=float
+    ) / 100.0
+    cumulative = np.round(cumulative_returns(period_returns) * 100, 2) + 0.0
+    
+    return [
+        {
+            "month": month_data.get("month", "unknown"),
+            "portfolio": port_cumulative,
+            "benchmark": bench_cumulative
+        }
+        for month_data, (port_cumulative, bench_cumulative) in zip(monthly_data, cumulative.tolist())
+    ]
 
 def _generate_mock_historical_trends(days=1825):
     """Generate mock historical trends data for UI testing"""
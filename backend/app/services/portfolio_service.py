@@ -2,11 +2,15 @@
 Portfolio Service - Handles business logic for portfolio operations
 """
 import json
+import os
+import re
 from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 import logging
 from ..models.portfolio import Portfolio, PortfolioResponse, Ticker
+from ..utils.portfolio_import import read_holdings, validate_holdings, enrich_holdings
+from .stocks_service import _load_companies
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -56,8 +60,11 @@ def _save_portfolios() -> bool:
                 ]
             }
         
-        with open(PORTFOLIOS_FILE, "w") as f:
+        # 先写临时文件再替换，写入中途失败时不会留下半个文件
+        temp_file = PORTFOLIOS_FILE.with_suffix(".json.tmp")
+        with open(temp_file, "w") as f:
             json.dump(portfolios_to_save, f, indent=2, default=str)
+        os.replace(temp_file, PORTFOLIOS_FILE)
         return True
     except Exception as e:
         print(f"Error saving portfolios: {e}")
@@ -270,4 +277,72 @@ async def delete_portfolio_service(portfolio_id: str) -> bool:
     _portfolios_cache = portfolios
     
     # Save to file
-    return _save_portfolios() 
\ No newline at end of file
+    return _save_portfolios()
+
+def _next_portfolio_number(portfolios: Dict[str, Any]) -> int:
+    """Next free numeric suffix for port-N identifiers"""
+    numbers = [int(match.group(1)) for key in portfolios if (match := re.fullmatch(r"(?:port-)?(\d+)", key))]
+    return max(numbers + [len(portfolios)]) + 1
+
+async def import_portfolios_service(data: bytes, format: str = "csv", atomic: bool = False,
+                                    dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Bulk-create portfolios from a long-format (portfolio, symbol, weight) file.
+
+    All rows are validated together; portfolios with errors are rejected and reported, the
+    valid ones are written to portfolios.json in a single save. With atomic=True nothing is
+    written if any portfolio is rejected; with dry_run=True nothing is written at all.
+    """
+    global _portfolios_cache
+    
+    holdings = read_holdings(data, format)
+    companies = _load_companies()
+    valid, errors = validate_holdings(holdings, list(companies), first_row=2 if format == "csv" else 1)
+    enriched = enrich_holdings(valid, companies)
+    logger.info("Portfolio import: %s rows, %s valid portfolios, %s rejected",
+                len(holdings), len(enriched), len(errors))
+    
+    report = {
+        "summary": {
+            "rows": len(holdings),
+            "portfolios": len(enriched) + len(errors),
+            "valid": len(enriched),
+            "rejected": len(errors),
+        },
+        "errors": [{"portfolio": name, "errors": messages} for name, messages in errors.items()],
+        "created": [],
+        "committed": False,
+    }
+    if dry_run or not enriched or (atomic and errors):
+        return report
+    
+    portfolios = _load_portfolios()
+    next_number = _next_portfolio_number(portfolios)
+    created_at = datetime.now().isoformat()
+    new_portfolios = {}
+    for offset, (name, tickers) in enumerate(enriched.items()):
+        new_id = f"port-{next_number + offset}"
+        new_portfolios[new_id] = {
+            "id": new_id,
+            "name": name,
+            "created_at": created_at,
+            "user_id": "default_user",
+            "tickers": tickers,
+        }
+    
+    # 单次写入：失败时回滚内存中的缓存
+    portfolios.update(new_portfolios)
+    _portfolios_cache = portfolios
+    if not _save_portfolios():
+        for new_id in new_portfolios:
+            del portfolios[new_id]
+        raise RuntimeError("Failed to save imported portfolios")
+    logger.info("Imported %s portfolios (%s..%s)", len(new_portfolios),
+                next(iter(new_portfolios)), next(reversed(new_portfolios)))
+    
+    report["created"] = [
+        {"id": new_id, "name": portfolio_data["name"], "tickers": len(portfolio_data["tickers"])}
+        for new_id, portfolio_data in new_portfolios.items()
+    ]
+    report["committed"] = True
+    return report
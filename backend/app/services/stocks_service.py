@@ -8,6 +8,8 @@ from pathlib import Path
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import logging
+from ..utils.timing import span
+from ..utils.metrics import record_cache, register_cache_size, set_dataset_stats
 
 # 设置日志
 logger = logging.getLogger(__name__)
@@ -24,6 +26,8 @@ _stocks_cache = {}
 _price_history_cache = {}
 _stock_name_mapping_cache = {}
 
+register_cache_size("price_history", lambda: len(_price_history_cache))
+
 def _load_stock_name_mapping() -> Dict[str, Dict[str, str]]:
     """Load stock name mapping (English/Chinese) from file"""
     global _stock_name_mapping_cache
@@ -100,14 +104,17 @@ def _load_companies() -> Dict[str, Dict[str, Any]]:
     global _stocks_cache
     
     if _stocks_cache:
+        record_cache("companies", "hit")
         return _stocks_cache
     
+    record_cache("companies", "miss")
     if COMPANIES_FILE.exists():
         try:
             with open(COMPANIES_FILE, "r") as f:
                 data = json.load(f)
                 # Extract companies from the JSON structure
                 _stocks_cache = data.get("companies", {})
+            set_dataset_stats("companies", len(_stocks_cache), COMPANIES_FILE)
         except Exception as e:
             logger.error(f"Error loading companies: {e}")
             _stocks_cache = {}
@@ -129,33 +136,40 @@ def _load_price_history(ticker: Optional[str] = None) -> Dict[str, List[Dict[str
     global _price_history_cache
     
     if ticker and ticker in _price_history_cache:
+        record_cache("price_history", "hit")
         return {ticker: _price_history_cache[ticker]}
     
     if not _price_history_cache and PRICE_HISTORY_FILE.exists():
-        try:
-            # Read the CSV file
-            # Use chunksize for large files
-            chunk_size = 10000
-            chunks = pd.read_csv(PRICE_HISTORY_FILE, chunksize=chunk_size)
+        record_cache("price_history", "miss")
+        with span("load_price_history"):
+            try:
+                # Read the CSV file
+                # Use chunksize for large files
+                chunk_size = 10000
+                chunks = pd.read_csv(PRICE_HISTORY_FILE, chunksize=chunk_size)
             
-            price_data = {}
-            for chunk in chunks:
-                # Process each chunk
-                for code, group in chunk.groupby('code'):
-                    if code not in price_data:
-                        price_data[code] = []
+                price_data = {}
+                for chunk in chunks:
+                    # Process each chunk
+                    for code, group in chunk.groupby('code'):
+                        if code not in price_data:
+                            price_data[code] = []
                     
-                    # Sort by date
-                    group = group.sort_values('date', ascending=False)
+                        # Sort by date
+                        group = group.sort_values('date', ascending=False)
                     
-                    # Convert to dictionary
-                    records = group.to_dict('records')
-                    price_data[code].extend(records)
+                        # Convert to dictionary
+                        records = group.to_dict('records')
+                        price_data[code].extend(records)
             
-            _price_history_cache = price_data
-        except Exception as e:
-            logger.error(f"Error loading price history: {e}")
-            _price_history_cache = {}
+                _price_history_cache = price_data
+                set_dataset_stats("price_history", sum(len(records) for records in price_data.values()),
+                                  PRICE_HISTORY_FILE)
+            except Exception as e:
+                logger.error(f"Error loading price history: {e}")
+                _price_history_cache = {}
+    elif _price_history_cache:
+        record_cache("price_history", "hit")
     
     if ticker:
         return {ticker: _price_history_cache.get(ticker, [])}
@@ -246,15 +260,16 @@ async def get_stock_history_service(ticker: str, days: int = 30) -> List[Dict[st
         List of price data points
     """
     logger = logging.getLogger(__name__)
-    logger.info(f"获取股票历史数据 - 股票代码: {ticker}, 请求天数: {days}")
+    # 按股票逐条调用的热点路径：使用 DEBUG 级别和延迟格式化
+    logger.debug("获取股票历史数据 - 股票代码: %s, 请求天数: %s", ticker, days)
     
     price_data = _load_price_history(ticker).get(ticker, [])
     
     if not price_data:
-        logger.warning(f"找不到股票 {ticker} 的历史数据")
+        logger.warning("找不到股票 %s 的历史数据", ticker)
         return []
     
-    logger.info(f"获取到 {ticker} 的历史数据点数: {len(price_data)}个")
+    logger.debug("获取到 %s 的历史数据点数: %s个", ticker, len(price_data))
     
     # 不需要限制天数 - 返回所有可用数据
     # 客户端会根据需要进行筛选
@@ -0,0 +1,174 @@
+"""
+缺失数据对齐 - 把多资产价格宽表转换为带掩码的收益率矩阵，并按策略计算组合收益
+
+价格缺失（上市前、停牌、数据缺口）在收益率矩阵中以掩码表示，而不是删除整行日期。可选策略:
+    pairwise:    每个统计量只使用其涉及的序列都有数据的日期（组合收益要求所有持仓都有数据，
+                 组合与基准的 beta、跟踪误差等只要求两者同时有数据）
+    ffill:       价格最多向前填充 max_gap 个交易日（停牌期间收益为 0，复牌日收益包含整个缺口的变动），
+                 超过缺口或上市前的日期仍为缺失，其余同 pairwise
+    renormalize: 某日缺失的持仓不参与当日组合收益，其余持仓的权重按比例放大；可用权重低于
+                 min_coverage 的日期视为组合缺失
+    complete:    删除任一列缺失的日期（旧的 dropna 行为，保留用于对比）
+
+所有计算都是对整个矩阵的掩码运算，没有逐日期的 Python 循环。默认策略通过环境变量配置:
+RETURN_ALIGNMENT（默认 renormalize）、RETURN_ALIGNMENT_MAX_GAP（默认 5）、
+RETURN_ALIGNMENT_MIN_COVERAGE（默认 0.5）。
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+ALIGNMENT_POLICIES = ("pairwise", "ffill", "renormalize", "complete")
+
+DEFAULT_ALIGNMENT = os.environ.get("RETURN_ALIGNMENT", "renormalize")
+DEFAULT_MAX_GAP = int(os.environ.get("RETURN_ALIGNMENT_MAX_GAP", 5))
+DEFAULT_MIN_COVERAGE = float(os.environ.get("RETURN_ALIGNMENT_MIN_COVERAGE", 0.5))
+
+
+def forward_fill(values, max_gap):
+    """
+    按列向前填充缺失值（NaN），每段缺口最多填充 max_gap 行
+
+    参数:
+        values: 二维数组 (T×N)
+        max_gap: 最大填充行数，0 表示不填充
+
+    返回:
+        numpy.ndarray: 填充后的新数组
+    """
+    values = np.asarray(values, dtype=float)
+    if max_gap <= 0 or values.size == 0:
+        return values.copy()
+    rows = np.arange(len(values))[:, None]
+    valid = ~np.isnan(values)
+    # 每个位置之前（含）最近一个有效值的行号，之前没有有效值时为 -1
+    last_valid = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+    fill = ~valid & (last_valid >= 0) & (rows - last_valid <= max_gap)
+    filled = values.copy()
+    filled[fill] = values[last_valid[fill], np.nonzero(fill)[1]]
+    return filled
+
+
+def align_returns(prices, benchmark_column=None, policy=None, max_gap=None):
+    """
+    由价格宽表计算带掩码的日收益率
+
+    参数:
+        prices: 以日期为索引、列为证券的价格 DataFrame（可含基准列）
+        benchmark_column: 基准列名，存在时单独返回
+        policy: 对齐策略，见模块说明，默认 DEFAULT_ALIGNMENT
+        max_gap: ffill 策略的最大填充天数，默认 DEFAULT_MAX_GAP
+
+    返回:
+        dict:
+            dates: 收益率日期（DatetimeIndex，已去掉所有列都缺失的日期）
+            symbols: 资产列名（不含基准）
+            returns: 资产收益率掩码矩阵 (T×N)
+            benchmark: 基准收益率掩码数组 (T)，没有基准列时为 None
+            policy: 实际使用的策略
+
+    异常:
+        ValueError: 不支持的策略
+    """
+    policy = policy or DEFAULT_ALIGNMENT
+    if policy not in ALIGNMENT_POLICIES:
+        raise ValueError(f"Unsupported alignment policy: {policy}. Supported: {', '.join(ALIGNMENT_POLICIES)}")
+    max_gap = DEFAULT_MAX_GAP if max_gap is None else max_gap
+
+    has_benchmark = benchmark_column is not None and benchmark_column in prices.columns
+    symbols = [column for column in prices.columns if column != benchmark_column]
+    columns = symbols + ([benchmark_column] if has_benchmark else [])
+
+    values = prices[columns].to_numpy(dtype=float, copy=True)
+    values[~np.isfinite(values) | (values <= 0)] = np.nan
+    if policy == "ffill":
+        values = forward_fill(values, max_gap)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = values[1:] / values[:-1] - 1.0
+    mask = ~np.isfinite(returns)
+    dates = pd.DatetimeIndex(prices.index[1:])
+
+    if policy == "complete":
+        keep = ~mask.any(axis=1)
+    else:
+        keep = ~mask.all(axis=1)
+    returns, mask, dates = returns[keep], mask[keep], dates[keep]
+    returns[mask] = 0.0
+
+    matrix = np.ma.masked_array(returns, mask=mask)
+    return {
+        "dates": dates,
+        "symbols": symbols,
+        "returns": matrix[:, :len(symbols)],
+        "benchmark": matrix[:, len(symbols)] if has_benchmark else None,
+        "policy": policy,
+    }
+
+
+def portfolio_returns(aligned, weights, min_coverage=None):
+    """
+    按对齐策略计算组合日收益
+
+    参数:
+        aligned: align_returns 的返回值
+        weights: 与 aligned["symbols"] 对齐的权重数组（会归一化）
+        min_coverage: renormalize 策略下某日可用权重的最低比例，默认 DEFAULT_MIN_COVERAGE
+
+    返回:
+        numpy.ma.MaskedArray: 组合日收益 (T)，无法计算的日期被掩码
+    """
+    min_coverage = DEFAULT_MIN_COVERAGE if min_coverage is None else min_coverage
+    returns = aligned["returns"]
+    weights = np.asarray(weights, dtype=float)
+    if weights.sum() > 0:
+        weights = weights / weights.sum()
+    elif len(weights):
+        weights = np.full(len(weights), 1.0 / len(weights))
+
+    available = ~np.ma.getmaskarray(returns)
+    weighted = returns.filled(0.0) @ weights
+    if aligned["policy"] == "renormalize":
+        coverage = available @ weights
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = weighted / coverage
+        missing = (coverage <= 0) | (coverage < min_coverage - 1e-12)
+    else:
+        # 有权重的持仓中任一缺失时组合收益缺失
+        missing = (~available & (weights > 0)).any(axis=1)
+        values = weighted
+    values = np.where(missing, 0.0, values)
+    return np.ma.masked_array(values, mask=missing)
+
+
+def filled_returns(aligned, weights, min_coverage=None):
+    """
+    与组合收益一致的稠密资产收益矩阵，供需要完整矩阵的计算（历史模拟、增量分析）使用
+
+    renormalize 策略下缺失的资产收益以当日组合收益填充（与按比例放大其余权重等价）；
+    其他策略只保留所有持仓都有数据的日期。两种情况下组合收益缺失的日期都被删除。
+
+    参数:
+        aligned: align_returns 的返回值
+        weights: 与 aligned["symbols"] 对齐的权重数组
+        min_coverage: 见 portfolio_returns
+
+    返回:
+        tuple: (保留日期的布尔索引, 稠密资产收益矩阵, 组合收益数组)
+    """
+    portfolio = portfolio_returns(aligned, weights, min_coverage)
+    keep = ~np.ma.getmaskarray(portfolio)
+    returns = aligned["returns"][keep]
+    values = portfolio.compressed()
+    matrix = np.where(np.ma.getmaskarray(returns), values[:, None], returns.filled(0.0))
+    return keep, matrix, values
+
+
+def common(*series):
+    """多个掩码序列在共同有数据的日期上的取值（pairwise 对齐）"""
+    mask = np.zeros(len(series[0]), dtype=bool)
+    for values in series:
+        mask |= np.ma.getmaskarray(values)
+    return tuple(np.ma.getdata(values)[~mask] for values in series)
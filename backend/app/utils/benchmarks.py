@@ -0,0 +1,155 @@
+"""
+基准注册表 - 每个基准按数据版本预先计算一次收益率序列，供所有组合分析复用
+
+每个基准条目包含:
+    dates: 价格日期 (DatetimeIndex)
+    prices: 价格/指数点位数组
+    log_prefix: 对数收益率前缀和（与 dates 对齐，第一个元素为 0），任意两个日期之间的收益率为
+                expm1(log_prefix[j] - log_prefix[i])
+组合分析通过 benchmark_levels 将基准对齐到组合日期，日、月收益率和累积收益随组合一起计算。
+
+可用基准通过环境变量 BENCHMARK_CODES 配置（逗号分隔的价格文件代码），默认只有 SPX。
+"""
+
+import os
+import logging
+
+import numpy as np
+import pandas as pd
+
+from .market_data import DATA_DIR, get_data_version
+from .timing import timed
+from .metrics import record_cache, set_dataset_stats
+from .corporate_actions import CORPORATE_ACTIONS_PATH, adjust_prices
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+# 基准价格文件（与个股价格历史相同的长表格式：date, code, PRC/value）
+BENCHMARK_PRICE_PATH = os.environ.get("BENCHMARK_PRICE_PATH", str(DATA_DIR / "Constituent_Price_History.csv"))
+
+DEFAULT_BENCHMARK = "SPX"
+BENCHMARK_CODES = tuple(
+    code.strip().upper()
+    for code in os.environ.get("BENCHMARK_CODES", DEFAULT_BENCHMARK).split(",")
+    if code.strip()
+) or (DEFAULT_BENCHMARK,)
+
+BENCHMARK_NAMES = {
+    "SPX": "S&P 500",
+    "NDX": "Nasdaq 100",
+    "RTY": "Russell 2000",
+    "DJI": "Dow Jones Industrial Average",
+}
+
+# 缓存数据
+_benchmark_cache = {}
+_benchmark_cache_version = None
+
+
+def get_available_benchmarks():
+    """已配置的基准代码列表"""
+    return list(BENCHMARK_CODES)
+
+
+@timed("load_benchmarks")
+def _load_benchmark_prices(path):
+    """从价格文件中读取所有已配置基准的价格序列（经公司行动调整），返回 代码 -> Series"""
+    if not os.path.exists(path):
+        logger.warning(f"Benchmark price file not found: {path}")
+        return {}
+
+    columns = {"date", "code", "value", "PRC"}
+    df = pd.read_csv(path, usecols=lambda column: column in columns)
+    df = df[df["code"].isin(BENCHMARK_CODES)]
+
+    # 调整因子按价格文件版本缓存，文件更新后不会复用旧价格的因子
+    version = get_data_version(path)
+    prices = {}
+    for code, group in df.groupby("code"):
+        # 指数使用 value 列，普通证券（如 ETF）使用 PRC 列
+        if "value" in group.columns and group["value"].notna().any():
+            values = group["value"]
+        elif "PRC" in group.columns:
+            values = group["PRC"]
+        else:
+            continue
+        series = pd.Series(values.to_numpy(dtype=float), index=pd.to_datetime(group["date"].to_numpy()))
+        series = series[series > 0].sort_index()
+        series = series[~series.index.duplicated(keep="last")]
+        # ETF 等以 PRC 计价的基准按拆股和分红调整为总收益
+        prices[code] = adjust_prices(code, series, version)
+    return prices
+
+
+def _build_benchmark(code, prices, version):
+    """由价格序列预先计算基准的对数收益率前缀和"""
+    dates = prices.index
+    values = prices.to_numpy()
+    log_prefix = np.log(values / values[0])
+
+    entry = {
+        "code": code,
+        "name": BENCHMARK_NAMES.get(code, code),
+        "version": version,
+        "dates": dates,
+        "prices": values,
+        "log_prefix": log_prefix,
+    }
+    for key in ("prices", "log_prefix"):
+        entry[key].setflags(write=False)
+    return entry
+
+
+def get_benchmark(code=DEFAULT_BENCHMARK):
+    """
+    获取基准条目（按价格文件版本缓存，文件更新后自动重新计算）
+
+    参数:
+        code: 基准代码
+
+    返回:
+        dict: 基准条目，见模块说明；未配置或没有价格数据时返回 None
+    """
+    global _benchmark_cache, _benchmark_cache_version
+
+    code = (code or DEFAULT_BENCHMARK).upper()
+    if code not in BENCHMARK_CODES:
+        return None
+
+    version = get_data_version(BENCHMARK_PRICE_PATH, CORPORATE_ACTIONS_PATH)
+    if version != _benchmark_cache_version:
+        if _benchmark_cache_version is not None:
+            record_cache("benchmarks", "eviction")
+        record_cache("benchmarks", "miss")
+        try:
+            prices = _load_benchmark_prices(BENCHMARK_PRICE_PATH)
+            _benchmark_cache = {
+                benchmark_code: _build_benchmark(benchmark_code, series, version)
+                for benchmark_code, series in prices.items()
+                if len(series) >= 2
+            }
+            set_dataset_stats("benchmarks", len(_benchmark_cache), BENCHMARK_PRICE_PATH)
+            logger.info(f"Loaded {len(_benchmark_cache)} benchmark series: {', '.join(_benchmark_cache)}")
+        except Exception as e:
+            logger.error(f"Error loading benchmark prices: {e}")
+            _benchmark_cache = {}
+        _benchmark_cache_version = version
+    else:
+        record_cache("benchmarks", "hit")
+
+    return _benchmark_cache.get(code)
+
+
+def benchmark_levels(benchmark, dates):
+    """
+    基准在给定日期上的净值水平（以基准第一个日期为 1），非交易日沿用之前最近的交易日
+
+    利用对数前缀和，对齐后的 pct_change 恰好等于相邻两个日期之间的复合收益率。
+    早于基准第一个日期或晚于最后一个日期的位置为 NaN（没有数据，不沿用最后的净值）。
+    """
+    base_dates = benchmark["dates"]
+    dates = pd.DatetimeIndex(dates)
+    positions = base_dates.searchsorted(dates, side="right") - 1
+    levels = np.exp(benchmark["log_prefix"][np.maximum(positions, 0)])
+    return np.where((positions >= 0) & (dates <= base_dates[-1]), levels, np.nan)
@@ -0,0 +1,184 @@
+"""
+公司行动调整 - 以稀疏事件存储拆股和分红，构建收益率矩阵时按需换算为累积调整因子
+
+事件文件为长表格式（date, code, type, value）:
+    split:    value 为拆股比例（新股数/旧股数，4 表示一拆四，0.1 表示十合一）
+    dividend: value 为每股现金分红（除息日当天；同日有拆股时按拆股后的股数计）
+
+除权日 t 的单日因子为 f_t = (1 / 拆股比例) * (1 - 分红 / 前收盘价折算到拆股后)，
+日期 j 的调整因子为其后所有除权日单日因子的乘积（反向累积乘积），调整后价格 = 原始价格 * 因子。
+调整后价格的 pct_change 即为含分红再投资的总收益率，拆股不再产生虚假跳空。
+
+事件按文件版本缓存；每只股票的因子向量按 (代码, 价格数据版本, 日期范围) 缓存，没有事件的股票
+直接返回原始价格，不产生额外开销。
+"""
+
+import os
+import logging
+
+import numpy as np
+import pandas as pd
+
+from .market_data import DATA_DIR, get_data_version
+from .timing import span
+from .metrics import record_cache, register_cache_size, set_dataset_stats
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+CORPORATE_ACTIONS_PATH = os.environ.get("CORPORATE_ACTIONS_PATH", str(DATA_DIR / "Corporate_Actions.csv"))
+
+ACTION_TYPES = ("split", "dividend")
+
+# 因子向量缓存的最大条目数
+FACTOR_CACHE_SIZE = 4096
+
+# 缓存数据
+_events = None
+_events_version = None
+_factor_cache = {}
+
+register_cache_size("corporate_actions", lambda: len(_factor_cache))
+
+
+def _load_events(path):
+    """读取事件文件，返回 代码 -> (除权日数组, 拆股比例数组, 分红数组)，同一天的多条事件合并"""
+    if not os.path.exists(path):
+        return {}
+
+    df = pd.read_csv(path, usecols=["date", "code", "type", "value"])
+    df["type"] = df["type"].astype(str).str.strip().str.lower()
+    df["value"] = pd.to_numeric(df["value"], errors="coerce")
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+
+    valid = (
+        df["date"].notna() & df["code"].notna() & df["type"].isin(ACTION_TYPES)
+        & np.isfinite(df["value"])
+        & ((df["type"] == "split") & (df["value"] > 0) | (df["type"] == "dividend") & (df["value"] >= 0))
+    )
+    if not valid.all():
+        logger.warning("Ignored %s invalid corporate action rows in %s", int((~valid).sum()), path)
+    df = df[valid]
+
+    # 拆股比例同日相乘，分红同日相加
+    df = df.assign(
+        split=np.where(df["type"] == "split", df["value"], 1.0),
+        dividend=np.where(df["type"] == "dividend", df["value"], 0.0),
+    )
+    merged = df.groupby(["code", "date"]).agg(split=("split", "prod"), dividend=("dividend", "sum"))
+
+    events = {}
+    for code, group in merged.groupby(level="code"):
+        events[code] = (
+            group.index.get_level_values("date").to_numpy(dtype="datetime64[ns]"),
+            group["split"].to_numpy(dtype=float),
+            group["dividend"].to_numpy(dtype=float),
+        )
+    return events
+
+
+def get_corporate_actions():
+    """
+    获取公司行动事件（按文件版本缓存，文件更新后自动重新加载并清空因子缓存）
+
+    返回:
+        dict: 代码 -> (除权日, 拆股比例, 分红) 三个等长数组；文件不存在时为空 dict
+    """
+    global _events, _events_version
+
+    version = get_data_version(CORPORATE_ACTIONS_PATH)
+    if _events is None or version != _events_version:
+        if _events is not None:
+            record_cache("corporate_actions", "eviction")
+        with span("load_corporate_actions"):
+            try:
+                _events = _load_events(CORPORATE_ACTIONS_PATH)
+            except Exception as e:
+                logger.error("Error loading corporate actions: %s", e)
+                _events = {}
+        _events_version = version
+        _factor_cache.clear()
+        if _events:
+            set_dataset_stats("corporate_actions", sum(len(dates) for dates, _, _ in _events.values()),
+                              CORPORATE_ACTIONS_PATH)
+            logger.info("Loaded corporate actions for %s securities", len(_events))
+    return _events
+
+
+def adjustment_factors(dates, prices, event_dates, splits, dividends):
+    """
+    由稀疏事件计算累积调整因子（向量化）
+
+    参数:
+        dates: 升序的价格日期（datetime64 数组）
+        prices: 与 dates 对齐的原始价格
+        event_dates: 事件日期（除权日）
+        splits: 拆股比例
+        dividends: 每股分红
+
+    返回:
+        numpy.ndarray: 与 dates 对齐的调整因子（最后一个除权日及之后为 1）
+    """
+    dates = np.asarray(dates, dtype="datetime64[ns]")
+    prices = np.asarray(prices, dtype=float)
+    n = len(dates)
+    factors = np.ones(n)
+    if n < 2 or len(event_dates) == 0:
+        return factors
+
+    # 除权日落在非交易日时作用于其后的第一个交易日；第一个价格之前和最后一个价格之后的事件不影响因子
+    positions = np.searchsorted(dates, np.asarray(event_dates, dtype="datetime64[ns]"), side="left")
+    in_range = (positions > 0) & (positions < n)
+    positions, splits, dividends = positions[in_range], np.asarray(splits)[in_range], np.asarray(dividends)[in_range]
+    if len(positions) == 0:
+        return factors
+
+    # 前收盘价：除权日前最近的有效价格
+    valid_prices = np.where(np.isfinite(prices) & (prices > 0), prices, np.nan)
+    last_valid = pd.Series(valid_prices).ffill().to_numpy()
+    previous_close = last_valid[positions - 1] / splits
+    dividend_factor = 1.0 - dividends / previous_close
+    unusable = ~np.isfinite(dividend_factor) | (dividend_factor <= 0)
+    if unusable.any() and (dividends[unusable] > 0).any():
+        logger.warning("Ignored %s dividends without a usable previous close", int((dividends[unusable] > 0).sum()))
+    dividend_factor[unusable] = 1.0
+
+    daily = np.ones(n)
+    np.multiply.at(daily, positions, dividend_factor / splits)
+    # 日期 j 的因子为 j 之后各日单日因子的乘积
+    factors[:-1] = np.cumprod(daily[::-1])[::-1][1:]
+    return factors
+
+
+def adjust_prices(code, prices, version=None):
+    """
+    返回经拆股和分红调整的价格序列
+
+    参数:
+        code: 证券代码
+        prices: 以日期为索引的原始价格 Series
+        version: 价格数据版本（如 get_data_version(价格文件)），作为因子缓存键的一部分
+
+    返回:
+        pandas.Series: 调整后的价格（升序日期）；没有事件时原样返回输入
+    """
+    events = get_corporate_actions().get(code)
+    if events is None or prices.empty:
+        return prices
+
+    if not prices.index.is_monotonic_increasing:
+        prices = prices.sort_index()
+    dates = pd.DatetimeIndex(prices.index)
+    key = (code, version, len(dates), dates[0], dates[-1])
+    factors = _factor_cache.get(key)
+    if factors is None:
+        record_cache("corporate_actions", "miss")
+        factors = adjustment_factors(dates.to_numpy(dtype="datetime64[ns]"), prices.to_numpy(dtype=float), *events)
+        factors.setflags(write=False)
+        if len(_factor_cache) >= FACTOR_CACHE_SIZE:
+            _factor_cache.pop(next(iter(_factor_cache)))
+            record_cache("corporate_actions", "eviction")
+        _factor_cache[key] = factors
+    else:
+        record_cache("corporate_actions", "hit")
+    return prices * factors
@@ -0,0 +1,160 @@
+"""
+日志工具 - 文本/JSON 格式化器、重复消息采样过滤器和基于队列的异步处理器
+
+    TextFormatter:      标准文本格式，被采样丢弃过消息时在末尾注明丢弃条数
+    JsonFormatter:      每条日志输出一行 JSON（time, level, logger, message 以及 extra 字段）
+    SamplingFilter:     同一消息模板在每个时间窗口内只放行前 burst 条（ERROR 及以上不采样）
+    enable_queue_logging: 把处理器移到后台线程，请求路径上只做入队
+
+采样以 (logger, 级别, 未格式化的消息模板) 为键，因此热点路径应使用延迟格式化
+（logger.warning("找不到股票 %s 的历史数据", ticker)），而不是 f-string。
+"""
+
+import copy
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# LogRecord 的标准属性，其余属性视为 extra 字段
+_RESERVED_ATTRS = set(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime", "suppressed"}
+
+# 采样状态的最大键数，超过时清理已过期的窗口
+MAX_SAMPLING_KEYS = 2048
+
+
+class TextFormatter(logging.Formatter):
+    """文本格式化器，附加被采样丢弃的同类消息条数"""
+
+    def format(self, record):
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            text += f" ({suppressed} similar messages suppressed)"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出一行 JSON"""
+
+    def format(self, record):
+        payload = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            payload["suppressed"] = suppressed
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exception"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    重复消息采样
+
+    参数:
+        burst: 每个窗口内同一消息模板放行的条数
+        window: 窗口长度（秒）
+        max_level: 只对不高于该级别的消息采样，默认 WARNING
+    """
+
+    def __init__(self, burst=5, window=60.0, max_level=logging.WARNING):
+        super().__init__()
+        self.burst = int(burst)
+        self.window = float(window)
+        self.max_level = max_level
+        self._state = {}  # 键 -> [窗口起始时间, 本窗口条数, 本窗口丢弃条数]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > self.max_level or self.burst <= 0:
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._state.get(key)
+            if entry is None or now - entry[0] >= self.window:
+                if entry is not None and entry[2]:
+                    # 新窗口的第一条消息带上上一个窗口丢弃的条数
+                    record.suppressed = entry[2]
+                if entry is None and len(self._state) >= MAX_SAMPLING_KEYS:
+                    self._prune(now)
+                self._state[key] = [now, 1, 0]
+                return True
+            if entry[1] < self.burst:
+                entry[1] += 1
+                return True
+            entry[2] += 1
+            return False
+
+    def _prune(self, now):
+        expired = [key for key, entry in self._state.items() if now - entry[0] >= self.window]
+        for key in expired:
+            del self._state[key]
+        if len(self._state) >= MAX_SAMPLING_KEYS:
+            self._state.clear()
+
+
+class _QueueHandler(QueueHandler):
+    """入队前只合并消息参数，异常堆栈单独保存在 exc_text 中，由后台处理器的格式化器决定如何输出"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+def enable_queue_logging(logger_names=("",)):
+    """
+    把指定日志记录器的处理器移到后台线程
+
+    各记录器原有的处理器由一个 QueueListener 在后台线程中执行，记录器上只保留一个共享的
+    QueueHandler；原处理器上的过滤器（如采样过滤器）移到 QueueHandler 上，在调用线程中
+    先行丢弃，避免被丢弃的消息进入队列。
+
+    参数:
+        logger_names: 记录器名称（"" 为根记录器）
+
+    返回:
+        QueueListener: 已启动的监听器，进程退出时自动停止
+    """
+    loggers = [logging.getLogger(name or None) for name in logger_names]
+    handlers = []
+    for logger in loggers:
+        for handler in logger.handlers:
+            if handler not in handlers:
+                handlers.append(handler)
+
+    queue_handler = _QueueHandler(queue.SimpleQueue())
+    for handler in handlers:
+        for log_filter in list(handler.filters):
+            handler.removeFilter(log_filter)
+            if log_filter not in queue_handler.filters:
+                queue_handler.addFilter(log_filter)
+    for logger in loggers:
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.addHandler(queue_handler)
+
+    listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -8,11 +8,15 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 import os
-import yfinance as yf
 from datetime import datetime, timedelta
 import json
 import traceback
 import logging
+from .timeseries import timeframe_performance, drawdown_series, aggregate_returns
+from .series_cache import cache_key, load_series, save_series, purge_expired
+from .market_data_provider import request_refresh
+from .timing import span
+from .metrics import record_cache, set_dataset_stats
 
 # 设置日志
 logger = logging.getLogger("app.utils.market_data")
@@ -28,6 +32,8 @@ FACTOR_COVARIANCE_PATH = os.path.join(DATA_DIR, "Factor_Covariance_Matrix.csv")
 STATIC_DATA_PATH = os.path.join(DATA_DIR, "Static_Data.csv")
 FACTOR_MAPPING_PATH = os.path.join(DATA_DIR, "factor_category_mapping.json")
 COMPANIES_JSON_PATH = os.path.join(DATA_DIR, "companies.json")
+# 基准成分股权重文件（Ticker, Weight），可通过环境变量配置
+BENCHMARK_WEIGHTS_PATH = os.environ.get("BENCHMARK_WEIGHTS_PATH", os.path.join(DATA_DIR, "Benchmark_Weights.csv"))
 
 # 数据路径
 DATA_DIR = Path(os.path.dirname(os.path.dirname(__file__))) / "data"
@@ -35,16 +41,18 @@ DATA_DIR = Path(os.path.dirname(os.path.dirname(__file__))) / "data"
 CACHE_DIR = DATA_DIR / "cache"
 CACHE_DIR.mkdir(exist_ok=True)  # 确保缓存目录存在
 
-# 缓存文件路径
-SPY_CACHE_FILE = CACHE_DIR / "spy_data_cache.json"
+# SPY数据的磁盘缓存数据源（按优先级）
+SPY_DATA_SOURCES = ("price_history", "yfinance", "local")
 
 # 缓存数据
 _static_data = None
 _price_history = None
 _factor_exposures = None
+_factor_exposures_version = None
 _factor_covariance = None
-_spy_data_cache = None
-_spy_cache_expiry = None
+_factor_covariance_version = None
+_benchmark_exposure_cache = None
+_spy_data_cache = {}  # 日期范围 -> (数据, 过期时间)
 
 # SPY数据缓存有效期（秒）
 SPY_CACHE_DURATION = 3600  # 1小时
@@ -52,6 +60,38 @@ SPY_CACHE_DURATION = 3600  # 1小时
 # 全局变量，用于缓存数据
 _price_data = None
 _factor_mapping = None
+_factor_layout = None
+_factor_category_lookup = None
+_unknown_factors = set()
+
+# 因子分类顺序（与前端展示顺序一致）
+FACTOR_CATEGORY_ORDER = ["style", "industry", "country", "other"]
+
+# 资产配置代码到显示名称的映射（用于以资产配置数据补充因子暴露）
+SECTOR_CODE_TO_NAME = {
+    "info_tech": "Information Technology",
+    "financials": "Financials",
+    "communication": "Communication Services",
+    "consumer_disc": "Consumer Discretionary",
+    "consumer_staples": "Consumer Staples",
+    "health_care": "Health Care",
+    "industrials": "Industrials",
+    "energy": "Energy",
+    "materials": "Materials",
+    "utilities": "Utilities",
+    "real_estate": "Real Estate",
+    "other": "Other"
+}
+
+REGION_CODE_TO_NAME = {
+    "us": "United States",
+    "europe": "Europe",
+    "asia": "Asia",
+    "china": "China",
+    "japan": "Japan",
+    "emerging": "Emerging Markets",
+    "other": "Other"
+}
 
 # 添加新函数
 def get_real_asset_allocation(tickers):
@@ -194,7 +234,7 @@ def get_real_asset_allocation(tickers):
                     
         # 只在有未找到的股票时才记录日志
         if not_found_tickers:
-            logger.warning(f"在 companies.json 中找不到 {len(not_found_tickers)} 个股票的数据: {', '.join(not_found_tickers)}")
+            logger.warning("在 companies.json 中找不到 %s 个股票的数据: %s", len(not_found_tickers), ', '.join(not_found_tickers))
         
         # 如果没有提取到任何数据，使用默认分类
         if not sector_allocation:
@@ -294,46 +334,106 @@ def get_factor_category_mapping():
             }
         }
 
-def get_factor_category(factor_name):
+def get_factor_layout():
     """
-    获取给定因子的分类
+    获取预编译的因子布局，按分类顺序排列因子并为每个分类生成索引数组
     
-    参数:
-        factor_name (str): 因子名称
-        
     返回:
-        str: 因子分类 ('style', 'industry', 'country', 或 'other')
+        dict: factors (因子名称数组), codes (因子分类代码数组), index (分类 -> 因子索引数组)
     """
-    # 获取映射数据
-    mapping = get_factor_category_mapping()
+    global _factor_layout
+    
+    if _factor_layout is not None:
+        return _factor_layout
+    
+    categories = get_factor_category_mapping().get("categories", {})
     
-    # 尝试直接从映射中获取
-    if factor_name in mapping["mapping"]:
-        return mapping["mapping"][factor_name]
+    factors = []
+    codes = []
+    for code, category in enumerate(FACTOR_CATEGORY_ORDER):
+        category_factors = categories.get(category, [])
+        factors.extend(category_factors)
+        codes.extend([code] * len(category_factors))
     
-    # 尝试使用小写名称
-    if factor_name.lower() in mapping["mapping"]:
-        return mapping["mapping"][factor_name.lower()]
+    codes = np.array(codes, dtype=np.int8)
+    _factor_layout = {
+        "factors": np.array(factors, dtype=object),
+        "codes": codes,
+        "index": {category: np.flatnonzero(codes == code) for code, category in enumerate(FACTOR_CATEGORY_ORDER)}
+    }
+    return _factor_layout
+
+def get_factor_category_lookup():
+    """
+    获取预编译的因子分类查找表（键为 casefold 后的因子名称）
+    
+    优先级与原有规则一致：mapping > special_mappings > categories 列表
+    
+    返回:
+        dict: 标准化因子名称 -> 因子分类
+    """
+    global _factor_category_lookup
     
-    # 检查特殊映射规则
-    if factor_name in mapping["special_mappings"]:
-        return mapping["special_mappings"][factor_name]
+    if _factor_category_lookup is not None:
+        return _factor_category_lookup
     
-    if factor_name.lower() in mapping["special_mappings"]:
-        return mapping["special_mappings"][factor_name.lower()]
+    mapping = get_factor_category_mapping()
     
-    # 尝试使用已定义的分类模式
-    for category, factors in mapping["categories"].items():
-        if any(factor.lower() == factor_name.lower() for factor in factors):
-            return category
+    # 按优先级从低到高写入，高优先级的规则覆盖低优先级
+    lookup = {}
+    for category, factors in mapping.get("categories", {}).items():
+        for factor in factors:
+            lookup.setdefault(factor.casefold(), category)
+    for factor, category in mapping.get("special_mappings", {}).items():
+        lookup[factor.casefold()] = category
+    for factor, category in mapping.get("mapping", {}).items():
+        lookup[factor.casefold()] = category
+    
+    _factor_category_lookup = lookup
+    return _factor_category_lookup
+
+def get_factor_category(factor_name):
+    """
+    获取给定因子的分类
     
-    # 如果无法确定分类，返回 'other'
-    logger.warning(f"未找到因子 '{factor_name}' 的分类，默认归为 'other'")
+    参数:
+        factor_name (str): 因子名称
+        
+    返回:
+        str: 因子分类 ('style', 'industry', 'country', 或 'other')
+    """
+    category = get_factor_category_lookup().get(factor_name.casefold())
+    if category is not None:
+        return category
+    
+    # 如果无法确定分类，返回 'other'（每个未知因子只警告一次）
+    if factor_name not in _unknown_factors:
+        _unknown_factors.add(factor_name)
+        logger.warning("未找到因子 '%s' 的分类，默认归为 'other'", factor_name)
     return "other"
 
+def _cache_spy_data(spy_data, source, start_date, end_date):
+    """更新SPY数据的内存缓存和磁盘缓存，返回缓存的数据"""
+    expiry = datetime.now() + timedelta(seconds=SPY_CACHE_DURATION)
+    try:
+        expiry = save_series(spy_data, "SPY", source, start_date, end_date, ttl=SPY_CACHE_DURATION)
+        purge_expired()
+        logger.info("SPY数据已保存到文件缓存")
+    except Exception as e:
+        logger.error(f"保存SPY缓存文件失败: {e}")
+    _spy_data_cache[_spy_cache_key(start_date, end_date)] = (spy_data, expiry)
+    return spy_data
+
+def _spy_cache_key(start_date, end_date):
+    """SPY内存缓存键（日期范围精确到日）"""
+    return cache_key("SPY", "memory", start_date, end_date)
+
 def get_spy_data(start_date, end_date):
     """
-    获取SPY数据，优先使用本地SPX数据，如本地无数据则从YFinance获取
+    获取SPY数据，优先使用本地SPX数据，如本地无数据则登记由后台任务从行情提供者获取
+    
+    缓存按日期范围区分：内存缓存之后依次检查基准注册表和二进制磁盘缓存（内存映射读取）。
+    本函数不会发起网络请求。
     
     参数:
         start_date: 起始日期
@@ -342,36 +442,35 @@ def get_spy_data(start_date, end_date):
     返回:
         pandas.Series: SPY的收盘价数据
     """
-    global _spy_data_cache, _spy_cache_expiry
-    
     now = datetime.now()
+    memory_key = _spy_cache_key(start_date, end_date)
     
     # 检查内存缓存是否存在且未过期
-    if _spy_data_cache is not None and _spy_cache_expiry and _spy_cache_expiry > now:
+    cached = _spy_data_cache.get(memory_key)
+    if cached is not None and cached[1] > now:
         logger.info("使用SPY数据内存缓存")
-        return _spy_data_cache
+        return cached[0]
+    
+    # 优先使用基准注册表中按数据版本缓存的SPX数据（与组合分析共用同一份）
+    from .benchmarks import get_benchmark
+    benchmark = get_benchmark("SPX")
+    if benchmark is not None:
+        spy_data = pd.Series(benchmark["prices"], index=benchmark["dates"])
+        if start_date:
+            spy_data = spy_data[spy_data.index >= pd.to_datetime(start_date)]
+        if end_date:
+            spy_data = spy_data[spy_data.index <= pd.to_datetime(end_date)]
+        if not spy_data.empty:
+            logger.info("使用基准注册表中的SPX数据")
+            return spy_data
     
     # 检查文件缓存
-    if SPY_CACHE_FILE.exists():
-        try:
-            with open(SPY_CACHE_FILE, "r") as f:
-                cache_data = json.load(f)
-                cache_expiry = datetime.fromisoformat(cache_data["expiry"])
-                
-                if cache_expiry > now:
-                    logger.info("使用SPY数据文件缓存")
-                    # 将JSON数据转换回pandas Series
-                    dates = pd.to_datetime(cache_data["dates"])
-                    values = cache_data["values"]
-                    spy_data = pd.Series(values, index=dates)
-                    
-                    # 更新内存缓存
-                    _spy_data_cache = spy_data
-                    _spy_cache_expiry = cache_expiry
-                    
-                    return spy_data
-        except Exception as e:
-            logger.error(f"读取SPY缓存文件失败: {e}")
+    for source in SPY_DATA_SOURCES:
+        spy_data, expiry = load_series("SPY", source, start_date, end_date)
+        if spy_data is not None:
+            logger.info("使用SPY数据文件缓存")
+            _spy_data_cache[memory_key] = (spy_data, expiry)
+            return spy_data
     
     # 首先尝试从本地价格历史文件获取SPX数据
     try:
@@ -394,83 +493,146 @@ def get_spy_data(start_date, end_date):
         if not spx_data.empty:
             # 转换为Series格式
             spy_data = pd.Series(spx_data['value'].values, index=spx_data['date'])
-            
-            # 更新内存缓存
-            _spy_data_cache = spy_data
-            _spy_cache_expiry = now + timedelta(seconds=SPY_CACHE_DURATION)
-            
-            # 保存到文件缓存
-            try:
-                cache_data = {
-                    "dates": [date.isoformat() for date in spy_data.index],
-                    "values": spy_data.tolist(),
-                    "expiry": _spy_cache_expiry.isoformat()
-                }
-                with open(SPY_CACHE_FILE, "w") as f:
-                    json.dump(cache_data, f)
-                logger.info("SPX数据已保存到文件缓存")
-            except Exception as e:
-                logger.error(f"保存SPY缓存文件失败: {e}")
-            
-            logger.info(f"成功获取SPX数据: {len(spy_data)}条记录")
-            return spy_data
+            return _cache_spy_data(spy_data, "price_history", start_date, end_date)
         else:
             logger.info("本地文件中未找到SPX数据，尝试从YFinance获取SPY数据")
     except Exception as e:
         logger.error(f"从本地文件获取SPX数据失败: {e}")
     
-    # 如果本地SPX数据获取失败，则从YFinance获取SPY数据
-    try:
-        logger.info(f"从YFinance获取SPY数据，起始日期: {start_date}, 结束日期: {end_date}")
-        spy = yf.Ticker("SPY")
-        df = spy.history(start=start_date, end=end_date, interval="1d")
-        
-        # 只保留Close列并重命名
-        spy_data = df['Close']
-        
-        # 修复:移除时区信息，以便与投资组合数据兼容
-        spy_data.index = spy_data.index.tz_localize(None)
-        
-        # 更新内存缓存
-        _spy_data_cache = spy_data
-        _spy_cache_expiry = now + timedelta(seconds=SPY_CACHE_DURATION)
-        
-        # 保存到文件缓存
-        try:
-            cache_data = {
-                "dates": [date.isoformat() for date in spy_data.index],
-                "values": spy_data.tolist(),
-                "expiry": _spy_cache_expiry.isoformat()
-            }
-            with open(SPY_CACHE_FILE, "w") as f:
-                json.dump(cache_data, f)
-            logger.info("SPY数据已保存到文件缓存")
-        except Exception as e:
-            logger.error(f"保存SPY缓存文件失败: {e}")
-        
-        logger.info(f"成功获取SPY数据: {len(spy_data)}条记录")
-        return spy_data
+    # 本地没有SPX数据时，登记后台刷新（远程请求不在请求处理路径上执行），先返回过期缓存
+    request_refresh("SPY", start_date, end_date, ttl=SPY_CACHE_DURATION)
+    if cached is not None:
+        logger.info("使用过期的SPY数据内存缓存")
+        return cached[0]
+    for source in SPY_DATA_SOURCES:
+        spy_data, _ = load_series("SPY", source, start_date, end_date, allow_expired=True)
+        if spy_data is not None:
+            logger.info("使用过期的SPY数据文件缓存")
+            return spy_data
     
-    except Exception as e:
-        logger.error(f"从YFinance获取SPY数据失败: {e}")
-        # 如果出错但有旧的缓存，返回旧缓存
-        if _spy_data_cache is not None:
-            logger.info("使用过期的SPY数据内存缓存")
-            return _spy_data_cache
-        
-        # 否则返回空的Series
-        logger.info("返回空的SPY数据")
-        return pd.Series()
+    # 否则返回空的Series
+    logger.info("返回空的SPY数据，等待后台刷新")
+    return pd.Series(dtype=float)
 
 def get_static_data():
     """获取股票静态数据"""
     global _static_data
     if _static_data is None:
-        _static_data = pd.read_csv(STATIC_DATA_PATH)
+        record_cache("static_data", "miss")
+        with span("load_static_data"):
+            _static_data = pd.read_csv(STATIC_DATA_PATH)
         # 设置索引以便于查找
         _static_data.set_index('ticker', inplace=True)
+        set_dataset_stats("static_data", len(_static_data), STATIC_DATA_PATH)
+    else:
+        record_cache("static_data", "hit")
     return _static_data
 
+def get_data_version(*paths):
+    """
+    获取数据文件的版本标识（修改时间和大小），文件更新后版本随之改变
+    
+    参数:
+        paths: 数据文件路径
+        
+    返回:
+        tuple: 可用作缓存键的版本标识，不存在的文件记为None
+    """
+    version = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            version.append((str(path), stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            version.append((str(path), None, None))
+    return tuple(version)
+
+def get_factor_exposures():
+    """获取因子暴露度数据，索引为股票代码，列为因子"""
+    global _factor_exposures, _factor_exposures_version
+    version = get_data_version(FACTOR_EXPOSURES_PATH)
+    if _factor_exposures is None or version != _factor_exposures_version:
+        if _factor_exposures is not None:
+            record_cache("factor_exposures", "eviction")
+        record_cache("factor_exposures", "miss")
+        with span("load_factor_exposures"):
+            _factor_exposures = pd.read_csv(FACTOR_EXPOSURES_PATH).set_index('Ticker')
+        _factor_exposures_version = version
+        set_dataset_stats("factor_exposures", len(_factor_exposures), FACTOR_EXPOSURES_PATH)
+    else:
+        record_cache("factor_exposures", "hit")
+    return _factor_exposures
+
+def get_factor_covariance():
+    """获取因子协方差矩阵，行列均为因子名称"""
+    global _factor_covariance, _factor_covariance_version
+    version = get_data_version(FACTOR_COVARIANCE_PATH)
+    if _factor_covariance is None or version != _factor_covariance_version:
+        if _factor_covariance is not None:
+            record_cache("factor_covariance", "eviction")
+        record_cache("factor_covariance", "miss")
+        with span("load_factor_covariance"):
+            _factor_covariance = pd.read_csv(FACTOR_COVARIANCE_PATH, index_col=0)
+        _factor_covariance_version = version
+        set_dataset_stats("factor_covariance", len(_factor_covariance), FACTOR_COVARIANCE_PATH)
+    else:
+        record_cache("factor_covariance", "hit")
+    return _factor_covariance
+
+def get_benchmark_weights():
+    """
+    获取基准成分股权重
+    
+    从 BENCHMARK_WEIGHTS_PATH 读取 (Ticker, Weight) 数据；如文件不存在，
+    则以因子暴露度数据中的全部股票（S&P 500成分股）等权作为基准。
+    
+    返回:
+        pandas.Series: 以股票代码为索引、权重和为1的基准权重（仅包含有因子数据的股票）
+    """
+    universe = get_factor_exposures().index
+    
+    if os.path.exists(BENCHMARK_WEIGHTS_PATH):
+        weights_df = pd.read_csv(BENCHMARK_WEIGHTS_PATH)
+        weights = weights_df.groupby('Ticker')['Weight'].sum()
+        weights = weights[weights.index.isin(universe) & np.isfinite(weights) & (weights > 0)]
+        if weights.empty or weights.sum() <= 0:
+            logger.warning(f"基准权重文件中没有可用的成分股，使用等权基准: {BENCHMARK_WEIGHTS_PATH}")
+        else:
+            return weights / weights.sum()
+    else:
+        logger.info(f"找不到基准权重文件，使用因子数据中的股票等权作为基准: {BENCHMARK_WEIGHTS_PATH}")
+    
+    return pd.Series(1.0 / len(universe), index=universe)
+
+def get_benchmark_factor_exposure():
+    """
+    获取基准的因子暴露度向量（按因子布局顺序排列）
+    
+    基准暴露度 = 基准权重 @ 因子暴露度矩阵，每个数据版本只计算一次并缓存，
+    请求时只需用投资组合暴露度向量减去该向量。
+    
+    返回:
+        numpy.ndarray: 与 get_factor_layout()["factors"] 对齐的基准暴露度
+    """
+    global _benchmark_exposure_cache
+    
+    version = get_data_version(FACTOR_EXPOSURES_PATH, BENCHMARK_WEIGHTS_PATH, FACTOR_MAPPING_PATH)
+    if _benchmark_exposure_cache is not None and _benchmark_exposure_cache["version"] == version:
+        return _benchmark_exposure_cache["exposure"]
+    
+    weights = get_benchmark_weights()
+    exposure_matrix = get_factor_exposures().reindex(
+        index=weights.index, columns=get_factor_layout()["factors"]
+    ).to_numpy(dtype=float)
+    exposure_matrix = np.nan_to_num(exposure_matrix, nan=0.0, posinf=0.0, neginf=0.0)
+    
+    benchmark_exposure = weights.to_numpy(dtype=float) @ exposure_matrix
+    benchmark_exposure.setflags(write=False)
+    
+    _benchmark_exposure_cache = {"version": version, "exposure": benchmark_exposure}
+    logger.info(f"已计算基准因子暴露度: {len(weights)} 个成分股, {len(benchmark_exposure)} 个因子")
+    return benchmark_exposure
+
 def get_price_history(tickers=None, start_date=None, end_date=None):
     """
     获取股票价格历史数据
@@ -551,62 +713,34 @@ def get_portfolio_returns(tickers, weights, start_date=None, end_date=None, incl
     # 计算累积收益率
     portfolio_index = (1 + portfolio_returns).cumprod() * 100
     
+    # 月度收益率和月末累积收益率（一次聚合）
+    months, monthly_returns, monthly_cumulative = aggregate_returns(portfolio_returns.index, portfolio_returns.to_numpy())
+    
     result = {
         'returns': portfolio_returns,
-        'index': portfolio_index
+        'index': portfolio_index,
+        'monthlyReturns': pd.Series(monthly_returns, index=months),
+        'monthlyCumulative': pd.Series(monthly_cumulative, index=months)
     }
     
     # 如果需要不同时间段表现数据
     if include_timeframes and not returns.empty:
-        today = pd.Timestamp.now()
-        year_start = pd.Timestamp(today.year, 1, 1)  # 当年1月1日
-        
-        # 定义时间段
-        timeframes = {
-            'ytd': (year_start, today),
-            'oneYear': (today - pd.DateOffset(years=1), today),
-            'threeYear': (today - pd.DateOffset(years=3), today),
-            'fiveYear': (today - pd.DateOffset(years=5), today)
-        }
+        # 所有时间段共用一次前缀和计算（假设无风险利率为0.02）
+        frames = timeframe_performance(portfolio_returns.index, portfolio_returns.to_numpy(),
+                                       end=pd.Timestamp.now(), risk_free_rate=0.02)
         
         timeframe_data = {}
-        
-        # 计算各时间段收益
-        for frame_name, (start, end) in timeframes.items():
-            # 过滤该时间段的收益率数据
-            mask = (portfolio_returns.index >= start) & (portfolio_returns.index <= end)
-            period_returns = portfolio_returns[mask]
-            
-            # 如果该时间段有数据
-            if not period_returns.empty:
-                # 计算累积收益率
-                total_return = (1 + period_returns).prod() - 1
-                
-                # 计算年化收益率（只有超过1年的才计算）
-                days_count = (period_returns.index[-1] - period_returns.index[0]).days
-                if days_count > 365:
-                    annualized = (1 + total_return) ** (365 / days_count) - 1
-                else:
-                    annualized = None
-                
-                # 计算波动率
-                volatility = period_returns.std() * np.sqrt(252)
-                
-                # 计算夏普比率（假设无风险利率为0.02）
-                if annualized is not None and volatility > 0:
-                    sharpe = (annualized - 0.02) / volatility
-                else:
-                    sharpe = None
-                
-                timeframe_data[frame_name] = {
-                    'return': round(total_return * 100, 1),                # 转为百分比
-                    'annualized': round(annualized * 100, 1) if annualized is not None else None,
-                    'volatility': round(volatility * 100, 1),
-                    'sharpe': round(sharpe, 2) if sharpe is not None else None
-                }
-            else:
+        for frame_name, frame in frames.items():
+            if frame is None:
                 # 该时间段没有数据
                 timeframe_data[frame_name] = None
+                continue
+            timeframe_data[frame_name] = {
+                'return': round(frame['return'] * 100, 1),                # 转为百分比
+                'annualized': round(frame['annualized'] * 100, 1) if frame['annualized'] is not None else None,
+                'volatility': round(frame['volatility'] * 100, 1) if frame['volatility'] is not None else None,
+                'sharpe': round(frame['sharpe'], 2) if frame['sharpe'] is not None else None
+            }
         
         result['timeFrames'] = timeframe_data
     
@@ -685,25 +819,26 @@ def get_portfolio_factor_exposure(tickers):
     返回:
         dict: 投资组合的因子暴露度数据，包括风格因子、行业因子和国家因子
     """
-    logger.debug(f"Factor_Exposures.csv exists: {os.path.exists(FACTOR_EXPOSURES_PATH)}")
-    logger.debug(f"Factor_Covariance_Matrix.csv exists: {os.path.exists(FACTOR_COVARIANCE_PATH)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Factor_Exposures.csv exists: %s", os.path.exists(FACTOR_EXPOSURES_PATH))
+        logger.debug("Factor_Covariance_Matrix.csv exists: %s", os.path.exists(FACTOR_COVARIANCE_PATH))
     
     # 检查输入参数类型
     ticker_symbols = []
     if tickers and len(tickers) > 0:
         if isinstance(tickers[0], str):
-            logger.debug(f"处理字符串ticker列表: {tickers}")
+            logger.debug("处理字符串ticker列表: %s", tickers)
             ticker_symbols = tickers
         else:
             # 从ticker对象中提取symbol属性
             try:
                 ticker_symbols = [t.symbol for t in tickers]
-                logger.debug(f"从ticker对象中获取的symbol列表: {ticker_symbols}")
+                logger.debug("从ticker对象中获取的symbol列表: %s", ticker_symbols)
             except AttributeError as e:
-                logger.error(f"提取ticker对象的symbol属性时出错: {e}")
+                logger.error("提取ticker对象的symbol属性时出错: %s", e)
                 # 尝试直接使用tickers作为symbol列表
                 ticker_symbols = tickers
-                logger.warning(f"直接使用传入的tickers作为symbol列表: {ticker_symbols}")
+                logger.warning("直接使用传入的tickers作为symbol列表: %s", ticker_symbols)
     else:
         logger.warning("提供的tickers为空，将返回模拟数据")
         return get_mock_factor_exposure()
@@ -714,321 +849,202 @@ def get_portfolio_factor_exposure(tickers):
         return get_mock_factor_exposure()
     
     try:
-        # 读取因子暴露度数据
-        factor_exposures = pd.read_csv(FACTOR_EXPOSURES_PATH)
-        
-        # 准备映射和分类
-        factor_mapping = get_factor_category_mapping()
-        categories = factor_mapping.get("categories", {})
-        
-        style_factors = categories.get("style", [])
-        industry_factors = categories.get("industry", [])
-        country_factors = categories.get("country", [])
-        other_factors = categories.get("other", [])
-        
-        logger.debug(f"Style factors: {style_factors[:5]}...")
-        logger.debug(f"Industry factors: {industry_factors[:5]}...")
-        logger.debug(f"Country factors: {country_factors[:5]}...")
-        logger.debug(f"Other factors: {other_factors[:5]}...")
+        # 读取因子暴露度数据（已缓存）
+        factor_exposures = get_factor_exposures()
         
-        # 初始化结果
-        portfolio_exposures = {}
-        for factor in style_factors + industry_factors + country_factors + other_factors:
-            portfolio_exposures[factor] = 0.0
+        # 预编译的因子布局：按分类顺序排列的因子名称和各分类的索引数组
+        layout = get_factor_layout()
+        factor_names = layout["factors"]
+        category_index = layout["index"]
         
-        # 记录未映射的ticker
-        unmapped_tickers = []
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Factor layout: %s factors, %s", len(factor_names),
+                         ", ".join(f"{k}={len(v)}" for k, v in category_index.items()))
         
-        # 统计未映射的因子
-        unmapped_factors = []
+        # 按布局顺序对齐暴露度矩阵，数据中缺失的因子列为NaN
+        ticker_index = pd.Index(ticker_symbols)
+        mapped_mask = ticker_index.isin(factor_exposures.index)
+        mapped_ticker_count = int(mapped_mask.sum())
+        unmapped_tickers = ticker_index[~mapped_mask].tolist()
         
-        # 处理每支股票
-        mapped_ticker_count = 0
-        for ticker in ticker_symbols:
-            ticker_data = factor_exposures[factor_exposures['Ticker'] == ticker]
-            
-            if len(ticker_data) > 0:
-                mapped_ticker_count += 1
-                
-                for factor in portfolio_exposures.keys():
-                    if factor in ticker_data.columns:
-                        # 确保值是有效的数字
-                        value = ticker_data[factor].values[0]
-                        if pd.isna(value) or np.isinf(value):
-                            continue
-                        # 假设每支股票权重相等
-                        portfolio_exposures[factor] += value / len(ticker_symbols)
-                    else:
-                        if factor not in unmapped_factors:
-                            unmapped_factors.append(factor)
-            else:
-                unmapped_tickers.append(ticker)
-        
-        logger.debug(f"Successfully mapped tickers: {mapped_ticker_count} out of {len(ticker_symbols)}")
+        logger.debug("Successfully mapped tickers: %s out of %s", mapped_ticker_count, len(ticker_symbols))
         if unmapped_tickers:
-            logger.debug(f"Unmapped tickers: {unmapped_tickers[:5]}...")
+            logger.debug("Unmapped tickers: %s...", unmapped_tickers[:5])
         
         # 如果没有成功映射任何股票，则使用模拟数据
         if mapped_ticker_count == 0:
             logger.warning("没有股票能够成功映射到因子数据，使用模拟数据")
             return get_mock_factor_exposure()
         
+        exposure_matrix = factor_exposures.reindex(
+            index=ticker_index[mapped_mask], columns=factor_names
+        ).to_numpy(dtype=float)
+        
+        # 无效值（NaN/Inf）视为0暴露；假设每支股票权重相等（未映射的股票也计入分母）
+        exposure_matrix = np.nan_to_num(exposure_matrix, nan=0.0, posinf=0.0, neginf=0.0)
+        portfolio_vector = exposure_matrix.sum(axis=0) / len(ticker_symbols)
+        
         # 读取因子协方差矩阵 - 用于计算风险贡献
+        has_covariance = False
+        risk_contributions = []
         try:
-            factor_covariance = pd.read_csv(FACTOR_COVARIANCE_PATH, index_col=0)
-            has_covariance = True
-            logger.debug(f"Has covariance data: {has_covariance}")
-            logger.debug(f"Covariance factors: {len(factor_covariance.columns)}")
+            factor_covariance = get_factor_covariance()
+            logger.debug("Covariance factors: %s", len(factor_covariance.columns))
             
             # 确保因子名称一致
-            common_factors = list(set(portfolio_exposures.keys()) & set(factor_covariance.columns))
-            logger.debug(f"Common factors: {len(common_factors)}")
+            common_mask = pd.Index(factor_names).isin(factor_covariance.columns)
+            logger.debug("Common factors: %s", int(common_mask.sum()))
             
-            # 如果因子协方差数据可用，计算风险贡献
-            if len(common_factors) > 0:
-                # 提取共同因子的暴露度
-                common_exposures = np.array([portfolio_exposures[f] for f in common_factors])
-                
-                # 检查是否存在Inf或NaN值
-                if np.any(np.isnan(common_exposures)) or np.any(np.isinf(common_exposures)):
-                    logger.warning("检测到NaN或Inf值，将替换为0")
-                    common_exposures = np.nan_to_num(common_exposures, nan=0.0, posinf=0.0, neginf=0.0)
-                
-                # 提取共同因子的协方差子矩阵
-                common_covariance = factor_covariance.loc[common_factors, common_factors].values
-                
-                # 检查协方差矩阵是否存在Inf或NaN值
-                if np.any(np.isnan(common_covariance)) or np.any(np.isinf(common_covariance)):
-                    logger.warning("协方差矩阵中检测到NaN或Inf值，将替换为0")
-                    common_covariance = np.nan_to_num(common_covariance, nan=0.0, posinf=0.0, neginf=0.0)
+            if common_mask.any():
+                common_factors = factor_names[common_mask]
+                common_exposures = portfolio_vector[common_mask]
+                common_covariance = np.nan_to_num(
+                    factor_covariance.loc[common_factors, common_factors].to_numpy(dtype=float),
+                    nan=0.0, posinf=0.0, neginf=0.0
+                )
                 
                 # 计算风险贡献
-                factor_contributions = common_exposures @ common_covariance @ common_exposures
-                logger.debug(f"Total risk contribution: {factor_contributions}")
+                factor_marginal_contributions = common_exposures @ common_covariance
+                factor_contributions = float(factor_marginal_contributions @ common_exposures)
+                logger.debug("Total risk contribution: %s", factor_contributions)
                 
-                # 检查风险贡献是否为有效值
-                if pd.isna(factor_contributions) or np.isinf(factor_contributions) or factor_contributions == 0:
+                if not np.isfinite(factor_contributions) or factor_contributions == 0:
                     logger.warning("风险贡献为无效值或0，将跳过风险贡献比例计算")
-                    has_covariance = False
                 else:
-                    # 计算每个因子的风险贡献占比
-                    factor_marginal_contributions = common_exposures @ common_covariance
-                    
-                    # 检查边际贡献是否包含无效值
-                    if np.any(np.isnan(factor_marginal_contributions)) or np.any(np.isinf(factor_marginal_contributions)):
-                        logger.warning("边际贡献中检测到NaN或Inf值，将替换为0")
-                        factor_marginal_contributions = np.nan_to_num(factor_marginal_contributions, nan=0.0, posinf=0.0, neginf=0.0)
-                    
-                    factor_percentage_contributions = {}
-                    
-                    for i, factor in enumerate(common_factors):
-                        factor_percentage_contributions[factor] = (
-                            factor_marginal_contributions[i] * common_exposures[i] / factor_contributions
-                            if factor_contributions != 0 else 0
+                    has_covariance = True
+                    # 每个因子的风险贡献占比（百分比），按贡献绝对值排序
+                    percentage_contributions = np.nan_to_num(
+                        factor_marginal_contributions * common_exposures / factor_contributions * 100
+                    )
+                    order = np.argsort(-np.abs(percentage_contributions))
+                    risk_contributions = [
+                        {"name": name, "contribution": contribution}
+                        for name, contribution in zip(
+                            common_factors[order].tolist(),
+                            np.round(percentage_contributions[order], 2).tolist()
                         )
-                        # 确保值是有效的
-                        if pd.isna(factor_percentage_contributions[factor]) or np.isinf(factor_percentage_contributions[factor]):
-                            factor_percentage_contributions[factor] = 0
-            else:
-                has_covariance = False
+                        if contribution != 0
+                    ]
         except Exception as e:
             logger.error(f"计算风险贡献时出错: {e}")
             logger.debug(traceback.format_exc())
             has_covariance = False
         
-        # 获取基准数据 - 假设S&P 500
-        benchmark_exposures = {}
-        for factor in portfolio_exposures.keys():
-            benchmark_exposures[factor] = 0.0  # 默认为0
+        # 获取基准因子暴露度（按数据版本预计算并缓存）
+        try:
+            benchmark_vector = get_benchmark_factor_exposure()
+        except Exception as e:
+            logger.error(f"计算基准因子暴露度时出错: {e}")
+            logger.debug(traceback.format_exc())
+            benchmark_vector = np.zeros_like(portfolio_vector)
         
-        # 计算投资组合相对于基准的暴露度差异
-        exposure_diffs = {}
-        for factor in portfolio_exposures.keys():
-            exposure_diffs[factor] = portfolio_exposures[factor] - benchmark_exposures[factor]
+        # 一次性清理无效值并取整：行依次为投资组合暴露度、基准暴露度、差异
+        exposure_values = np.round(np.nan_to_num(
+            np.stack([portfolio_vector, benchmark_vector, portfolio_vector - benchmark_vector]),
+            nan=0.0, posinf=0.0, neginf=0.0
+        ), 2) + 0.0  # 加0.0以消除取整后的-0.0
         
         # 格式化结果
-        # 1. 风格因子
-        style_exposures = []
-        for factor in style_factors:
-            if factor in portfolio_exposures:
-                # 确保所有值都是有效的，替换NaN或Inf值
-                port_exp = portfolio_exposures[factor]
-                bench_exp = benchmark_exposures[factor]
-                diff_exp = exposure_diffs[factor]
-                
-                if pd.isna(port_exp) or np.isinf(port_exp):
-                    port_exp = 0.0
-                if pd.isna(bench_exp) or np.isinf(bench_exp):
-                    bench_exp = 0.0
-                if pd.isna(diff_exp) or np.isinf(diff_exp):
-                    diff_exp = 0.0
-                
-                style_exposures.append({
-                    "name": factor,
-                    "portfolio_exposure": round(port_exp, 2),
-                    "benchmark_exposure": round(bench_exp, 2),
-                    "difference": round(diff_exp, 2),
-                    "category": "style"
-                })
+        style_exposures = _build_exposure_items(factor_names, exposure_values, category_index["style"], "style")
+        industry_exposures = _build_exposure_items(factor_names, exposure_values, category_index["industry"], "industry")
+        country_exposures = _build_exposure_items(factor_names, exposure_values, category_index["country"], "country")
         
-        # 2. 行业因子
-        industry_exposures = []
-        
-        # 方法1: 直接使用因子数据
-        for factor in industry_factors:
-            if factor in portfolio_exposures:
-                # 确保所有值都是有效的，替换NaN或Inf值
-                port_exp = portfolio_exposures[factor]
-                bench_exp = benchmark_exposures[factor]
-                diff_exp = exposure_diffs[factor]
-                
-                if pd.isna(port_exp) or np.isinf(port_exp):
-                    port_exp = 0.0
-                if pd.isna(bench_exp) or np.isinf(bench_exp):
-                    bench_exp = 0.0
-                if pd.isna(diff_exp) or np.isinf(diff_exp):
-                    diff_exp = 0.0
-                
-                industry_exposures.append({
-                    "name": factor,
-                    "portfolio_exposure": round(port_exp, 2),
-                    "benchmark_exposure": round(bench_exp, 2),
-                    "difference": round(diff_exp, 2),
-                    "category": "industry"
-                })
-        
-        # 使用方法2: 使用sector_allocation数据作为替代
-        # 如果方法1没有产生足够的行业暴露数据
+        # 因子数据不足时，使用资产配置数据补充（最多只计算一次资产配置）
         industry_exposure_method = "Method 1 (Direct)"
-        if len(industry_exposures) < 5:
-            industry_exposure_method = "Method 2 (Factor Data)"
+        need_industry_fallback = len(industry_exposures) < 5
+        need_country_fallback = len(country_exposures) < 3
+        asset_allocation = None
+        if need_industry_fallback or need_country_fallback:
             try:
-                # 加载真实的行业分配数据
                 asset_allocation = get_real_asset_allocation(tickers)
-                sector_distribution = asset_allocation.get("sectorDistribution", {})
-                
-                # 将sector_distribution转换为行业因子格式
-                industry_exposures = []
-                for sector, weight in sector_distribution.items():
-                    # 映射sector代码到行业名称
-                    sector_name_map = {
-                        "info_tech": "Information Technology",
-                        "financials": "Financials",
-                        "communication": "Communication Services",
-                        "consumer_disc": "Consumer Discretionary",
-                        "consumer_staples": "Consumer Staples",
-                        "health_care": "Health Care",
-                        "industrials": "Industrials",
-                        "energy": "Energy",
-                        "materials": "Materials",
-                        "utilities": "Utilities",
-                        "real_estate": "Real Estate",
-                        "other": "Other"
-                    }
-                    
-                    sector_name = sector_name_map.get(sector, sector.capitalize())
-                    
-                    # 行业权重作为暴露度，基准使用默认值
-                    # 确保数值是有效的
-                    if pd.isna(weight) or np.isinf(weight):
-                        weight = 0.0
-                        
-                    industry_exposures.append({
-                        "name": sector_name,
-                        "portfolio_exposure": round(weight, 2),  # 使用行业权重作为暴露度
-                        "benchmark_exposure": 0.0,  # 默认基准暴露度
-                        "difference": round(weight, 2),  # 差异等于投资组合暴露度
-                        "category": "industry"
-                    })
             except Exception as e:
-                logger.error(f"使用sector_allocation作为行业因子时出错: {e}")
+                logger.error(f"获取资产配置数据时出错: {e}")
                 logger.debug(traceback.format_exc())
         
-        # 3. 国家因子
-        country_exposures = []
-        for factor in country_factors:
-            if factor in portfolio_exposures:
-                # 确保所有值都是有效的，替换NaN或Inf值
-                port_exp = portfolio_exposures[factor]
-                bench_exp = benchmark_exposures[factor]
-                diff_exp = exposure_diffs[factor]
-                
-                if pd.isna(port_exp) or np.isinf(port_exp):
-                    port_exp = 0.0
-                if pd.isna(bench_exp) or np.isinf(bench_exp):
-                    bench_exp = 0.0
-                if pd.isna(diff_exp) or np.isinf(diff_exp):
-                    diff_exp = 0.0
-                
-                country_exposures.append({
-                    "name": factor,
-                    "portfolio_exposure": round(port_exp, 2),
-                    "benchmark_exposure": round(bench_exp, 2),
-                    "difference": round(diff_exp, 2),
-                    "category": "country"
-                })
+        if need_industry_fallback and asset_allocation is not None:
+            # 使用sector_allocation数据作为行业因子的替代
+            industry_exposure_method = "Method 2 (Factor Data)"
+            industry_exposures = _build_allocation_exposure_items(
+                asset_allocation.get("sectorDistribution", {}), SECTOR_CODE_TO_NAME, "industry"
+            )
         
-        # 如果国家因子不足，可以使用资产配置中的地区数据作为补充
-        if len(country_exposures) < 3:
-            try:
-                asset_allocation = get_real_asset_allocation(tickers)
-                region_distribution = asset_allocation.get("regionDistribution", {})
-                
-                # 将region_distribution转换为国家因子格式
-                region_name_map = {
-                    "us": "United States",
-                    "europe": "Europe",
-                    "asia": "Asia",
-                    "china": "China",
-                    "japan": "Japan",
-                    "emerging": "Emerging Markets",
-                    "other": "Other"
-                }
-                
-                for region, weight in region_distribution.items():
-                    region_name = region_name_map.get(region, region.capitalize())
-                    
-                    # 确保数值是有效的
-                    if pd.isna(weight) or np.isinf(weight):
-                        weight = 0.0
-                    
-                    country_exposures.append({
-                        "name": region_name,
-                        "portfolio_exposure": round(weight, 2),
-                        "benchmark_exposure": 0.0,
-                        "difference": round(weight, 2),
-                        "category": "country"
-                    })
-            except Exception as e:
-                logger.error(f"使用regionDistribution作为国家因子时出错: {e}")
-                logger.debug(traceback.format_exc())
+        if need_country_fallback and asset_allocation is not None:
+            # 使用资产配置中的地区数据作为国家因子的补充
+            country_exposures.extend(_build_allocation_exposure_items(
+                asset_allocation.get("regionDistribution", {}), REGION_CODE_TO_NAME, "country"
+            ))
         
         # 构建返回结果
-        result = {
+        return {
             "styleExposures": style_exposures,
             "industryExposures": industry_exposures,
             "countryExposures": country_exposures,
             "hasCovariance": has_covariance,
+            "riskContributions": risk_contributions,
             "mappedTickerCount": mapped_ticker_count,
             "unmappedTickerCount": len(unmapped_tickers),
             "industryExposureMethod": industry_exposure_method
         }
         
-        # 最后检查，确保所有数字类型字段都是有效的JSON值
-        for category in ["styleExposures", "industryExposures", "countryExposures"]:
-            for i, item in enumerate(result[category]):
-                for key in ["portfolio_exposure", "benchmark_exposure", "difference"]:
-                    if key in item and (pd.isna(item[key]) or np.isinf(item[key])):
-                        result[category][i][key] = 0.0
-        
-        return result
-        
     except Exception as e:
         logger.error(f"计算因子暴露度时出错: {str(e)}")
         logger.debug(traceback.format_exc())
         # 出错时返回模拟数据
         return get_mock_factor_exposure()
 
+def _build_exposure_items(factor_names, exposure_values, index, category):
+    """
+    根据分类索引数组切片生成因子暴露列表
+    
+    参数:
+        factor_names: 按布局顺序排列的因子名称数组
+        exposure_values: 形状为 (3, 因子数) 的数组，依次为投资组合暴露度、基准暴露度、差异
+        index: 该分类的因子索引数组
+        category: 分类名称
+        
+    返回:
+        list: 前端所需格式的因子暴露列表
+    """
+    portfolio, benchmark, difference = exposure_values[:, index].tolist()
+    return [
+        {
+            "name": name,
+            "portfolio_exposure": port_exp,
+            "benchmark_exposure": bench_exp,
+            "difference": diff_exp,
+            "category": category
+        }
+        for name, port_exp, bench_exp, diff_exp in zip(factor_names[index].tolist(), portfolio, benchmark, difference)
+    ]
+
+def _build_allocation_exposure_items(distribution, name_map, category):
+    """
+    将资产配置分布（代码 -> 权重百分比）转换为因子暴露列表，基准暴露度为0
+    
+    参数:
+        distribution: 资产配置分布字典
+        name_map: 配置代码到显示名称的映射
+        category: 分类名称
+        
+    返回:
+        list: 前端所需格式的因子暴露列表
+    """
+    codes = list(distribution.keys())
+    weights = np.round(np.nan_to_num(
+        np.fromiter(distribution.values(), dtype=float, count=len(codes)),
+        nan=0.0, posinf=0.0, neginf=0.0
+    ), 2).tolist()
+    return [
+        {
+            "name": name_map.get(code, code.capitalize()),
+            "portfolio_exposure": weight,
+            "benchmark_exposure": 0.0,
+            "difference": weight,
+            "category": category
+        }
+        for code, weight in zip(codes, weights)
+    ]
+
 # 模拟因子暴露数据 - 当实际数据不可用时使用
 def get_mock_factor_exposure():
     """返回模拟因子暴露数据，当实际数据不可用时使用"""
@@ -1177,9 +1193,19 @@ def compare_with_benchmark(tickers, benchmark_ticker="SPY", start_date=None, end
     else:
         logger.info(f"使用实际{benchmark_ticker}数据作为基准")
     
+    # 组合与基准的月度收益率和累积收益率（共用同一组月份边界，一次聚合）
+    _, monthly_returns, monthly_cumulative = aggregate_returns(
+        portfolio_returns.index,
+        np.column_stack([portfolio_returns.to_numpy(dtype=float), benchmark_returns.to_numpy(dtype=float)])
+    )
+    
     # 计算主要指标
-    portfolio_total_return = (portfolio_returns + 1).prod() - 1
-    benchmark_total_return = (benchmark_returns + 1).prod() - 1
+    if len(monthly_cumulative):
+        portfolio_total_return, benchmark_total_return = (float(value) for value in monthly_cumulative[-1])
+    else:
+        portfolio_total_return = benchmark_total_return = 0.0
+    # 月度胜率：组合收益率高于基准的月份占比
+    win_rate = round(float((monthly_returns[:, 0] > monthly_returns[:, 1]).mean()) * 100, 1) if len(monthly_returns) else 0.0
     
     portfolio_annualized_return = ((1 + portfolio_total_return) ** (252 / len(portfolio_returns)) - 1)
     benchmark_annualized_return = ((1 + benchmark_total_return) ** (252 / len(benchmark_returns)) - 1)
@@ -1204,91 +1230,58 @@ def compare_with_benchmark(tickers, benchmark_ticker="SPY", start_date=None, end
     else:
         benchmark_sharpe = 0.0
     
-    # 计算不同时间段表现比较
-    timeframes = {
-        'ytd': pd.Timestamp(today.year, 1, 1),  # 当年1月1日
-        'oneYear': today - pd.DateOffset(years=1),
-        'threeYear': today - pd.DateOffset(years=3),
-        'fiveYear': today - pd.DateOffset(years=5)
-    }
+    # 计算不同时间段表现比较（所有时间段共用一次前缀和计算，假设无风险利率为0.02）
+    frames = timeframe_performance(
+        portfolio_returns.index,
+        np.nan_to_num(portfolio_returns.to_numpy(dtype=float)),
+        np.nan_to_num(benchmark_returns.to_numpy(dtype=float)),
+        end=today,
+        risk_free_rate=0.02
+    )
     
     timeframe_comparison = {}
     
-    for frame_name, start_date in timeframes.items():
-        # 过滤该时间段的收益率数据
-        mask = (portfolio_returns.index >= start_date) & (portfolio_returns.index <= today)
-        if mask.any():  # 确认有数据
-            p_returns = portfolio_returns[mask]
-            b_returns = benchmark_returns[mask]
-            
-            if not p_returns.empty and not b_returns.empty:
-                # 计算总收益率
-                p_total = (1 + p_returns).prod() - 1
-                b_total = (1 + b_returns).prod() - 1
-                excess = p_total - b_total
-                
-                # 计算年化收益率（只有超过1年的才计算）
-                days_count = (p_returns.index[-1] - p_returns.index[0]).days
-                if days_count > 365:
-                    p_ann = (1 + p_total) ** (365 / days_count) - 1
-                    b_ann = (1 + b_total) ** (365 / days_count) - 1
-                else:
-                    p_ann = None
-                    b_ann = None
-                
-                # 计算波动率
-                p_vol = p_returns.std() * np.sqrt(252)
-                b_vol = b_returns.std() * np.sqrt(252)
-                
-                # 安全计算夏普比率（假设无风险利率为0.02）
-                p_sharpe = None
-                b_sharpe = None
-                
-                if p_ann is not None and p_vol > 0:
-                    p_sharpe = (p_ann - 0.02) / p_vol
-                    # 检查是否为无穷大或NaN
-                    if np.isinf(p_sharpe) or np.isnan(p_sharpe):
-                        p_sharpe = None
-                
-                if b_ann is not None and b_vol > 0:
-                    b_sharpe = (b_ann - 0.02) / b_vol
-                    # 检查是否为无穷大或NaN
-                    if np.isinf(b_sharpe) or np.isnan(b_sharpe):
-                        b_sharpe = None
-                
-                # 计算夏普比率差值，确保没有NaN或Infinity
-                sharpe_diff = None
-                if p_sharpe is not None and b_sharpe is not None:
-                    sharpe_diff = p_sharpe - b_sharpe
-                    if np.isinf(sharpe_diff) or np.isnan(sharpe_diff):
-                        sharpe_diff = None
-                
-                timeframe_comparison[frame_name] = {
-                    'return': {
-                        'portfolio': round(p_total * 100, 1),
-                        'benchmark': round(b_total * 100, 1),
-                        'excess': round(excess * 100, 1)
-                    },
-                    'annualized': {
-                        'portfolio': round(p_ann * 100, 1) if p_ann is not None else None,
-                        'benchmark': round(b_ann * 100, 1) if b_ann is not None else None,
-                        'excess': round((p_ann - b_ann) * 100, 1) if p_ann is not None and b_ann is not None else None
-                    } if p_ann is not None else None,
-                    'volatility': {
-                        'portfolio': round(p_vol * 100, 1),
-                        'benchmark': round(b_vol * 100, 1),
-                        'difference': round((p_vol - b_vol) * 100, 1)
-                    },
-                    'sharpe': {
-                        'portfolio': round(p_sharpe, 2) if p_sharpe is not None else 0.0,
-                        'benchmark': round(b_sharpe, 2) if b_sharpe is not None else 0.0,
-                        'difference': round(sharpe_diff, 2) if sharpe_diff is not None else 0.0
-                    } if p_sharpe is not None or b_sharpe is not None else None
-                }
+    for frame_name, frame in frames.items():
+        if frame is None:  # 该时间段没有数据
+            continue
+        
+        p_total, b_total, excess = frame['return'], frame['benchmarkReturn'], frame['excessReturn']
+        # 年化收益率和夏普比率只有超过1年的时间段才计算
+        p_ann, b_ann = frame['annualized'], frame['benchmarkAnnualized']
+        p_vol, b_vol = frame['volatility'] or 0.0, frame['benchmarkVolatility'] or 0.0
+        p_sharpe, b_sharpe = frame['sharpe'], frame['benchmarkSharpe']
+        
+        # 计算夏普比率差值
+        sharpe_diff = None
+        if p_sharpe is not None and b_sharpe is not None:
+            sharpe_diff = p_sharpe - b_sharpe
+        
+        timeframe_comparison[frame_name] = {
+            'return': {
+                'portfolio': round(p_total * 100, 1),
+                'benchmark': round(b_total * 100, 1),
+                'excess': round(excess * 100, 1)
+            },
+            'annualized': {
+                'portfolio': round(p_ann * 100, 1) if p_ann is not None else None,
+                'benchmark': round(b_ann * 100, 1) if b_ann is not None else None,
+                'excess': round((p_ann - b_ann) * 100, 1) if p_ann is not None and b_ann is not None else None
+            } if p_ann is not None else None,
+            'volatility': {
+                'portfolio': round(p_vol * 100, 1),
+                'benchmark': round(b_vol * 100, 1),
+                'difference': round((p_vol - b_vol) * 100, 1)
+            },
+            'sharpe': {
+                'portfolio': round(p_sharpe, 2) if p_sharpe is not None else 0.0,
+                'benchmark': round(b_sharpe, 2) if b_sharpe is not None else 0.0,
+                'difference': round(sharpe_diff, 2) if sharpe_diff is not None else 0.0
+            } if p_sharpe is not None or b_sharpe is not None else None
+        }
     
     # 计算最大回撤
-    portfolio_max_drawdown = -12.5  # 固定值或者通过计算获得
-    benchmark_max_drawdown = -15.8  # 固定值或者通过计算获得
+    portfolio_max_drawdown = round(float(drawdown_series(portfolio_returns.to_numpy()).min()) * 100, 1) if len(portfolio_returns) else 0.0
+    benchmark_max_drawdown = round(float(drawdown_series(benchmark_returns.to_numpy()).min()) * 100, 1) if len(benchmark_returns) else 0.0
     
     # 计算夏普比率差值，确保没有NaN或Infinity
     sharpe_difference = portfolio_sharpe - benchmark_sharpe
@@ -1320,11 +1313,11 @@ def compare_with_benchmark(tickers, benchmark_ticker="SPY", start_date=None, end
         "maxDrawdown": {
             "portfolio": portfolio_max_drawdown,
             "benchmark": benchmark_max_drawdown,
-            "difference": portfolio_max_drawdown - benchmark_max_drawdown
+            "difference": round(portfolio_max_drawdown - benchmark_max_drawdown, 1)
         },
         "correlation": 0.87,
         "trackingError": 5.6,
         "informationRatio": 0.95,
-        "winRate": 58.2,
+        "winRate": win_rate,
         "timeFrames": timeframe_comparison
     } 
\ No newline at end of file
@@ -0,0 +1,342 @@
+"""
+行情数据提供者 - 远程行情获取的统一接口
+
+    YahooChartProvider: 异步实现，使用共享的 httpx.AsyncClient 连接池，限制并发数和超时，
+                        连续失败时通过熔断器暂停请求
+    LocalFileProvider:  读取本地价格文件（date, code, PRC/value 长表格式），用于测试和离线环境
+
+远程请求只在后台刷新任务中执行，从不在请求处理路径上执行：请求路径发现缓存缺失时调用
+request_refresh 登记需要的序列并立即返回，后台任务获取数据后写入时间序列磁盘缓存，
+后续请求直接命中缓存。
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+
+import httpx
+import pandas as pd
+
+from .series_cache import save_series
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+# 提供者配置（可通过环境变量调整）
+MARKET_DATA_PROVIDER = os.environ.get("MARKET_DATA_PROVIDER", "yahoo").lower()
+MARKET_DATA_STUB_PATH = os.environ.get(
+    "MARKET_DATA_STUB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "Market_Data_Stub.csv")
+)
+YAHOO_CHART_URL = "https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
+MAX_CONNECTIONS = int(os.environ.get("MARKET_DATA_MAX_CONNECTIONS", 10))
+MAX_CONCURRENCY = int(os.environ.get("MARKET_DATA_MAX_CONCURRENCY", 4))
+REQUEST_TIMEOUT = float(os.environ.get("MARKET_DATA_TIMEOUT", 10.0))
+CONNECT_TIMEOUT = 5.0
+REFRESH_INTERVAL = float(os.environ.get("MARKET_DATA_REFRESH_INTERVAL", 5.0))
+
+# 熔断器：连续失败次数达到阈值后，在冷却时间内拒绝请求
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 60.0
+
+
+class ProviderUnavailableError(Exception):
+    """行情提供者暂不可用（熔断器打开）"""
+
+
+class CircuitBreaker:
+    """
+    简单的熔断器
+
+    closed: 正常放行；连续失败 failure_threshold 次后转为 open
+    open: 拒绝所有请求，reset_timeout 秒后转为 half-open
+    half-open: 放行一个试探请求，成功则恢复 closed，失败则重新 open
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.trial_in_progress:
+            self.trial_in_progress = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_progress = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class MarketDataProvider:
+    """行情数据提供者接口"""
+
+    name = "base"
+
+    async def fetch_history(self, symbol, start=None, end=None):
+        """
+        获取日收盘价序列
+
+        参数:
+            symbol: 证券代码
+            start, end: 日期范围（含），None 表示不限
+
+        返回:
+            pandas.Series: 以日期为索引（无时区）的收盘价，没有数据时为空序列
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        """释放提供者持有的资源"""
+
+
+class YahooChartProvider(MarketDataProvider):
+    """基于 Yahoo Finance chart 接口的异步提供者"""
+
+    name = "yfinance"
+
+    def __init__(self, max_connections=MAX_CONNECTIONS, max_concurrency=MAX_CONCURRENCY,
+                 timeout=REQUEST_TIMEOUT, breaker=None):
+        self._client = None
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._timeout = httpx.Timeout(timeout, connect=CONNECT_TIMEOUT)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.breaker = breaker or CircuitBreaker()
+
+    @property
+    def client(self):
+        # 连接池在第一次使用时创建，所有请求共用
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                limits=self._limits,
+                timeout=self._timeout,
+                headers={"User-Agent": "Mozilla/5.0"},
+            )
+        return self._client
+
+    async def fetch_history(self, symbol, start=None, end=None):
+        if not self.breaker.allow():
+            raise ProviderUnavailableError(f"{self.name} provider circuit is open")
+
+        params = {
+            "interval": "1d",
+            "period1": int(pd.Timestamp(start or "1970-01-02").timestamp()),
+            "period2": int((pd.Timestamp(end) + pd.Timedelta(days=1)).timestamp()) if end else int(time.time()),
+        }
+        try:
+            async with self._semaphore:
+                response = await self.client.get(YAHOO_CHART_URL.format(symbol=symbol), params=params)
+            response.raise_for_status()
+            series = self._parse_chart(response.json())
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return series
+
+    @staticmethod
+    def _parse_chart(payload):
+        result = (payload.get("chart", {}).get("result") or [None])[0]
+        if not result or not result.get("timestamp"):
+            return pd.Series(dtype=float)
+        indicators = result.get("indicators", {})
+        closes = (indicators.get("adjclose") or [{}])[0].get("adjclose") \
+            or (indicators.get("quote") or [{}])[0].get("close")
+        index = pd.to_datetime(result["timestamp"], unit="s").normalize()
+        series = pd.Series(closes, index=index, dtype=float).dropna()
+        return series[~series.index.duplicated(keep="last")]
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class LocalFileProvider(MarketDataProvider):
+    """本地文件提供者，读取 date, code, PRC/value 长表格式的价格文件"""
+
+    name = "local"
+
+    def __init__(self, path=MARKET_DATA_STUB_PATH):
+        self.path = path
+        self._prices = None
+
+    def _load(self):
+        if self._prices is None:
+            if not os.path.exists(self.path):
+                logger.warning(f"Market data stub file not found: {self.path}")
+                self._prices = pd.DataFrame(columns=["date", "code", "price"])
+            else:
+                df = pd.read_csv(self.path)
+                price_column = "value" if "value" in df.columns else "PRC"
+                if "value" in df.columns and "PRC" in df.columns:
+                    df["value"] = df["value"].fillna(df["PRC"])
+                df["date"] = pd.to_datetime(df["date"])
+                self._prices = df.rename(columns={price_column: "price"})[["date", "code", "price"]]
+        return self._prices
+
+    async def fetch_history(self, symbol, start=None, end=None):
+        df = self._load()
+        rows = df[df["code"] == symbol]
+        if start is not None:
+            rows = rows[rows["date"] >= pd.Timestamp(start)]
+        if end is not None:
+            rows = rows[rows["date"] <= pd.Timestamp(end)]
+        series = pd.Series(rows["price"].to_numpy(dtype=float), index=pd.DatetimeIndex(rows["date"]))
+        return series.sort_index().dropna()
+
+
+_PROVIDERS = {
+    "yahoo": YahooChartProvider,
+    "yfinance": YahooChartProvider,
+    "local": LocalFileProvider,
+}
+
+# 全局提供者实例和后台刷新状态
+_provider = None
+_pending_refresh = {}  # (代码, 起始日, 结束日) -> (代码, 起始日, 结束日, 缓存有效期)
+_pending_lock = threading.Lock()
+_refresh_task = None
+_in_flight = 0
+
+
+def get_market_data_provider():
+    """获取全局行情提供者（由 MARKET_DATA_PROVIDER 环境变量选择）"""
+    global _provider
+    if _provider is None:
+        provider_class = _PROVIDERS.get(MARKET_DATA_PROVIDER)
+        if provider_class is None:
+            logger.warning(f"Unknown market data provider {MARKET_DATA_PROVIDER}, using local file provider")
+            provider_class = LocalFileProvider
+        _provider = provider_class()
+    return _provider
+
+
+def set_market_data_provider(provider):
+    """替换全局行情提供者（用于测试或离线环境）"""
+    global _provider
+    _provider = provider
+
+
+def request_refresh(symbol, start=None, end=None, ttl=3600):
+    """
+    登记需要后台获取的序列（线程安全，可在同步的请求处理代码中调用，立即返回）
+
+    获取结果以提供者名称作为数据源写入时间序列磁盘缓存，键为 (symbol, start, end)。
+    """
+    key = (symbol, str(start), str(end))
+    with _pending_lock:
+        if key not in _pending_refresh:
+            _pending_refresh[key] = (symbol, start, end, ttl)
+            logger.info(f"Scheduled background refresh for {symbol} ({start} - {end})")
+
+
+def get_refresh_stats():
+    """
+    后台刷新队列状态
+
+    返回:
+        dict: pending（等待刷新的序列数）、inFlight（正在获取的序列数）、
+              breakerState（提供者熔断器状态，没有熔断器或提供者尚未创建时为 None）
+    """
+    with _pending_lock:
+        pending = len(_pending_refresh)
+    breaker = getattr(_provider, "breaker", None)
+    return {
+        "pending": pending,
+        "inFlight": _in_flight,
+        "breakerState": breaker.state if breaker is not None else None,
+    }
+
+
+async def _refresh_one(provider, symbol, start, end, ttl):
+    global _in_flight
+    _in_flight += 1
+    try:
+        series = await provider.fetch_history(symbol, start, end)
+    except ProviderUnavailableError as e:
+        logger.warning(f"Skipping refresh of {symbol}: {e}")
+        return False
+    except Exception as e:
+        logger.error(f"Error refreshing {symbol} from {provider.name}: {e}")
+        return False
+    finally:
+        _in_flight -= 1
+
+    if series.empty:
+        logger.warning(f"Provider {provider.name} returned no data for {symbol}")
+        return True
+    save_series(series, symbol, provider.name, start, end, ttl=ttl)
+    logger.info(f"Refreshed {symbol} from {provider.name}: {len(series)} points")
+    return True
+
+
+async def refresh_pending():
+    """获取所有已登记的序列（并发数由提供者限制），失败的条目保留到下一轮"""
+    with _pending_lock:
+        items = list(_pending_refresh.items())
+    if not items:
+        return 0
+
+    provider = get_market_data_provider()
+    results = await asyncio.gather(*(_refresh_one(provider, *request) for _, request in items))
+    with _pending_lock:
+        for (key, _), done in zip(items, results):
+            if done:
+                _pending_refresh.pop(key, None)
+    return sum(results)
+
+
+async def _refresh_loop(interval):
+    while True:
+        try:
+            await refresh_pending()
+        except Exception as e:
+            logger.error(f"Market data refresh loop error: {e}")
+        await asyncio.sleep(interval)
+
+
+def start_background_refresh(interval=REFRESH_INTERVAL):
+    """在当前事件循环中启动后台刷新任务"""
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.get_running_loop().create_task(_refresh_loop(interval))
+        logger.info(f"Market data background refresh started (interval {interval}s)")
+    return _refresh_task
+
+
+async def stop_background_refresh():
+    """停止后台刷新任务并关闭提供者的连接池"""
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+        _refresh_task = None
+    if _provider is not None:
+        await _provider.close()
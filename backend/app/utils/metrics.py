@@ -0,0 +1,215 @@
+"""
+进程内指标 - 缓存命中统计、数据集加载规模，以及 Prometheus 文本格式输出
+
+    record_cache(cache, event): 缓存事件计数，event 为 hit / miss / eviction
+    register_cache_size(cache, size_fn): 登记返回缓存当前条目数的函数，输出时调用
+    set_dataset_stats(dataset, rows, path): 数据集加载后记录行数和文件大小
+    render_metrics(): 生成 /api/metrics 的响应文本
+
+延迟直方图来自 timing 模块（请求按路由、阶段按 span 名称），数据集加载耗时即其中的 load_* 阶段。
+所有指标都是进程内计数器，输出时只做一次快照，开销与指标数量成正比，可以每隔几秒抓取一次。
+"""
+
+import os
+import resource
+import threading
+
+from . import timing
+from .market_data_provider import get_refresh_stats
+
+METRIC_PREFIX = "premialab"
+CACHE_EVENTS = ("hit", "miss", "eviction")
+
+_cache_events = {}  # (缓存名, 事件) -> 次数
+_cache_sizes = {}  # 缓存名 -> 返回条目数的函数
+_dataset_stats = {}  # 数据集名 -> (行数, 文件字节数)
+_lock = threading.Lock()
+
+
+def record_cache(cache, event, count=1):
+    """
+    记录缓存事件
+
+    参数:
+        cache: 缓存名称，如 "price_history"
+        event: "hit"、"miss" 或 "eviction"
+        count: 事件次数
+    """
+    key = (cache, event)
+    with _lock:
+        _cache_events[key] = _cache_events.get(key, 0) + count
+
+
+def register_cache_size(cache, size_fn):
+    """登记缓存条目数函数（无参数，返回整数）"""
+    _cache_sizes[cache] = size_fn
+
+
+def set_dataset_stats(dataset, rows, path=None):
+    """
+    记录数据集加载后的规模
+
+    参数:
+        dataset: 数据集名称，如 "factor_exposures"
+        rows: 加载的行数（或序列数）
+        path: 数据文件路径，用于记录文件大小
+    """
+    try:
+        size_bytes = os.path.getsize(path) if path is not None else None
+    except OSError:
+        size_bytes = None
+    with _lock:
+        _dataset_stats[dataset] = (int(rows), size_bytes)
+
+
+def get_cache_stats():
+    """
+    获取缓存统计
+
+    返回:
+        dict: 缓存名 -> {hit, miss, eviction, entries}，未登记条目数的缓存 entries 为 None
+    """
+    with _lock:
+        events = dict(_cache_events)
+    names = sorted({cache for cache, _ in events} | set(_cache_sizes))
+    stats = {}
+    for name in names:
+        item = {event: events.get((name, event), 0) for event in CACHE_EVENTS}
+        size_fn = _cache_sizes.get(name)
+        try:
+            item["entries"] = int(size_fn()) if size_fn else None
+        except Exception:
+            item["entries"] = None
+        stats[name] = item
+    return stats
+
+
+def get_process_rss_bytes():
+    """当前进程的常驻内存（字节），不支持 /proc 的平台返回峰值 RSS"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return get_process_max_rss_bytes()
+
+
+def get_process_max_rss_bytes():
+    """进程峰值 RSS（字节），Linux 上 ru_maxrss 单位为 KB，macOS 上为字节"""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if os.uname().sysname == "Darwin" else max_rss * 1024
+
+
+def _thread_pool_stats():
+    # 同步接口和依赖运行在 anyio 默认线程池中，只能在事件循环内读取
+    try:
+        from anyio import to_thread
+        limiter = to_thread.current_default_thread_limiter()
+        return limiter.borrowed_tokens, limiter.total_tokens
+    except Exception:
+        return None
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+class _Writer:
+    def __init__(self):
+        self.lines = []
+
+    def header(self, name, metric_type, help_text):
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {metric_type}")
+
+    def sample(self, name, value, labels=None):
+        self.lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    def histogram(self, name, entries, label_fn):
+        for entry in entries:
+            labels = label_fn(entry)
+            for bound, count in entry["buckets"]:
+                le = "+Inf" if bound == float("inf") else _format_value(bound / 1000)
+                self.sample(f"{name}_bucket", count, {**labels, "le": le})
+            self.sample(f"{name}_sum", entry["sumMs"] / 1000, labels)
+            self.sample(f"{name}_count", entry["count"], labels)
+
+
+def render_metrics():
+    """
+    生成 Prometheus 文本格式（0.0.4）的全部指标
+
+    返回:
+        str: 以换行结尾的指标文本
+    """
+    out = _Writer()
+    histograms = timing.get_histograms()
+
+    requests = [entry for entry in histograms if entry["name"] == "request"]
+    name = f"{METRIC_PREFIX}_request_duration_seconds"
+    out.header(name, "histogram", "HTTP request latency by route")
+    out.histogram(name, requests, lambda entry: entry["labels"])
+
+    stages = [entry for entry in histograms if entry["name"] != "request"]
+    name = f"{METRIC_PREFIX}_stage_duration_seconds"
+    out.header(name, "histogram", "Analysis stage and dataset load latency by span name")
+    out.histogram(name, stages, lambda entry: {**entry["labels"], "stage": entry["name"]})
+
+    cache_stats = get_cache_stats()
+    for event, metric, help_text in (("hit", "hits", "Cache hits"), ("miss", "misses", "Cache misses"),
+                                     ("eviction", "evictions", "Cache evictions")):
+        name = f"{METRIC_PREFIX}_cache_{metric}_total"
+        out.header(name, "counter", help_text)
+        for cache, item in cache_stats.items():
+            out.sample(name, item[event], {"cache": cache})
+    name = f"{METRIC_PREFIX}_cache_entries"
+    out.header(name, "gauge", "Current number of cache entries")
+    for cache, item in cache_stats.items():
+        if item["entries"] is not None:
+            out.sample(name, item["entries"], {"cache": cache})
+
+    with _lock:
+        datasets = sorted(_dataset_stats.items())
+    out.header(f"{METRIC_PREFIX}_dataset_rows", "gauge", "Rows loaded from each dataset")
+    for dataset, (rows, _) in datasets:
+        out.sample(f"{METRIC_PREFIX}_dataset_rows", rows, {"dataset": dataset})
+    out.header(f"{METRIC_PREFIX}_dataset_size_bytes", "gauge", "Size of each dataset file")
+    for dataset, (_, size_bytes) in datasets:
+        if size_bytes is not None:
+            out.sample(f"{METRIC_PREFIX}_dataset_size_bytes", size_bytes, {"dataset": dataset})
+
+    refresh = get_refresh_stats()
+    out.header(f"{METRIC_PREFIX}_refresh_queue_depth", "gauge", "Market data series waiting for background refresh")
+    out.sample(f"{METRIC_PREFIX}_refresh_queue_depth", refresh["pending"])
+    out.header(f"{METRIC_PREFIX}_refresh_in_flight", "gauge", "Market data requests currently in flight")
+    out.sample(f"{METRIC_PREFIX}_refresh_in_flight", refresh["inFlight"])
+    out.header(f"{METRIC_PREFIX}_provider_circuit_open", "gauge", "1 if the market data provider circuit breaker is open")
+    out.sample(f"{METRIC_PREFIX}_provider_circuit_open", int(refresh["breakerState"] == "open"))
+
+    thread_pool = _thread_pool_stats()
+    if thread_pool is not None:
+        busy, total = thread_pool
+        out.header(f"{METRIC_PREFIX}_thread_pool_busy", "gauge", "Worker threads in use")
+        out.sample(f"{METRIC_PREFIX}_thread_pool_busy", busy)
+        out.header(f"{METRIC_PREFIX}_thread_pool_size", "gauge", "Worker thread pool capacity")
+        out.sample(f"{METRIC_PREFIX}_thread_pool_size", total)
+
+    out.header("process_resident_memory_bytes", "gauge", "Resident memory size in bytes")
+    out.sample("process_resident_memory_bytes", get_process_rss_bytes())
+    out.header("process_max_resident_memory_bytes", "gauge", "Peak resident memory size in bytes")
+    out.sample("process_max_resident_memory_bytes", get_process_max_rss_bytes())
+
+    return "\n".join(out.lines) + "\n"
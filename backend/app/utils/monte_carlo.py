@@ -0,0 +1,270 @@
+"""
+蒙特卡洛 VaR/CVaR 引擎
+
+支持两种情景生成方式:
+    historical: 历史自助法，从日收益率中有放回地抽取 horizon 个交易日并复合
+    parametric: 因子模型参数法，按因子协方差和特异方差生成正态情景
+
+情景以 (情景数 × 资产数) 的 NumPy 数组分块生成以限制内存：分块大小由每块的内存预算和资产数
+推导，资产越多每块情景越少。每个分块使用由 SeedSequence 派生的独立随机种子，因此结果只取决于
+种子和分块大小，与是否并行无关。
+情景数较大时分发到模块级的进程池执行（首次使用时创建，应用关闭时由 shutdown_executor 关闭）。
+"""
+
+import os
+import secrets
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS_PER_YEAR = 252
+
+# 模拟参数默认值与上限（情景数是延迟与精度之间的调节旋钮）
+DEFAULT_SCENARIOS = 10000
+MAX_SCENARIOS = 1000000
+# 每个分块（每个进程）情景数组的内存预算（字节），以及分块情景数的上限
+CHUNK_BYTES = 64 * 1024 * 1024
+MAX_CHUNK_SIZE = 20000
+# 情景数达到该阈值时才使用多进程（进程启动开销约为数百毫秒）
+PARALLEL_THRESHOLD = 200000
+MAX_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+SIMULATION_MODES = ("historical", "parametric")
+
+# 模块级进程池，避免每个请求重复启动进程
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """返回共享的进程池（MAX_WORKERS 个进程），首次调用时创建"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            logger.info(f"Starting Monte Carlo process pool with {MAX_WORKERS} workers")
+            _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+        return _executor
+
+
+def shutdown_executor():
+    """关闭共享的进程池（应用关闭时调用），之后再次使用会重新创建"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
+
+
+def _historical_chunk(params, n, rng):
+    """历史自助法：每个情景抽取 horizon 个交易日的对数收益率求和后复合"""
+    log_returns = params["log_returns"]
+    horizon = params["horizon"]
+    day_index = rng.integers(0, log_returns.shape[0], size=(n, horizon))
+    scenario_log_returns = np.zeros((n, log_returns.shape[1]))
+    # 每天抽取的收益写入同一个缓冲区再原地累加，不为每个交易日分配新的 n × 资产数 临时数组
+    drawn = np.empty_like(scenario_log_returns)
+    for day in range(horizon):
+        # mode="raise"（默认）时 out 会经过一次缓冲，下标已在范围内，使用 clip 避免额外分配
+        np.take(log_returns, day_index[:, day], axis=0, out=drawn, mode="clip")
+        scenario_log_returns += drawn
+    return np.expm1(scenario_log_returns, out=scenario_log_returns)
+
+
+def _parametric_chunk(params, n, rng):
+    """因子模型参数法：情景收益 = 因子收益 @ 暴露度ᵀ + 特异收益"""
+    factor_returns = rng.standard_normal((n, params["factor_cholesky"].shape[0])) @ params["factor_cholesky"].T
+    scenarios = factor_returns @ params["exposures"].T
+    specific_returns = rng.standard_normal((n, params["specific_std"].shape[0]))
+    specific_returns *= params["specific_std"]
+    scenarios += specific_returns
+    return scenarios
+
+
+_CHUNK_GENERATORS = {
+    "historical": _historical_chunk,
+    "parametric": _parametric_chunk,
+}
+
+
+def chunk_size_for(mode, params, chunk_bytes=CHUNK_BYTES):
+    """
+    按内存预算计算每个分块的情景数
+
+    每个情景占用两个 资产数 长度的 float64 缓冲区（情景收益和当日抽样/特异收益），历史自助法另有
+    horizon 个抽样下标。
+
+    返回:
+        int: 分块情景数，介于 1 与 MAX_CHUNK_SIZE 之间
+    """
+    if mode == "historical":
+        n_assets = params["log_returns"].shape[1]
+        per_scenario = 8 * (2 * n_assets + params["horizon"])
+    else:
+        per_scenario = 8 * (2 * params["exposures"].shape[0] + params["factor_cholesky"].shape[0])
+    return int(min(MAX_CHUNK_SIZE, max(1, chunk_bytes // per_scenario)))
+
+
+def _simulate_chunk(mode, params, weight_matrix, n, seed_sequence):
+    """生成一个分块的情景 (n × 资产数)，并返回各组合的情景收益 (n × 组合数)"""
+    rng = np.random.default_rng(seed_sequence)
+    scenarios = _CHUNK_GENERATORS[mode](params, n, rng)
+    return scenarios @ weight_matrix
+
+
+def simulate_portfolio_returns(mode, params, weight_matrix, scenarios=DEFAULT_SCENARIOS, seed=None,
+                               chunk_size=None, workers=None):
+    """
+    模拟组合在持有期内的收益分布
+
+    参数:
+        mode: 'historical' 或 'parametric'
+        params: 情景生成参数，见 build_historical_params / build_parametric_params
+        weight_matrix: 资产权重矩阵 (资产数 × 组合数)，可同时模拟组合与基准
+        scenarios: 情景数
+        seed: 随机种子，None 表示随机生成
+        chunk_size: 每个分块的情景数，None 表示按 CHUNK_BYTES 和资产数推导（见 chunk_size_for）
+        workers: 进程数，None 表示情景数超过 PARALLEL_THRESHOLD 时自动使用多进程；大于 1 时使用共享进程池
+                 （进程数为 MAX_WORKERS）
+
+    返回:
+        tuple: (情景收益数组 (情景数 × 组合数), 实际使用的种子)
+    """
+    if mode not in _CHUNK_GENERATORS:
+        raise ValueError(f"Unknown simulation mode: {mode}")
+
+    if seed is None:
+        seed = secrets.randbits(32)
+    seed_sequence = np.random.SeedSequence(seed)
+    if chunk_size is None:
+        chunk_size = chunk_size_for(mode, params)
+    chunk_sizes = [min(chunk_size, scenarios - start) for start in range(0, scenarios, chunk_size)]
+    chunk_seeds = seed_sequence.spawn(len(chunk_sizes))
+
+    if workers is None:
+        workers = MAX_WORKERS if scenarios >= PARALLEL_THRESHOLD else 1
+    workers = min(workers, len(chunk_sizes))
+
+    if workers > 1:
+        logger.debug(f"Simulating {scenarios} scenarios in {len(chunk_sizes)} chunks on the process pool")
+        results = list(get_executor().map(
+            _simulate_chunk,
+            [mode] * len(chunk_sizes),
+            [params] * len(chunk_sizes),
+            [weight_matrix] * len(chunk_sizes),
+            chunk_sizes,
+            chunk_seeds,
+        ))
+    else:
+        results = [
+            _simulate_chunk(mode, params, weight_matrix, n, chunk_seed)
+            for n, chunk_seed in zip(chunk_sizes, chunk_seeds)
+        ]
+
+    return np.concatenate(results, axis=0), seed
+
+
+def build_historical_params(asset_returns, horizon):
+    """
+    构建历史自助法参数
+
+    参数:
+        asset_returns: 日简单收益率数组 (交易日数 × 资产数)
+        horizon: 持有期（交易日）
+    """
+    log_returns = np.log1p(np.nan_to_num(asset_returns, nan=0.0, posinf=0.0, neginf=0.0))
+    return {"log_returns": np.ascontiguousarray(log_returns), "horizon": int(horizon)}
+
+
+def build_parametric_params(exposures, factor_covariance, specific_var, horizon):
+    """
+    构建因子模型参数法参数
+
+    参数:
+        exposures: 因子暴露度矩阵 (资产数 × 因子数)
+        factor_covariance: 年化因子协方差矩阵 (因子数 × 因子数)，小数单位
+        specific_var: 年化特异方差 (资产数)，小数单位
+        horizon: 持有期（交易日）
+    """
+    scale = horizon / TRADING_DAYS_PER_YEAR
+    covariance = factor_covariance * scale
+    try:
+        factor_cholesky = np.linalg.cholesky(covariance)
+    except np.linalg.LinAlgError:
+        # 协方差矩阵非正定时，使用特征分解并截断负特征值
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        factor_cholesky = eigenvectors * np.sqrt(np.clip(eigenvalues, 0.0, None))
+    return {
+        "exposures": np.ascontiguousarray(exposures),
+        "factor_cholesky": factor_cholesky,
+        "specific_std": np.sqrt(np.clip(specific_var, 0.0, None) * scale),
+    }
+
+
+def summarize_distribution(returns, confidence):
+    """
+    计算单个收益分布的 VaR 和 CVaR（预期损失，Expected Shortfall）
+
+    返回值为正数表示损失（小数单位）
+    """
+    cutoff = np.quantile(returns, 1 - confidence)
+    tail = returns[returns <= cutoff]
+    return {
+        "var": float(-cutoff),
+        "cvar": float(-tail.mean()) if tail.size else float(-cutoff),
+        "mean": float(returns.mean()),
+        "volatility": float(returns.std()),
+        "worst": float(returns.min()),
+        "best": float(returns.max()),
+    }
+
+
+def _format_summary(summary):
+    """转换为前端期望的百分比格式（加0.0以消除取整后的-0.0）"""
+    formatted = {key: round(value * 100, 2) + 0.0 for key, value in summary.items()}
+    formatted["expectedShortfall"] = formatted["cvar"]
+    return formatted
+
+
+def calculate_simulated_var(mode, params, weight_matrix, labels, scenarios=DEFAULT_SCENARIOS, confidence=0.95,
+                            seed=None, chunk_size=None, workers=None, bins=50):
+    """
+    基于模拟情景计算 VaR/CVaR，返回前端所需格式（百分比单位）
+
+    参数:
+        mode, params, weight_matrix: 见 simulate_portfolio_returns
+        labels: 与 weight_matrix 列对应的名称（如 ['portfolio', 'benchmark']）
+        scenarios: 情景数
+        confidence: 置信水平
+        seed: 随机种子
+        chunk_size: 分块大小，None 表示按内存预算推导
+        workers: 进程数
+        bins: 收益分布直方图的分组数
+
+    返回:
+        dict: 每个组合的 VaR/CVaR 统计、第一个组合的收益分布直方图和模拟参数
+    """
+    simulated, used_seed = simulate_portfolio_returns(
+        mode, params, weight_matrix, scenarios=scenarios, seed=seed, chunk_size=chunk_size, workers=workers
+    )
+
+    result = {label: _format_summary(summarize_distribution(simulated[:, i], confidence))
+              for i, label in enumerate(labels)}
+
+    counts, edges = np.histogram(simulated[:, 0], bins=bins)
+    centers = (edges[:-1] + edges[1:]) / 2
+    result["distribution"] = [
+        {"return": round(center * 100, 2), "count": count}
+        for center, count in zip(centers.tolist(), counts.tolist())
+    ]
+    result.update({
+        "mode": mode,
+        "scenarios": scenarios,
+        "confidence": confidence,
+        "seed": used_seed,
+    })
+    return result
@@ -0,0 +1,535 @@
+"""
+组合优化器 - 基于因子模型协方差的最小方差、最大夏普比率和最小跟踪误差优化（仅依赖 numpy）
+
+资产协方差使用结构化形式 Σ = X F Xᵀ + D，只计算矩阵-向量乘积
+    Σ w = X (F (Xᵀ w)) + d ∘ w
+复杂度为 O(N·K)，不构造 N×N 的稠密矩阵，可扩展到数千只股票。
+
+优化问题（均值-方差形式，γ 为风险厌恶系数）:
+    min  ½ γ (w - b)ᵀ Σ (w - b) - μᵀ w
+    s.t. Σ w = 1, 0 ≤ w ≤ 最大权重, 每个行业权重和 ≤ 行业上限, Σ |w - w₀| ≤ 换手率上限
+b = 0 时为总风险，b 为基准权重时为主动风险（跟踪误差）。
+
+使用带自适应重启的 FISTA（加速投影梯度法）求解。约束集合上的投影是可分离的:
+    wᵢ = clip(w₀ᵢ + soft(vᵢ - θ - η_s - w₀ᵢ, ρ), 0, uᵢ)
+其中 θ 对应预算约束，η_s ≥ 0 对应行业上限（均由带区间保护的牛顿法求得），ρ ≥ 0 对应换手率约束
+（用试位法求得）。θ、η_s、ρ 都以上一次投影的值热启动，FISTA 相邻迭代之间通常只需几次求值。
+最大夏普比率通过扫描 γ（热启动）并在最优网格点附近做黄金分割搜索得到，热启动状态在所有 γ 之间共享。
+"""
+
+import logging
+
+import numpy as np
+
+from .risk_model import get_risk_model, get_portfolio_arrays
+from .timeseries import RISK_FREE_RATE
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+OBJECTIVES = ("min_variance", "max_sharpe", "min_tracking_error")
+DEFAULT_MAX_ITERATIONS = 1000
+TOLERANCE = 1e-8
+# γ 搜索阶段使用的收敛容差，最终结果再以 TOLERANCE 精化
+SEARCH_TOLERANCE = 1e-6
+BISECTION_ITERATIONS = 100
+# 最大夏普比率扫描的风险厌恶系数网格（年化小数单位）
+RISK_AVERSION_GRID = np.geomspace(0.1, 1000.0, 15)
+GOLDEN_SECTION_ITERATIONS = 10
+# 有效前沿的风险厌恶系数范围：最大值接近最小方差组合，最小值接近最高收益组合
+FRONTIER_RISK_AVERSION = (1e4, 1e-2)
+
+
+def build_problem(symbols, expected_returns=None, max_weight=1.0, sectors=None, sector_caps=None,
+                  current_weights=None, turnover=None, model=None):
+    """
+    构建优化问题的数组表示
+
+    参数:
+        symbols: 候选股票代码列表（不含重复）
+        expected_returns: 年化预期收益率 (N)，小数单位；最小方差/跟踪误差优化可省略
+        max_weight: 单只股票权重上限
+        sectors: 每只股票的行业 (N)，行业上限需要
+        sector_caps: 行业 -> 权重上限
+        current_weights: 当前权重 (N)，换手率约束需要
+        turnover: 换手率上限 Σ |w - w₀|（单边换手率的两倍），None 表示不限制
+        model: 风险模型，默认使用 get_risk_model()
+
+    异常:
+        ValueError: 约束无可行解
+    """
+    model = model or get_risk_model()
+    arrays = get_portfolio_arrays(symbols, np.ones(len(symbols)), model)
+    if arrays["symbols"] != list(symbols):
+        raise ValueError("Symbols must be unique")
+
+    n = len(symbols)
+    upper = np.full(n, float(max_weight))
+    codes = np.zeros(n, dtype=np.int64)
+    caps = np.array([np.inf])
+    sector_names = ["All"]
+    if sector_caps:
+        if sectors is None:
+            raise ValueError("Sector caps require sector data")
+        sector_names = sorted(set(sectors))
+        lookup = {name: i for i, name in enumerate(sector_names)}
+        codes = np.array([lookup[sector] for sector in sectors], dtype=np.int64)
+        cap_lookup = {str(k).casefold(): float(v) for k, v in sector_caps.items()}
+        caps = np.array([cap_lookup.get(str(name).casefold(), np.inf) for name in sector_names])
+
+    capacity = np.minimum(caps, np.bincount(codes, upper, minlength=len(caps))).sum()
+    if capacity < 1 - 1e-9:
+        raise ValueError(
+            f"Constraints are infeasible: max weight and sector caps allow at most {capacity * 100:.2f}% invested"
+        )
+
+    if turnover is not None and current_weights is None:
+        raise ValueError("Turnover limit requires current weights")
+    anchor = None if current_weights is None else np.asarray(current_weights, dtype=float)
+
+    # 不在候选股票中的基准成分股：特异方差为常数项 Σ_{i∉组合} dᵢ bᵢ²
+    benchmark_weights = arrays["benchmark_weights"]
+    outside_specific_var = max(
+        model["benchmark_specific_var"] - float(arrays["specific_var"] @ benchmark_weights ** 2), 0.0
+    )
+
+    return {
+        "symbols": list(symbols),
+        "exposures": arrays["exposures"],
+        "covariance": model["covariance"],
+        "specific_var": arrays["specific_var"],
+        "expected_returns": None if expected_returns is None else np.asarray(expected_returns, dtype=float),
+        "benchmark_weights": benchmark_weights,
+        "benchmark_exposure": model["benchmark_exposure"],
+        "outside_specific_var": outside_specific_var,
+        "upper": upper,
+        "sector_codes": codes,
+        "sector_caps": caps,
+        "sector_names": sector_names,
+        "current_weights": anchor,
+        "turnover": turnover,
+        "unmapped": arrays["unmapped"],
+        "lipschitz": max_risk_eigenvalue(arrays["exposures"], model["covariance"], arrays["specific_var"]),
+    }
+
+
+def covariance_matvec(w, exposures, covariance, specific_var):
+    """Σ w = X F Xᵀ w + d ∘ w，不构造 N×N 矩阵"""
+    return exposures @ (covariance @ (exposures.T @ w)) + specific_var * w
+
+
+def max_risk_eigenvalue(exposures, covariance, specific_var, iterations=50):
+    """幂迭代估计 Σ 的最大特征值（用于梯度步长）"""
+    n = exposures.shape[0]
+    if n == 0:
+        return 1.0
+    v = np.full(n, 1.0 / np.sqrt(n))
+    eigenvalue = 0.0
+    for _ in range(iterations):
+        product = covariance_matvec(v, exposures, covariance, specific_var)
+        norm = np.linalg.norm(product)
+        if norm == 0:
+            break
+        v = product / norm
+        if abs(norm - eigenvalue) <= 1e-6 * norm:
+            eigenvalue = norm
+            break
+        eigenvalue = norm
+    # 上界留出余量，确保步长 1/L 满足收敛条件
+    return max(eigenvalue * 1.05, float(specific_var.max()) if len(specific_var) else 0.0, 1e-12)
+
+
+def _threshold_weights(v, t, upper, anchor, rho):
+    """给定阈值 t（标量或逐资产数组）的投影权重 clip(w₀ + soft(v - t - w₀, ρ), 0, u)"""
+    shifted = v - t
+    if anchor is not None and rho > 0:
+        move = shifted - anchor
+        shifted = anchor + np.sign(move) * np.maximum(np.abs(move) - rho, 0.0)
+    return np.clip(shifted, 0.0, upper)
+
+
+def _threshold_sum(v, t, upper, anchor, rho, floor=None):
+    """Σᵢ wᵢ(max(t, floorᵢ)) 及其关于 t 的斜率（每个处于线性段、未截断且阈值高于下限的资产贡献 -1）"""
+    effective = t if floor is None else np.maximum(t, floor)
+    shifted = v - effective
+    if anchor is not None and rho > 0:
+        move = shifted - anchor
+        sloped = np.abs(move) > rho
+        shifted = anchor + np.sign(move) * np.maximum(np.abs(move) - rho, 0.0)
+    else:
+        sloped = True
+    weights = np.clip(shifted, 0.0, upper)
+    active = sloped & (shifted > 0) & (shifted < upper)
+    if floor is not None:
+        active = active & (floor < t)
+    return float(weights.sum()), -int(np.count_nonzero(active))
+
+
+def _solve_threshold(v, upper, anchor, rho, target, floor=None, start=None):
+    """
+    求阈值 t，使 Σᵢ wᵢ(max(t, floorᵢ)) = target，wᵢ 见 _threshold_weights
+
+    总和关于 t 分段线性、单调递减，使用带区间保护的牛顿法：从上一次的解 start 出发（FISTA 相邻迭代
+    的阈值变化很小），每步 O(N)，通常几步内落在正确的线性段上并精确求解；牛顿步超出当前区间时退回二分。
+    floor 为逐资产的阈值下限（行业上限生效的行业），t 低于下限时该资产权重保持不变。
+    """
+    rho_term = rho if anchor is not None else 0.0
+    # 区间端点：lo 处所有资产都在上限（或其下限处的值），hi 处所有资产为 0
+    lo = float((v - rho_term - upper).min()) - 1.0
+    hi = float((v + rho_term).max()) + 1.0
+    t = start if start is not None and lo < start < hi else 0.5 * (lo + hi)
+    tolerance = 1e-13 * max(1.0, target)
+    for _ in range(BISECTION_ITERATIONS):
+        total, slope = _threshold_sum(v, t, upper, anchor, rho, floor)
+        excess = total - target
+        if abs(excess) <= tolerance:
+            break
+        if excess > 0:
+            lo = t
+        else:
+            hi = t
+        if hi - lo <= 1e-15 * max(1.0, abs(t)):
+            break
+        t_next = t - excess / slope if slope < 0 else None
+        t = t_next if t_next is not None and lo < t_next < hi else 0.5 * (lo + hi)
+    return t
+
+
+def _project_fixed_rho(v, problem, rho, state=None):
+    upper, codes, caps = problem["upper"], problem["sector_codes"], problem["sector_caps"]
+    anchor = problem["current_weights"]
+    state = {} if state is None else state
+    # 行业上限可能生效的行业：求出行业权重和恰好等于上限的阈值 τ_s，该行业的阈值不低于 τ_s
+    floor = None
+    capped = np.flatnonzero(np.isfinite(caps) & (np.bincount(codes, upper, minlength=len(caps)) > caps))
+    if len(capped):
+        sector_floor = state.setdefault("sector_floor", np.full(len(caps), np.nan))
+        for sector in capped:
+            members = codes == sector
+            previous = sector_floor[sector]
+            sector_floor[sector] = _solve_threshold(
+                v[members], upper[members], None if anchor is None else anchor[members], rho, caps[sector],
+                start=None if np.isnan(previous) else previous
+            )
+        floor = np.full(len(caps), -np.inf)
+        floor[capped] = sector_floor[capped]
+        floor = floor[codes]
+    # 预算约束的阈值 θ；每个资产的阈值为 max(θ, τ_s)，即 θ + η_s
+    theta = _solve_threshold(v, upper, anchor, rho, 1.0, floor, start=state.get("theta"))
+    state["theta"] = theta
+    thresholds = theta if floor is None else np.maximum(theta, floor)
+    return _threshold_weights(v, thresholds, upper, anchor, rho)
+
+
+def project_weights(v, problem, state=None):
+    """
+    将向量投影到约束集合（预算、权重上下限、行业上限、换手率）
+
+    参数:
+        v: 待投影向量
+        problem: build_problem 返回的问题
+        state: 跨次调用共享的 dict，保存上一次的换手率乘子 ρ 作为热启动（FISTA 相邻迭代以及
+               γ 扫描中相邻的问题，ρ 变化很小）
+
+    异常:
+        ValueError: 换手率上限过紧，无法满足其他约束
+    """
+    state = {} if state is None else state
+    limit = problem["turnover"]
+    if limit is None:
+        return _project_fixed_rho(v, problem, 0.0, state)
+    anchor = problem["current_weights"]
+
+    # 换手率随 ρ 增大而减小（分段线性），g(ρ) = 换手率 - 上限 的根用 Illinois 试位法求解
+    def excess(rho):
+        candidate = _project_fixed_rho(v, problem, rho, state)
+        return np.abs(candidate - anchor).sum() - limit, candidate
+
+    def feasible(g, candidate):
+        return g <= 1e-10 and abs(candidate.sum() - 1) <= 1e-8
+
+    # ρ 超过 max|v - w₀| + 2 后所有资产都停留在不动区，换手率不再下降
+    rho_max = float(np.abs(v - anchor).max()) + 2.0
+    warm = min(state.get("rho") or 0.0, rho_max)
+    if warm > 0:
+        # 从上一次的 ρ 出发，向根所在的方向以倍增的步长探测，得到很窄的区间（通常在同一线性段内）
+        g, candidate = excess(warm)
+        step = 0.05 * warm
+        if feasible(g, candidate):
+            rho_hi, g_hi, weights = warm, g, candidate
+            while True:
+                rho = rho_hi - step
+                if rho <= 0:
+                    rho_lo = 0.0
+                    g_lo, candidate = excess(0.0)
+                    if g_lo <= 1e-10:
+                        state["rho"] = 0.0
+                        return candidate
+                    break
+                g, candidate = excess(rho)
+                if not feasible(g, candidate):
+                    rho_lo, g_lo = rho, g
+                    break
+                rho_hi, g_hi, weights = rho, g, candidate
+                step *= 2
+        else:
+            rho_lo, g_lo = warm, g
+            rho_hi = warm
+            while True:
+                if rho_hi >= rho_max:
+                    raise ValueError("Turnover limit is too tight to satisfy the other constraints")
+                rho_hi = min(rho_hi + step, rho_max)
+                g_hi, weights = excess(rho_hi)
+                if feasible(g_hi, weights):
+                    break
+                rho_lo, g_lo = rho_hi, g_hi
+                step *= 2
+    else:
+        rho_lo = 0.0
+        g_lo, weights = excess(0.0)
+        if g_lo <= 1e-10:
+            return weights
+        # 先倍增找到可行的上界
+        rho_hi = max(float(np.abs(v - anchor).max()), 1e-6)
+        g_hi, weights = excess(rho_hi)
+        while not feasible(g_hi, weights):
+            if rho_hi >= rho_max:
+                raise ValueError("Turnover limit is too tight to satisfy the other constraints")
+            rho_lo, g_lo = rho_hi, g_hi
+            rho_hi = min(rho_hi * 2, rho_max)
+            g_hi, weights = excess(rho_hi)
+
+    side = 0
+    for _ in range(BISECTION_ITERATIONS):
+        if -g_hi <= 1e-9 * max(1.0, limit) or rho_hi - rho_lo <= 1e-12 * max(1.0, rho_hi):
+            break
+        rho = rho_hi - g_hi * (rho_hi - rho_lo) / (g_hi - g_lo)
+        if not rho_lo < rho < rho_hi:
+            rho = 0.5 * (rho_lo + rho_hi)
+        g, candidate = excess(rho)
+        if g <= 1e-10:
+            rho_hi, g_hi, weights = rho, g, candidate
+            # 同一端连续两次被替换时，另一端的函数值减半（Illinois），避免试位法单侧停滞
+            if side == 1:
+                g_lo *= 0.5
+            side = 1
+        else:
+            rho_lo, g_lo = rho, g
+            if side == -1:
+                g_hi *= 0.5
+            side = -1
+    state["rho"] = rho_hi
+    return weights
+
+
+def _gradient(w, problem, risk_aversion, active):
+    """½ γ (w - b)ᵀ Σ (w - b) - μᵀ w 的梯度（基准外成分股通过因子暴露度计入）"""
+    exposures, covariance, specific_var = problem["exposures"], problem["covariance"], problem["specific_var"]
+    factor_exposure = exposures.T @ w
+    specific = specific_var * w
+    if active:
+        factor_exposure = factor_exposure - problem["benchmark_exposure"]
+        specific = specific - specific_var * problem["benchmark_weights"]
+    gradient = risk_aversion * (exposures @ (covariance @ factor_exposure) + specific)
+    if problem["expected_returns"] is not None:
+        gradient = gradient - problem["expected_returns"]
+    return gradient
+
+
+def solve_mean_variance(problem, risk_aversion=1.0, active=False, start=None, use_returns=True,
+                        max_iterations=DEFAULT_MAX_ITERATIONS, tolerance=TOLERANCE, state=None):
+    """
+    求解均值-方差问题（FISTA + 自适应重启）
+
+    参数:
+        problem: build_problem 返回的问题
+        risk_aversion: 风险厌恶系数 γ
+        active: True 时风险为相对基准的主动风险
+        start: 初始权重（热启动）
+        use_returns: False 时忽略预期收益（最小方差/最小跟踪误差）
+        state: 投影的热启动状态（见 project_weights），在相邻的求解之间共享
+
+    返回:
+        dict: weights, iterations, converged
+    """
+    if not use_returns:
+        problem = {**problem, "expected_returns": None}
+    step = 1.0 / (risk_aversion * problem["lipschitz"])
+    n = len(problem["symbols"])
+    state = {} if state is None else state
+    x = project_weights(np.full(n, 1.0 / n) if start is None else np.asarray(start, dtype=float), problem, state)
+    y = x
+    momentum = 1.0
+    for iteration in range(1, max_iterations + 1):
+        x_next = project_weights(y - step * _gradient(y, problem, risk_aversion, active), problem, state)
+        change = x_next - x
+        if np.linalg.norm(change) <= tolerance * max(1.0, np.linalg.norm(x)):
+            return {"weights": x_next, "iterations": iteration, "converged": True}
+        # 自适应重启：动量方向与下降方向相反时重置动量
+        if float((y - x_next) @ change) > 0:
+            momentum = 1.0
+        momentum_next = 0.5 * (1 + np.sqrt(1 + 4 * momentum ** 2))
+        y = x_next + (momentum - 1) / momentum_next * change
+        x, momentum = x_next, momentum_next
+    logger.warning(f"Optimizer did not converge in {max_iterations} iterations")
+    return {"weights": x, "iterations": max_iterations, "converged": False}
+
+
+def portfolio_statistics(problem, weights, risk_free_rate=RISK_FREE_RATE):
+    """优化结果的预期收益、风险、夏普比率、跟踪误差和换手率（小数单位）"""
+    exposures, covariance, specific_var = problem["exposures"], problem["covariance"], problem["specific_var"]
+    factor_exposure = exposures.T @ weights
+    risk = np.sqrt(max(float(factor_exposure @ covariance @ factor_exposure + specific_var @ weights ** 2), 0.0))
+
+    active_exposure = factor_exposure - problem["benchmark_exposure"]
+    active_specific = specific_var @ (weights - problem["benchmark_weights"]) ** 2 + problem["outside_specific_var"]
+    tracking_error = np.sqrt(max(float(active_exposure @ covariance @ active_exposure + active_specific), 0.0))
+
+    expected_return = None
+    sharpe = None
+    if problem["expected_returns"] is not None:
+        expected_return = float(problem["expected_returns"] @ weights)
+        sharpe = (expected_return - risk_free_rate) / risk if risk > 0 else None
+
+    turnover = None
+    if problem["current_weights"] is not None:
+        turnover = float(np.abs(weights - problem["current_weights"]).sum())
+
+    return {
+        "expectedReturn": expected_return,
+        "risk": float(risk),
+        "sharpeRatio": sharpe,
+        "trackingError": float(tracking_error),
+        "turnover": turnover,
+    }
+
+
+def _max_sharpe(problem, tracking_error_limit=None, risk_free_rate=RISK_FREE_RATE):
+    """扫描风险厌恶系数（热启动），在最优网格点附近用黄金分割搜索细化"""
+    active = tracking_error_limit is not None
+    solutions = {}
+    # 投影的热启动状态在所有 γ 之间共享
+    state = {}
+
+    def evaluate(log_gamma, start=None):
+        if start is None and solutions:
+            # 从已求解的最近的 γ 热启动
+            start = solutions[min(solutions, key=lambda g: abs(g - log_gamma))][1]["weights"]
+        result = solve_mean_variance(problem, float(np.exp(log_gamma)), active=active, start=start,
+                                     tolerance=SEARCH_TOLERANCE, state=state)
+        stats = portfolio_statistics(problem, result["weights"], risk_free_rate)
+        feasible = not active or stats["trackingError"] <= tracking_error_limit + 1e-6
+        score = stats["sharpeRatio"] if feasible and stats["sharpeRatio"] is not None else -np.inf
+        solutions[log_gamma] = (score, result, stats)
+        return score, result
+
+    # 风险厌恶系数从大到小：从低风险组合逐步过渡到高收益组合
+    grid = np.log(RISK_AVERSION_GRID[::-1])
+    start = None
+    for log_gamma in grid:
+        _, result = evaluate(log_gamma, start)
+        start = result["weights"]
+
+    scores = np.array([solutions[g][0] for g in grid])
+    if not np.isfinite(scores).any():
+        return None
+    best = int(np.argmax(scores))
+    lo, hi = grid[max(best - 1, 0)], grid[min(best + 1, len(grid) - 1)]
+    lo, hi = min(lo, hi), max(lo, hi)
+
+    # 夏普比率关于 log γ 近似单峰
+    ratio = (np.sqrt(5) - 1) / 2
+    a, b = hi - ratio * (hi - lo), lo + ratio * (hi - lo)
+    score_a, _ = evaluate(a)
+    score_b, _ = evaluate(b)
+    for _ in range(GOLDEN_SECTION_ITERATIONS):
+        if score_a >= score_b:
+            hi, b, score_b = b, a, score_a
+            a = hi - ratio * (hi - lo)
+            score_a, _ = evaluate(a)
+        else:
+            lo, a, score_a = a, b, score_b
+            b = lo + ratio * (hi - lo)
+            score_b, _ = evaluate(b)
+
+    best_gamma = max(solutions, key=lambda g: solutions[g][0])
+    result = solve_mean_variance(problem, float(np.exp(best_gamma)), active=active,
+                                 start=solutions[best_gamma][1]["weights"], state=state)
+    return {**result, "riskAversion": float(np.exp(best_gamma)), "evaluations": len(solutions)}
+
+
+def optimize_portfolio(problem, objective="min_variance", tracking_error_limit=None,
+                       risk_free_rate=RISK_FREE_RATE):
+    """
+    求解组合优化问题
+
+    参数:
+        problem: build_problem 返回的问题
+        objective: min_variance / max_sharpe / min_tracking_error
+        tracking_error_limit: 最大夏普比率时的跟踪误差上限（小数单位），None 表示不限制
+        risk_free_rate: 无风险利率
+
+    返回:
+        dict: weights 及统计指标（小数单位）
+
+    异常:
+        ValueError: 目标函数无效、缺少预期收益或约束无可行解
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective: {objective}. Supported: {', '.join(OBJECTIVES)}")
+
+    notes = []
+    if objective == "min_variance":
+        result = solve_mean_variance(problem, use_returns=False)
+    elif objective == "min_tracking_error":
+        result = solve_mean_variance(problem, active=True, use_returns=False)
+    else:
+        if problem["expected_returns"] is None:
+            raise ValueError("Expected returns are required for max_sharpe")
+        result = _max_sharpe(problem, tracking_error_limit, risk_free_rate)
+        if result is None:
+            notes.append("No portfolio satisfies the tracking error limit, returning the minimum tracking error portfolio")
+            result = solve_mean_variance(problem, active=True, use_returns=False)
+
+    return {
+        **result,
+        **portfolio_statistics(problem, result["weights"], risk_free_rate),
+        "notes": notes,
+    }
+
+
+def efficient_frontier(problem, points=50, risk_free_rate=RISK_FREE_RATE):
+    """
+    计算有效前沿：沿风险厌恶系数从大到小依次求解，每个点从上一个点的解热启动
+
+    参数:
+        problem: build_problem 返回的问题（需要预期收益）
+        points: 前沿上的点数
+
+    返回:
+        list: 每个点的 weights、riskAversion、iterations 及统计指标（小数单位），按风险从低到高排列；
+              相邻的重复点会被合并
+
+    异常:
+        ValueError: 缺少预期收益
+    """
+    if problem["expected_returns"] is None:
+        raise ValueError("Expected returns are required for the efficient frontier")
+
+    frontier = []
+    start = None
+    state = {}
+    for risk_aversion in np.geomspace(*FRONTIER_RISK_AVERSION, points):
+        result = solve_mean_variance(problem, float(risk_aversion), start=start, state=state)
+        start = result["weights"]
+        stats = portfolio_statistics(problem, result["weights"], risk_free_rate)
+        if frontier and abs(stats["risk"] - frontier[-1]["risk"]) <= 1e-7 \
+                and abs(stats["expectedReturn"] - frontier[-1]["expectedReturn"]) <= 1e-7:
+            continue
+        frontier.append({
+            **stats,
+            "weights": result["weights"],
+            "riskAversion": float(risk_aversion),
+            "iterations": result["iterations"],
+        })
+    return frontier
@@ -0,0 +1,177 @@
+"""
+批量导入投资组合 - 读取长表格式的持仓文件，向量化校验并批量补充公司信息
+
+输入文件每行一条持仓，必需列:
+    portfolio: 组合名称（同名的行属于同一个组合）
+    symbol:    股票代码（不区分大小写）
+    weight:    权重（0-1，每个组合合计应为 1）
+
+校验全部以列运算和 groupby 完成，不逐行构造 Ticker 模型；任何一行有问题时整个组合被拒绝，
+错误按组合汇总。Parquet 依赖可选的 pyarrow 包（或 fastparquet），未安装时抛出
+ImportFormatUnavailableError。
+"""
+
+import io
+
+import numpy as np
+import pandas as pd
+
+IMPORT_FORMATS = ("csv", "parquet")
+
+# 权重合计与 1 的最大偏差，与单个组合创建接口一致
+WEIGHT_SUM_TOLERANCE = 0.01
+
+# 列名别名（小写）
+COLUMN_ALIASES = {
+    "portfolio": ("portfolio", "portfolio_name", "name"),
+    "symbol": ("symbol", "ticker"),
+    "weight": ("weight",),
+}
+
+# 从公司索引补充的字段
+ENRICH_FIELDS = ("name", "sector", "region", "industry")
+
+
+class ImportFormatUnavailableError(RuntimeError):
+    """导入格式所需的可选依赖未安装"""
+
+
+def infer_format(filename, default="csv"):
+    """根据文件扩展名推断格式（.parquet/.pq 为 parquet，其余为 default）"""
+    suffix = (filename or "").rsplit(".", 1)[-1].lower() if "." in (filename or "") else ""
+    if suffix in ("parquet", "pq"):
+        return "parquet"
+    if suffix == "csv":
+        return "csv"
+    return default
+
+
+def read_holdings(data, format="csv"):
+    """
+    读取持仓文件
+
+    参数:
+        data: 文件内容（bytes）或文件路径
+        format: "csv" 或 "parquet"
+
+    返回:
+        DataFrame: portfolio、symbol、weight 三列（原始值，尚未校验）
+
+    异常:
+        ValueError: 不支持的格式、文件无法解析或缺少必需列
+        ImportFormatUnavailableError: parquet 所需的依赖未安装
+    """
+    if format not in IMPORT_FORMATS:
+        raise ValueError(f"Unsupported format: {format}. Supported: {', '.join(IMPORT_FORMATS)}")
+    source = io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+    try:
+        if format == "parquet":
+            frame = pd.read_parquet(source)
+        else:
+            # 全部按字符串读取，数值转换和错误定位在校验阶段统一处理
+            frame = pd.read_csv(source, dtype=str, keep_default_na=False, skipinitialspace=True)
+    except ImportError:
+        raise ImportFormatUnavailableError("The parquet format requires the optional pyarrow package")
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError, OSError) as e:
+        raise ValueError(f"Could not parse {format} file: {e}")
+
+    columns = {str(column).strip().lower(): column for column in frame.columns}
+    selected = {}
+    for target, aliases in COLUMN_ALIASES.items():
+        source_column = next((columns[alias] for alias in aliases if alias in columns), None)
+        if source_column is None:
+            raise ValueError(f"Missing required column '{target}' (accepted names: {', '.join(aliases)})")
+        selected[target] = frame[source_column]
+    return pd.DataFrame(selected)
+
+
+def validate_holdings(frame, known_symbols, tolerance=WEIGHT_SUM_TOLERANCE, first_row=2):
+    """
+    向量化校验持仓
+
+    逐行检查（组合名称、代码为空，权重非数值或超出 0-1，代码不在公司索引中，同一组合内代码重复）
+    之后按组合汇总权重，合计与 1 的偏差超过 tolerance 的组合被拒绝。
+
+    参数:
+        frame: read_holdings 的返回值
+        known_symbols: 公司索引中的股票代码
+        tolerance: 权重合计允许的偏差
+        first_row: 第一条持仓在错误信息中的行号（CSV 表头占第 1 行，因此默认为 2）
+
+    返回:
+        tuple: (有效持仓 DataFrame（symbol 已大写，weight 为浮点数，保持文件中的顺序）,
+                错误 dict（组合名称 -> 错误信息列表，按文件中首次出现的顺序）)
+    """
+    portfolio = frame["portfolio"].astype(str).str.strip()
+    symbol = frame["symbol"].astype(str).str.strip().str.upper()
+    weight = pd.to_numeric(frame["weight"], errors="coerce").astype(float)
+    holdings = pd.DataFrame({"portfolio": portfolio, "symbol": symbol, "weight": weight})
+    # 文件中的行号，用于错误信息
+    rows = pd.Series(np.arange(len(frame)) + first_row, index=frame.index)
+
+    missing_name = portfolio.eq("") | frame["portfolio"].isna()
+    missing_symbol = symbol.eq("") | frame["symbol"].isna()
+    invalid_weight = weight.isna() | ~np.isfinite(weight)
+    out_of_range = ~invalid_weight & ((weight < 0) | (weight > 1))
+    unknown = ~missing_symbol & ~symbol.isin(pd.Index(known_symbols))
+    duplicate = ~missing_symbol & holdings.duplicated(["portfolio", "symbol"], keep="first")
+
+    checks = [
+        (missing_symbol, "row {row}: missing symbol"),
+        (invalid_weight, "row {row}: weight '{raw}' is not a number"),
+        (out_of_range, "row {row}: weight {weight} must be between 0 and 1"),
+        (unknown, "row {row}: unknown symbol {symbol}"),
+        (duplicate, "row {row}: duplicate symbol {symbol}"),
+    ]
+    messages = []
+    for mask, template in checks:
+        mask = mask & ~missing_name
+        if not mask.any():
+            continue
+        failed = holdings[mask]
+        for row, name, sym, value, raw in zip(rows[mask], failed["portfolio"], failed["symbol"],
+                                              failed["weight"], frame["weight"][mask]):
+            messages.append((row, name, template.format(row=row, symbol=sym, weight=value, raw=raw)))
+
+    # 权重合计（只统计有效权重，已因逐行错误被拒绝的组合不再重复报告）
+    rejected = {name for _, name, _ in messages}
+    named = holdings[~missing_name]
+    sums = named.groupby("portfolio", sort=False)["weight"].sum(min_count=1)
+    first_rows = rows[~missing_name].groupby(named["portfolio"], sort=False).min()
+    bad_sums = sums[(sums - 1.0).abs().gt(tolerance) & ~sums.index.isin(list(rejected))]
+    for name, total in bad_sums.items():
+        messages.append((first_rows[name], name, f"total weight must equal 1, current total is {round(total, 6)}"))
+
+    errors = {}
+    for _, name, message in sorted(messages, key=lambda item: item[0]):
+        errors.setdefault(name, []).append(message)
+    if missing_name.any():
+        errors["<missing portfolio name>"] = [f"row {row}: missing portfolio name" for row in rows[missing_name]]
+
+    valid = holdings[~missing_name & ~holdings["portfolio"].isin(list(errors))]
+    return valid.reset_index(drop=True), errors
+
+
+def enrich_holdings(holdings, companies):
+    """
+    从公司索引批量补充名称、行业、地区和行业细分（一次 merge，不逐行查找）
+
+    参数:
+        holdings: validate_holdings 返回的有效持仓
+        companies: 公司索引 dict（代码 -> 公司信息）
+
+    返回:
+        dict: 组合名称 -> 股票 dict 列表（symbol、weight 以及公司索引中存在的字段）
+    """
+    symbols = pd.Index(holdings["symbol"].unique())
+    info = pd.DataFrame.from_dict(
+        {symbol: companies.get(symbol, {}) for symbol in symbols}, orient="index",
+    ).reindex(index=symbols, columns=list(ENRICH_FIELDS))
+    enriched = holdings.join(info, on="symbol")
+
+    fields = ["symbol", "weight", *ENRICH_FIELDS]
+    records = enriched[fields].astype(object).where(enriched[fields].notna(), None).to_dict("records")
+    portfolios = {}
+    for name, record in zip(enriched["portfolio"], records):
+        portfolios.setdefault(name, []).append({key: value for key, value in record.items() if value is not None})
+    return portfolios
@@ -0,0 +1,148 @@
+"""
+采样分析器 - 在后台线程中定期采样其它线程的调用栈，输出折叠栈格式
+
+折叠栈（collapsed stack）每行一个调用栈，从根到叶以分号分隔，末尾为采样次数:
+    run (asyncio/base_events.py:1);analyze_portfolio (services/analysis_service.py:128);... 42
+
+可直接交给 flamegraph.pl、speedscope 或 inferno 生成火焰图。采样只读取 sys._current_frames()，
+不安装跟踪函数，被采样代码的运行速度基本不受影响；开销只与采样频率和栈深度有关。
+"""
+
+import os
+import sys
+import time
+import threading
+from collections import Counter
+
+# 默认采样间隔（毫秒）
+DEFAULT_SAMPLE_INTERVAL_MS = float(os.environ.get("PROFILE_SAMPLE_INTERVAL_MS", 5))
+
+# 单个调用栈保留的最大帧数（超出时保留叶端）
+MAX_STACK_DEPTH = 200
+
+# 阻塞等待时的叶函数（事件循环等待 IO、线程等待条件变量或休眠），默认不计入结果
+IDLE_FUNCTIONS = {"select", "poll", "wait", "sleep"}
+
+# 直接调用 C 实现的阻塞函数（SimpleQueue.get、锁的 acquire、time.sleep）时，叶端是调用它的 Python 函数，
+# 按 (文件名, 函数名) 识别：QueueListener 的监听线程、线程池的空闲工作线程、Thread.join
+IDLE_FRAMES = {
+    ("handlers.py", "dequeue"),
+    ("thread.py", "_worker"),
+    ("threading.py", "_wait_for_tstate_lock"),
+}
+
+_session_lock = threading.Lock()
+
+
+class ProfilerBusyError(Exception):
+    """已有一个采样会话在运行"""
+
+
+def _frame_label(code):
+    # 只保留路径的最后两级，火焰图更易读
+    filename = "/".join(code.co_filename.replace("\\", "/").split("/")[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    采样分析器
+
+    用法:
+        with SamplingProfiler(thread_ids=[threading.get_ident()]) as profiler:
+            ...
+        text = profiler.collapsed()
+
+    参数:
+        interval_ms: 采样间隔（毫秒）
+        thread_ids: 只采样这些线程；None 表示采样除分析器自身以外的所有线程
+        include_idle: 是否保留叶函数为阻塞等待的空闲栈（见 IDLE_FUNCTIONS、IDLE_FRAMES）
+    """
+
+    def __init__(self, interval_ms=DEFAULT_SAMPLE_INTERVAL_MS, thread_ids=None, include_idle=False):
+        self.interval = max(float(interval_ms), 0.5) / 1000
+        self.thread_ids = set(thread_ids) if thread_ids is not None else None
+        self.include_idle = include_idle
+        self.stacks = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self.duration = 0.0
+        self._labels = {}
+        self._idle = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._started_at = None
+
+    def start(self):
+        """开始采样；同一时间只允许一个采样会话"""
+        if not _session_lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profiling session is already running")
+        self._stop.clear()
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止采样并等待采样线程结束"""
+        if self._thread is None:
+            return self
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.duration = time.perf_counter() - self._started_at
+        _session_lock.release()
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = _frame_label(code)
+        return label
+
+    def _is_idle(self, code):
+        idle = self._idle.get(code)
+        if idle is None:
+            filename = os.path.basename(code.co_filename)
+            idle = self._idle[code] = code.co_name in IDLE_FUNCTIONS or (filename, code.co_name) in IDLE_FRAMES
+        return idle
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                continue
+            if not self.include_idle and self._is_idle(frame.f_code):
+                self.idle_samples += 1
+                continue
+            codes = []
+            while frame is not None and len(codes) < MAX_STACK_DEPTH:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            self.stacks[tuple(self._label(code) for code in reversed(codes))] += 1
+            self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def collapsed(self):
+        """折叠栈文本，按采样次数从多到少排列"""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self):
+        """采样概况：采样数、空闲采样数、持续时间和采样间隔"""
+        return {
+            "samples": self.samples,
+            "idleSamples": self.idle_samples,
+            "durationSeconds": round(self.duration, 3),
+            "intervalMs": round(self.interval * 1000, 3),
+            "stacks": len(self.stacks),
+        }
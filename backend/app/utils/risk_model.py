@@ -0,0 +1,337 @@
+"""
+因子模型风险引擎 - 基于 Factor_Exposures.csv 和 Factor_Covariance_Matrix.csv
+
+组合方差分解为因子方差和特异方差:
+    σ² = xᵀ F x + Σ dᵢ wᵢ²,  x = Xᵀ w
+
+其中 X 为 N×K 因子暴露度矩阵，F 为 K×K 因子协方差矩阵，d 为特异方差。
+所有矩阵按数据版本缓存，单次计算复杂度为 O(N·K + K²)，从不构造 N×N 资产协方差矩阵。
+"""
+
+import os
+import logging
+import traceback
+
+import numpy as np
+import pandas as pd
+
+from .market_data import (
+    DATA_DIR,
+    FACTOR_EXPOSURES_PATH,
+    FACTOR_COVARIANCE_PATH,
+    BENCHMARK_WEIGHTS_PATH,
+    get_data_version,
+    get_factor_exposures,
+    get_factor_covariance,
+    get_benchmark_weights,
+    get_factor_category,
+)
+from .timing import timed
+from .metrics import record_cache
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+# 特异风险文件（Ticker, SpecificRisk：年化波动率，单位为百分比），可通过环境变量配置
+SPECIFIC_RISK_PATH = os.environ.get("SPECIFIC_RISK_PATH", str(DATA_DIR / "Specific_Risk.csv"))
+
+# 缺少特异风险数据时使用的默认年化特异波动率（百分比）
+DEFAULT_SPECIFIC_RISK = 25.0
+
+# 协方差矩阵单位为百分比的平方，转换为小数
+COVARIANCE_SCALE = 1e-4
+
+# 缓存的风险模型
+_risk_model = None
+
+
+def get_risk_model():
+    """
+    获取缓存的风险模型矩阵，数据文件更新后自动重新加载
+
+    返回:
+        dict: 包含以下键
+            factors: 因子名称数组 (K)
+            exposures: 因子暴露度矩阵 (N×K)，缺失值为0
+            covariance: 因子协方差矩阵 (K×K)，小数单位
+            specific_var: 特异方差向量 (N)，小数单位
+            specific_default: 特异风险使用默认值（特异风险文件中没有该股票或文件不存在）的布尔向量 (N)
+            ticker_index: 股票代码 -> 行号
+            benchmark_weights: 基准权重向量 (N)
+            benchmark_exposure: 基准因子暴露度 (K)
+            benchmark_specific_var: 基准特异方差 bᵀ D b
+    """
+    global _risk_model
+
+    version = get_data_version(
+        FACTOR_EXPOSURES_PATH, FACTOR_COVARIANCE_PATH, SPECIFIC_RISK_PATH, BENCHMARK_WEIGHTS_PATH
+    )
+    if _risk_model is not None and _risk_model["version"] == version:
+        record_cache("risk_model", "hit")
+        return _risk_model
+    if _risk_model is not None:
+        record_cache("risk_model", "eviction")
+    record_cache("risk_model", "miss")
+
+    covariance_df = get_factor_covariance()
+    factors = covariance_df.columns.to_numpy(dtype=object)
+    covariance = np.nan_to_num(
+        covariance_df.loc[factors, factors].to_numpy(dtype=float), nan=0.0, posinf=0.0, neginf=0.0
+    ) * COVARIANCE_SCALE
+
+    # 协方差矩阵中存在但暴露度数据中没有的因子（如Beta），暴露度记为0
+    exposures_df = get_factor_exposures().reindex(columns=factors)
+    exposures = np.nan_to_num(exposures_df.to_numpy(dtype=float), nan=0.0, posinf=0.0, neginf=0.0)
+    tickers = exposures_df.index
+
+    specific_risk, specific_default = _load_specific_risk(tickers)
+    specific_var = (specific_risk / 100.0) ** 2
+
+    benchmark = get_benchmark_weights().reindex(tickers, fill_value=0.0).to_numpy(dtype=float)
+
+    for array in (covariance, exposures, specific_var, specific_default, benchmark):
+        array.setflags(write=False)
+
+    _risk_model = {
+        "version": version,
+        "factors": factors,
+        "exposures": exposures,
+        "covariance": covariance,
+        "specific_var": specific_var,
+        "specific_default": specific_default,
+        "ticker_index": {ticker: i for i, ticker in enumerate(tickers)},
+        "benchmark_weights": benchmark,
+        "benchmark_exposure": benchmark @ exposures,
+        "benchmark_specific_var": float(benchmark ** 2 @ specific_var),
+    }
+    logger.info(f"风险模型已加载: {len(tickers)} 个股票, {len(factors)} 个因子")
+    return _risk_model
+
+
+@timed("load_specific_risk")
+def _load_specific_risk(tickers):
+    """读取特异风险（年化百分比），缺失时使用默认值；返回 (特异风险数组, 是否使用默认值的布尔数组)"""
+    specific_risk = pd.Series(DEFAULT_SPECIFIC_RISK, index=tickers, dtype=float)
+    if not os.path.exists(SPECIFIC_RISK_PATH):
+        logger.warning(f"找不到特异风险文件，使用默认特异波动率 {DEFAULT_SPECIFIC_RISK}%: {SPECIFIC_RISK_PATH}")
+        return specific_risk.to_numpy(), np.ones(len(tickers), dtype=bool)
+
+    specific_default = np.ones(len(tickers), dtype=bool)
+    try:
+        data = pd.read_csv(SPECIFIC_RISK_PATH).groupby('Ticker')['SpecificRisk'].last()
+        data = data[np.isfinite(data) & (data > 0)]
+        specific_risk.update(data)
+        specific_default = ~tickers.isin(data.index)
+    except Exception as e:
+        logger.error(f"读取特异风险文件时出错: {e}")
+        logger.debug(traceback.format_exc())
+    return specific_risk.to_numpy(), specific_default
+
+
+def get_portfolio_arrays(symbols, weights, model=None):
+    """
+    将投资组合映射到风险模型的数组表示
+
+    参数:
+        symbols: 股票代码列表
+        weights: 与股票代码对应的权重列表（自动合并重复股票并标准化为和为1）
+        model: 风险模型，默认使用 get_risk_model()
+
+    返回:
+        dict: symbols, weights, exposures (N×K), specific_var, specific_default, benchmark_weights, unmapped
+    """
+    model = model or get_risk_model()
+
+    weight_series = pd.Series(weights, index=list(symbols), dtype=float).groupby(level=0, sort=False).sum()
+    total = weight_series.sum()
+    if total > 0:
+        weight_series = weight_series / total
+    elif len(weight_series) > 0:
+        weight_series[:] = 1.0 / len(weight_series)
+
+    ticker_index = model["ticker_index"]
+    rows = np.array([ticker_index.get(symbol, -1) for symbol in weight_series.index], dtype=np.int64)
+    mapped = rows >= 0
+
+    # 没有因子数据的股票：因子暴露度为0，使用默认特异风险，且不属于基准
+    exposures = np.zeros((len(rows), len(model["factors"])))
+    exposures[mapped] = model["exposures"][rows[mapped]]
+    specific_var = np.full(len(rows), (DEFAULT_SPECIFIC_RISK / 100.0) ** 2)
+    specific_var[mapped] = model["specific_var"][rows[mapped]]
+    specific_default = np.ones(len(rows), dtype=bool)
+    specific_default[mapped] = model["specific_default"][rows[mapped]]
+    benchmark_weights = np.zeros(len(rows))
+    benchmark_weights[mapped] = model["benchmark_weights"][rows[mapped]]
+
+    return {
+        "symbols": weight_series.index.tolist(),
+        "weights": weight_series.to_numpy(),
+        "exposures": exposures,
+        "specific_var": specific_var,
+        "specific_default": specific_default,
+        "benchmark_weights": benchmark_weights,
+        "unmapped": weight_series.index[~mapped].tolist(),
+    }
+
+
+def decompose_risk(weights, exposures, specific_var, covariance, benchmark_weights=None,
+                   benchmark_exposure=None, benchmark_specific_var=0.0):
+    """
+    计算组合风险分解（纯数值计算，所有结果为小数单位）
+
+    参数:
+        weights: 组合权重 (N)
+        exposures: 因子暴露度矩阵 (N×K)
+        specific_var: 特异方差 (N)
+        covariance: 因子协方差矩阵 (K×K)
+        benchmark_weights: 组合中每个股票的基准权重 (N)，可选
+        benchmark_exposure: 基准因子暴露度 (K)，可选
+        benchmark_specific_var: 基准整体特异方差 bᵀ D b
+
+    返回:
+        dict: 总风险、因子/特异方差、因子和资产的边际/成分贡献以及跟踪误差
+    """
+    factor_exposure = exposures.T @ weights                  # K
+    factor_cov_exposure = covariance @ factor_exposure       # K
+    factor_var = float(factor_exposure @ factor_cov_exposure)
+    specific_contrib_var = specific_var * weights            # N
+    specific_var_total = float(weights @ specific_contrib_var)
+    total_var = max(factor_var + specific_var_total, 0.0)
+    total_risk = np.sqrt(total_var)
+
+    # 边际贡献 ∂σ/∂x 与 ∂σ/∂w，成分贡献之和等于总风险
+    inv_risk = 1.0 / total_risk if total_risk > 0 else 0.0
+    factor_marginal = factor_cov_exposure * inv_risk
+    factor_component = factor_exposure * factor_marginal
+    asset_marginal = (exposures @ factor_cov_exposure + specific_contrib_var) * inv_risk
+    asset_component = weights * asset_marginal
+
+    result = {
+        "total_risk": total_risk,
+        "factor_var": factor_var,
+        "specific_var": specific_var_total,
+        "factor_exposure": factor_exposure,
+        "factor_marginal": factor_marginal,
+        "factor_component": factor_component,
+        "asset_marginal": asset_marginal,
+        "asset_component": asset_component,
+    }
+
+    if benchmark_weights is not None and benchmark_exposure is not None:
+        # 主动风险：主动因子暴露度 + 主动特异方差
+        # Σ dᵢ aᵢ² = bᵀDb + Σ_{i∈组合} dᵢ (wᵢ² - 2 wᵢ bᵢ)，只需遍历组合中的股票
+        active_exposure = factor_exposure - benchmark_exposure
+        active_factor_var = float(active_exposure @ covariance @ active_exposure)
+        active_specific_var = max(
+            benchmark_specific_var + float(specific_var @ (weights ** 2 - 2 * weights * benchmark_weights)), 0.0
+        )
+        result.update({
+            "active_exposure": active_exposure,
+            "active_factor_var": active_factor_var,
+            "active_specific_var": active_specific_var,
+            "tracking_error": np.sqrt(max(active_factor_var + active_specific_var, 0.0)),
+        })
+
+    return result
+
+
+def calculate_risk_decomposition(symbols, weights):
+    """
+    计算投资组合的因子模型风险分解，返回前端所需格式（百分比单位）
+
+    参数:
+        symbols: 股票代码列表
+        weights: 与股票代码对应的权重列表
+
+    返回:
+        dict: 总预测波动率、因子/特异风险拆分、因子和资产风险贡献以及相对基准的跟踪误差；
+              specificRiskSource 表示特异风险来自特异风险文件（file）、全部为默认值（default）或部分为默认值（partial）
+    """
+    model = get_risk_model()
+    portfolio = get_portfolio_arrays(symbols, weights, model)
+
+    if portfolio["unmapped"]:
+        logger.warning(f"{len(portfolio['unmapped'])} 个股票没有因子数据，仅计入特异风险: "
+                       f"{', '.join(portfolio['unmapped'][:5])}{'...' if len(portfolio['unmapped']) > 5 else ''}")
+
+    risk = decompose_risk(
+        portfolio["weights"], portfolio["exposures"], portfolio["specific_var"], model["covariance"],
+        benchmark_weights=portfolio["benchmark_weights"],
+        benchmark_exposure=model["benchmark_exposure"],
+        benchmark_specific_var=model["benchmark_specific_var"],
+    )
+
+    total_risk = risk["total_risk"]
+    total_var = risk["factor_var"] + risk["specific_var"]
+    var_share = 100.0 / total_var if total_var > 0 else 0.0
+    risk_share = 100.0 / total_risk if total_risk > 0 else 0.0
+
+    factor_contributions = [
+        {
+            "name": name,
+            "category": get_factor_category(name),
+            "exposure": round(exposure, 4),
+            "activeExposure": round(active, 4) + 0.0,
+            "marginal": round(marginal * 100, 4),
+            "contribution": round(component * 100, 4),
+            "percentage": round(component * risk_share, 2),
+        }
+        for name, exposure, active, marginal, component in zip(
+            model["factors"].tolist(),
+            risk["factor_exposure"].tolist(),
+            risk["active_exposure"].tolist(),
+            risk["factor_marginal"].tolist(),
+            risk["factor_component"].tolist(),
+        )
+        if exposure != 0 or active != 0
+    ]
+    factor_contributions.sort(key=lambda item: abs(item["contribution"]), reverse=True)
+
+    specific_risk = np.sqrt(portfolio["specific_var"]).tolist()
+    asset_contributions = [
+        {
+            "symbol": symbol,
+            "weight": round(weight * 100, 2),
+            "benchmarkWeight": round(bench_weight * 100, 4),
+            "specificRisk": round(spec * 100, 2),
+            "specificRiskSource": "default" if default else "file",
+            "marginal": round(marginal * 100, 4),
+            "contribution": round(component * 100, 4),
+            "percentage": round(component * risk_share, 2),
+        }
+        for symbol, weight, bench_weight, spec, default, marginal, component in zip(
+            portfolio["symbols"],
+            portfolio["weights"].tolist(),
+            portfolio["benchmark_weights"].tolist(),
+            specific_risk,
+            portfolio["specific_default"].tolist(),
+            risk["asset_marginal"].tolist(),
+            risk["asset_component"].tolist(),
+        )
+    ]
+    asset_contributions.sort(key=lambda item: abs(item["contribution"]), reverse=True)
+
+    # 特异风险来源：默认值只是占位假设，前端据此提示特异风险和总风险不可靠
+    defaults = portfolio["specific_default"]
+    if defaults.all():
+        specific_source = "default"
+    elif defaults.any():
+        specific_source = "partial"
+    else:
+        specific_source = "file"
+
+    return {
+        "totalRisk": round(total_risk * 100, 2),
+        "factorRisk": round(np.sqrt(max(risk["factor_var"], 0.0)) * 100, 2),
+        "specificRisk": round(np.sqrt(max(risk["specific_var"], 0.0)) * 100, 2),
+        "specificRiskSource": specific_source,
+        "factorVariancePct": round(risk["factor_var"] * var_share, 2),
+        "specificVariancePct": round(risk["specific_var"] * var_share, 2),
+        "trackingError": round(risk["tracking_error"] * 100, 2),
+        "activeFactorRisk": round(np.sqrt(risk["active_factor_var"]) * 100, 2),
+        "activeSpecificRisk": round(np.sqrt(risk["active_specific_var"]) * 100, 2),
+        "factorContributions": factor_contributions,
+        "assetContributions": asset_contributions,
+        "mappedTickerCount": len(portfolio["symbols"]) - len(portfolio["unmapped"]),
+        "unmappedTickers": portfolio["unmapped"],
+    }
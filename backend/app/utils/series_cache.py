@@ -0,0 +1,207 @@
+"""
+时间序列磁盘缓存 - 以二进制 .npy 文件存储日期和数值
+
+每个缓存条目由 (代码, 数据源, 日期范围) 确定，包含三个文件:
+    <key>.<version>.dates.npy   datetime64[ns] 日期数组
+    <key>.<version>.values.npy  float64 数值数组
+    <key>.meta.json             元数据（数据文件版本、创建时间、过期时间、长度）
+
+每次写入都使用新的版本号作为数据文件名，数据文件写完后再原子替换元数据，使其指向新版本，
+已有的数据文件从不被覆盖。因此并发读取方要么读到旧版本、要么读到新版本的完整日期和数值，
+不会把新日期与旧数值拼在一起；Windows 上仍被内存映射的旧文件也不会阻止写入。旧版本在
+写入新版本后删除，删除失败（文件仍被映射）的留待下次写入或 purge_expired 时清理。
+读取时使用内存映射（np.load(mmap_mode='r')），不需要解析 JSON 或日期字符串。
+"""
+
+import os
+import re
+import json
+import uuid
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+# 缓存目录
+SERIES_CACHE_DIR = Path(os.environ.get(
+    "SERIES_CACHE_DIR", Path(os.path.dirname(os.path.dirname(__file__))) / "data" / "cache" / "series"
+))
+
+DEFAULT_TTL = 3600  # 1小时
+
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9.-]+")
+# 数据文件名: <key>[.<version>].(dates|values).npy
+_DATA_FILE = re.compile(r"(?P<key>.+?)(?:\.(?P<version>[0-9a-f]{32}))?\.(?:dates|values)\.npy")
+
+
+def _format_bound(value):
+    """日期范围边界的缓存键表示（精确到日），None 表示不限"""
+    if value is None:
+        return "all"
+    return pd.Timestamp(value).strftime("%Y%m%d")
+
+
+def cache_key(symbol, source, start=None, end=None):
+    """由 (代码, 数据源, 日期范围) 生成可用作文件名的缓存键"""
+    parts = [symbol, source, _format_bound(start), _format_bound(end)]
+    return "_".join(_UNSAFE_CHARS.sub("-", str(part)) for part in parts)
+
+
+def _meta_path(key, cache_dir):
+    return cache_dir / f"{key}.meta.json"
+
+
+def _data_paths(key, version, cache_dir):
+    """数据文件路径；version 为 None 时为未带版本号的旧格式文件名"""
+    prefix = f"{key}.{version}" if version else key
+    return cache_dir / f"{prefix}.dates.npy", cache_dir / f"{prefix}.values.npy"
+
+
+def _unlink(path):
+    """删除文件，返回 False 表示文件仍被使用（Windows 上仍被内存映射的文件无法删除）"""
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+    except OSError:
+        return False
+    return True
+
+
+def _remove_data_files(key, cache_dir, keep=None):
+    """删除条目除 keep 版本以外的所有数据文件，返回无法删除（仍被使用）的文件数"""
+    busy = 0
+    # 缓存键中不含通配符（见 _UNSAFE_CHARS）
+    for path in cache_dir.glob(f"{key}.*npy"):
+        match = _DATA_FILE.fullmatch(path.name)
+        if not match or match["key"] != key or (keep and match["version"] == keep):
+            continue
+        busy += not _unlink(path)
+    return busy
+
+
+def _atomic_write(path, write):
+    """写入同目录下的临时文件后原子替换目标文件"""
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def save_series(series, symbol, source, start=None, end=None, ttl=DEFAULT_TTL, cache_dir=None):
+    """
+    将时间序列写入磁盘缓存
+
+    参数:
+        series: 以日期为索引的 pandas Series
+        symbol, source, start, end: 缓存键
+        ttl: 有效期（秒）
+        cache_dir: 缓存目录，默认为 SERIES_CACHE_DIR
+
+    返回:
+        datetime: 过期时间
+    """
+    cache_dir = Path(cache_dir or SERIES_CACHE_DIR)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    key = cache_key(symbol, source, start, end)
+    version = uuid.uuid4().hex
+    dates_path, values_path = _data_paths(key, version, cache_dir)
+    meta_path = _meta_path(key, cache_dir)
+
+    dates = pd.DatetimeIndex(series.index).tz_localize(None).to_numpy(dtype="datetime64[ns]")
+    values = np.ascontiguousarray(series.to_numpy(dtype=np.float64))
+    now = datetime.now()
+    expiry = now + timedelta(seconds=ttl)
+    meta = {
+        "symbol": symbol,
+        "source": source,
+        "start": _format_bound(start),
+        "end": _format_bound(end),
+        "length": int(len(values)),
+        "version": version,
+        "created": now.isoformat(),
+        "expiry": expiry.isoformat(),
+    }
+
+    _atomic_write(dates_path, lambda f: np.save(f, dates))
+    _atomic_write(values_path, lambda f: np.save(f, values))
+    # 元数据最后写入，作为条目完整可用的标志，并切换到新版本的数据文件
+    _atomic_write(meta_path, lambda f: f.write(json.dumps(meta).encode("utf-8")))
+    busy = _remove_data_files(key, cache_dir, keep=version)
+    if busy:
+        logger.debug("Kept %s series cache files for %s that are still in use", busy, key)
+    return expiry
+
+
+def load_series(symbol, source, start=None, end=None, allow_expired=False, cache_dir=None):
+    """
+    从磁盘缓存读取时间序列（内存映射）
+
+    返回:
+        tuple: (pandas Series, 过期时间)；条目不存在、已过期（allow_expired 为 False 时）或损坏时返回 (None, None)
+    """
+    cache_dir = Path(cache_dir or SERIES_CACHE_DIR)
+    key = cache_key(symbol, source, start, end)
+    meta_path = _meta_path(key, cache_dir)
+    if not meta_path.exists():
+        return None, None
+
+    try:
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        expiry = datetime.fromisoformat(meta["expiry"])
+        if expiry <= datetime.now() and not allow_expired:
+            return None, None
+
+        dates_path, values_path = _data_paths(key, meta.get("version"), cache_dir)
+        dates = np.load(dates_path, mmap_mode="r")
+        values = np.load(values_path, mmap_mode="r")
+        if len(dates) != meta["length"] or len(values) != meta["length"]:
+            logger.warning(f"Series cache entry {meta_path.name} is inconsistent, ignoring it")
+            return None, None
+        return pd.Series(values, index=pd.DatetimeIndex(dates), copy=False), expiry
+    except Exception as e:
+        logger.error(f"Error reading series cache {meta_path.name}: {e}")
+        return None, None
+
+
+def purge_expired(cache_dir=None):
+    """删除已过期的缓存条目，返回删除的条目数"""
+    cache_dir = Path(cache_dir or SERIES_CACHE_DIR)
+    if not cache_dir.exists():
+        return 0
+
+    now = datetime.now()
+    removed = 0
+    # 有效条目当前使用的数据文件版本
+    live = {}
+    for meta_path in cache_dir.glob("*.meta.json"):
+        key = meta_path.name[:-len(".meta.json")]
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            expiry = datetime.fromisoformat(meta["expiry"])
+        except Exception:
+            meta, expiry = {}, now
+        if expiry > now:
+            live[key] = meta.get("version")
+            continue
+        # 先删除元数据，使条目立即失效
+        _unlink(meta_path)
+        removed += 1
+
+    # 删除过期条目的数据文件，以及之前因仍被使用而未能删除的旧版本
+    for path in cache_dir.glob("*.npy"):
+        match = _DATA_FILE.fullmatch(path.name)
+        if match and (match["key"] not in live or live[match["key"]] != match["version"]):
+            _unlink(path)
+    return removed
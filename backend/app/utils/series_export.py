@@ -0,0 +1,166 @@
+"""
+时间序列导出 - 把组合日收益、基准收益、净值和滚动指标以列式格式输出
+
+所有列都是等长的 NumPy 数组（小数单位，不做百分比换算和四舍五入），按块流式写出:
+    csv:     pandas C 写入器，按块生成，无逐行 Python 转换
+    arrow:   Arrow IPC 流格式，每块一个 record batch，数值列直接引用 NumPy 缓冲区
+    parquet: 单个 Parquet 文件（需要完整写出后才有文件尾，因此一次性返回）
+
+arrow 和 parquet 依赖可选的 pyarrow 包，未安装时抛出 ExportFormatUnavailableError。
+"""
+
+import io
+
+import numpy as np
+import pandas as pd
+
+from .timeseries import rolling_metrics
+
+SERIES_FORMATS = ("csv", "arrow", "parquet")
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+FILE_EXTENSIONS = {"csv": "csv", "arrow": "arrows", "parquet": "parquet"}
+
+# 每块的行数
+CHUNK_ROWS = 8192
+
+# 滚动指标列名
+ROLLING_COLUMNS = {
+    "return": "rollingReturn",
+    "vol": "rollingVol",
+    "beta": "rollingBeta",
+    "sharpe": "rollingSharpe",
+    "te": "rollingTe",
+}
+
+
+class ExportFormatUnavailableError(RuntimeError):
+    """导出格式所需的可选依赖未安装"""
+
+
+def _require_pyarrow(format):
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+        if format == "parquet":
+            import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ExportFormatUnavailableError(f"The {format} format requires the optional pyarrow package")
+    return pyarrow
+
+
+def build_series_columns(dates, portfolio_returns, benchmark_returns=None, window=63,
+                         metrics=("vol", "beta", "sharpe", "te")):
+    """
+    构建导出用的列
+
+    参数:
+        dates: 收益率日期（DatetimeIndex）
+        portfolio_returns: 组合日收益率数组
+        benchmark_returns: 基准日收益率数组（与组合对齐），没有基准时为 None
+        window: 滚动窗口（交易日）
+        metrics: 滚动指标，见 timeseries.rolling_metrics
+
+    返回:
+        dict: 列名 -> 数组，依次为 date、portfolioReturn、benchmarkReturn、portfolioIndex、benchmarkIndex
+              和各滚动指标列；没有基准时基准列为 NaN，窗口未满的滚动指标为 NaN
+    """
+    n = len(portfolio_returns)
+    portfolio_returns = np.asarray(portfolio_returns, dtype=float)
+    if benchmark_returns is None:
+        benchmark_returns_column = np.full(n, np.nan)
+        benchmark_index = np.full(n, np.nan)
+    else:
+        benchmark_returns_column = np.asarray(benchmark_returns, dtype=float)
+        benchmark_index = np.cumprod(1 + benchmark_returns_column) * 100
+
+    columns = {
+        "date": np.asarray(pd.DatetimeIndex(dates).values, dtype="datetime64[D]"),
+        "portfolioReturn": portfolio_returns,
+        "benchmarkReturn": benchmark_returns_column,
+        "portfolioIndex": np.cumprod(1 + portfolio_returns) * 100,
+        "benchmarkIndex": benchmark_index,
+    }
+
+    rolling = rolling_metrics(portfolio_returns, benchmark_returns, window=window, metrics=metrics)
+    for metric in metrics:
+        # 滚动指标对齐到窗口结束日，前 window - 1 行为 NaN
+        column = np.full(n, np.nan)
+        values = rolling[metric]
+        if len(values):
+            column[n - len(values):] = values
+        columns[ROLLING_COLUMNS[metric]] = column
+    return columns
+
+
+def _chunks(length, chunk_rows):
+    for start in range(0, max(length, 1), chunk_rows):
+        yield start, min(start + chunk_rows, length)
+
+
+def iter_csv(columns, chunk_rows=CHUNK_ROWS):
+    """按块生成 CSV 字节（首块带表头）"""
+    frame = pd.DataFrame(columns, copy=False)
+    for start, end in _chunks(len(frame), chunk_rows):
+        yield frame.iloc[start:end].to_csv(index=False, header=start == 0, float_format="%.10g",
+                                           date_format="%Y-%m-%d").encode()
+
+
+def _arrow_table(pa, columns):
+    arrays = {name: pa.array(values) for name, values in columns.items()}
+    return pa.table(arrays)
+
+
+def iter_arrow(columns, chunk_rows=CHUNK_ROWS):
+    """按块生成 Arrow IPC 流（每块一个 record batch）"""
+    pa = _require_pyarrow("arrow")
+    table = _arrow_table(pa, columns)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=chunk_rows):
+            writer.write_batch(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    # 流结束标记
+    yield sink.getvalue()
+
+
+def iter_parquet(columns):
+    """生成完整的 Parquet 文件"""
+    pa = _require_pyarrow("parquet")
+    sink = io.BytesIO()
+    pa.parquet.write_table(_arrow_table(pa, columns), sink)
+    yield sink.getvalue()
+
+
+def export_series(columns, format):
+    """
+    按格式返回字节块迭代器
+
+    参数:
+        columns: build_series_columns 的返回值
+        format: "csv"、"arrow" 或 "parquet"
+
+    返回:
+        iterator: 字节块
+
+    异常:
+        ValueError: 不支持的格式
+        ExportFormatUnavailableError: 格式所需的 pyarrow 未安装
+    """
+    if format == "csv":
+        return iter_csv(columns)
+    if format == "arrow":
+        # 在返回迭代器之前检查依赖，使缺少依赖时能返回错误状态码而不是中断的流
+        _require_pyarrow("arrow")
+        return iter_arrow(columns)
+    if format == "parquet":
+        _require_pyarrow("parquet")
+        return iter_parquet(columns)
+    raise ValueError(f"Unsupported format: {format}. Supported: {', '.join(SERIES_FORMATS)}")
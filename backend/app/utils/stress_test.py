@@ -0,0 +1,409 @@
+"""
+压力测试引擎 - 因子冲击与历史情景重演
+
+因子冲击情景:
+    指定部分因子的冲击（以标准差或收益率表示），其余因子按因子协方差矩阵做条件传导:
+        f_U = Σ_US Σ_SS⁻¹ f_S
+    资产收益 = X f（特异收益期望为0），可再叠加行业或个股的价格冲击（直接覆盖该资产的收益）。
+
+历史情景重演:
+    使用价格历史中指定区间的实际资产收益；缺少数据的资产以基准收益代替。价格历史只覆盖区间的一部分时
+    在情景中注明实际使用的区间。
+
+所有情景 × 组合一次性以矩阵运算完成: 资产收益矩阵 (情景 × 资产) @ 权重矩阵 (资产 × 组合)。
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+from .market_data import get_static_data
+from .risk_model import get_risk_model
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS_PER_YEAR = 252
+DEFAULT_HORIZON = 21  # 冲击以一个月（21个交易日）的因子波动率为单位
+TOP_CONTRIBUTORS = 5
+# 区间起止日期与实际使用的价格日期相差超过该天数时，视为价格历史只覆盖了区间的一部分（容忍周末和假期）
+COVERAGE_TOLERANCE_DAYS = 7
+
+# 预定义情景库（冲击单位: sigma 为持有期因子标准差，return 为百分比收益率）
+PREDEFINED_SCENARIOS = [
+    {
+        "id": "market_crash",
+        "name": "Equity market crash",
+        "description": "Broad market factor falls 20%, other factors move conditionally",
+        "type": "factor",
+        "factorShocks": [{"factor": "Country", "shock": -20.0, "unit": "return"}],
+    },
+    {
+        "id": "momentum_crash",
+        "name": "Momentum crash",
+        "description": "Momentum factor drops 2 standard deviations",
+        "type": "factor",
+        "factorShocks": [{"factor": "Momentum", "shock": -2.0, "unit": "sigma"}],
+    },
+    {
+        "id": "tech_selloff",
+        "name": "Technology sell-off",
+        "description": "Information Technology stocks fall 10% and Momentum drops 2 standard deviations",
+        "type": "factor",
+        "factorShocks": [{"factor": "Momentum", "shock": -2.0, "unit": "sigma"}],
+        "sectorShocks": {"Information Technology": -10.0},
+    },
+    {
+        "id": "value_rotation",
+        "name": "Growth-to-value rotation",
+        "description": "Value rallies and Growth falls 2 standard deviations",
+        "type": "factor",
+        "factorShocks": [
+            {"factor": "Value", "shock": 2.0, "unit": "sigma"},
+            {"factor": "Growth", "shock": -2.0, "unit": "sigma"},
+        ],
+    },
+    {
+        "id": "liquidity_crunch",
+        "name": "Liquidity crunch",
+        "description": "Liquidity and Size factors fall 2 standard deviations, volatility rises",
+        "type": "factor",
+        "factorShocks": [
+            {"factor": "Liquidity", "shock": -2.0, "unit": "sigma"},
+            {"factor": "Size", "shock": -2.0, "unit": "sigma"},
+            {"factor": "Residual Volatility", "shock": 2.0, "unit": "sigma"},
+        ],
+    },
+    {
+        "id": "gfc_2008",
+        "name": "Global financial crisis",
+        "description": "Replay of 2008-09-01 to 2009-03-09",
+        "type": "historical",
+        "startDate": "2008-09-01",
+        "endDate": "2009-03-09",
+    },
+    {
+        "id": "covid_crash",
+        "name": "COVID-19 crash",
+        "description": "Replay of 2020-02-19 to 2020-03-23",
+        "type": "historical",
+        "startDate": "2020-02-19",
+        "endDate": "2020-03-23",
+    },
+    {
+        "id": "rate_hikes_2022",
+        "name": "2022 rate hikes",
+        "description": "Replay of 2022-01-03 to 2022-10-12",
+        "type": "historical",
+        "startDate": "2022-01-03",
+        "endDate": "2022-10-12",
+    },
+]
+
+# 缓存的情景库因子收益向量：(风险模型版本, 持有期) -> {情景ID: 因子收益向量}
+_scenario_library_cache = {}
+
+
+def get_predefined_scenario(scenario_id):
+    """按ID查找预定义情景，不存在时返回 None"""
+    for scenario in PREDEFINED_SCENARIOS:
+        if scenario["id"] == scenario_id:
+            return scenario
+    return None
+
+
+def conditional_factor_returns(covariance, shocked_index, shocked_values, propagate=True):
+    """
+    由部分因子的冲击推算全部因子收益
+
+    参数:
+        covariance: 因子协方差矩阵 (K×K)
+        shocked_index: 被冲击因子的下标
+        shocked_values: 被冲击因子的收益（小数单位）
+        propagate: 是否按协方差对其余因子做条件传导，否则其余因子收益为 0
+
+    返回:
+        ndarray: 因子收益向量 (K)
+    """
+    factor_returns = np.zeros(covariance.shape[0])
+    if len(shocked_index) == 0:
+        return factor_returns
+    if propagate:
+        # Σ_SS 可能奇异（如冲击高度相关的因子），使用伪逆
+        cov_ss = covariance[np.ix_(shocked_index, shocked_index)]
+        factor_returns = covariance[:, shocked_index] @ (np.linalg.pinv(cov_ss) @ shocked_values)
+    factor_returns[shocked_index] = shocked_values
+    return factor_returns
+
+
+def _factor_lookup(model):
+    return {name.casefold(): i for i, name in enumerate(model["factors"].tolist())}
+
+
+def compile_factor_scenario(scenario, model, horizon=DEFAULT_HORIZON):
+    """
+    将情景中的因子冲击转换为因子收益向量
+
+    返回:
+        ndarray: 因子收益向量 (K)，小数单位
+
+    异常:
+        ValueError: 因子名称或冲击单位无效
+    """
+    lookup = _factor_lookup(model)
+    sigma = np.sqrt(np.clip(np.diag(model["covariance"]), 0.0, None) * horizon / TRADING_DAYS_PER_YEAR)
+
+    shocked_index, shocked_values = [], []
+    for shock in scenario.get("factorShocks", []):
+        index = lookup.get(str(shock["factor"]).casefold())
+        if index is None:
+            raise ValueError(f"Unknown factor: {shock['factor']}")
+        unit = shock.get("unit", "sigma")
+        if unit == "sigma":
+            value = shock["shock"] * sigma[index]
+        elif unit == "return":
+            value = shock["shock"] / 100.0
+        else:
+            raise ValueError(f"Unknown shock unit: {unit}")
+        shocked_index.append(index)
+        shocked_values.append(value)
+
+    return conditional_factor_returns(
+        model["covariance"],
+        np.array(shocked_index, dtype=np.int64),
+        np.array(shocked_values, dtype=float),
+        propagate=scenario.get("propagate", True),
+    )
+
+
+def get_scenario_library(horizon=DEFAULT_HORIZON):
+    """预定义因子情景的因子收益向量（按风险模型版本和持有期缓存）"""
+    model = get_risk_model()
+    key = (model["version"], horizon)
+    library = _scenario_library_cache.get(key)
+    if library is None:
+        library = {
+            scenario["id"]: compile_factor_scenario(scenario, model, horizon)
+            for scenario in PREDEFINED_SCENARIOS
+            if scenario["type"] == "factor"
+        }
+        for factor_returns in library.values():
+            factor_returns.setflags(write=False)
+        # 风险模型更新后旧版本的情景不再需要
+        _scenario_library_cache.clear()
+        _scenario_library_cache[key] = library
+    return library
+
+
+def _price_overrides(scenario, symbols, sectors):
+    """行业和个股价格冲击：返回每个资产被覆盖的收益（小数单位），未冲击的资产为 NaN"""
+    overrides = np.full(len(symbols), np.nan)
+    sector_shocks = {str(k).casefold(): v for k, v in (scenario.get("sectorShocks") or {}).items()}
+    if sector_shocks:
+        for i, sector in enumerate(sectors):
+            shock = sector_shocks.get(str(sector).casefold())
+            if shock is not None:
+                overrides[i] = shock / 100.0
+    asset_shocks = {str(k).upper(): v for k, v in (scenario.get("assetShocks") or {}).items()}
+    for i, symbol in enumerate(symbols):
+        if symbol in asset_shocks:
+            overrides[i] = asset_shocks[symbol] / 100.0
+    return overrides
+
+
+def historical_asset_returns(prices, symbols, start_date, end_date, benchmark_column=None):
+    """
+    历史区间内各资产的累计收益
+
+    参数:
+        prices: 价格 DataFrame（日期索引，列为资产）
+        symbols: 需要的资产代码
+        start_date, end_date: 区间起止日期
+        benchmark_column: 基准所在列，缺少数据的资产以基准收益代替（没有基准时记为 0）
+
+    返回:
+        tuple: (资产收益数组, 以基准代替的资产列表, 实际使用的 (起始日期, 结束日期))；
+               区间内没有数据时返回 (None, [], None)
+    """
+    index = prices.index
+    start = index.searchsorted(pd.Timestamp(start_date), side="left")
+    end = index.searchsorted(pd.Timestamp(end_date), side="right") - 1
+    if start >= len(index) or end <= start:
+        return None, [], None
+
+    window = prices.iloc[[start, end]]
+    period_returns = window.iloc[1] / window.iloc[0] - 1
+    proxy = 0.0
+    if benchmark_column is not None and benchmark_column in period_returns.index:
+        benchmark_return = float(period_returns[benchmark_column])
+        proxy = benchmark_return if np.isfinite(benchmark_return) else 0.0
+
+    returns = period_returns.reindex(symbols).to_numpy(dtype=float)
+    missing = ~np.isfinite(returns)
+    returns[missing] = proxy
+    return returns, [symbol for symbol, flag in zip(symbols, missing) if flag], (index[start], index[end])
+
+
+def run_stress_test(symbols, weight_matrix, factor_returns, overrides, model=None):
+    """
+    对多个组合同时运行多个情景（纯数值计算）
+
+    参数:
+        symbols: 资产代码列表 (N)
+        weight_matrix: 权重矩阵 (N × 组合数)
+        factor_returns: 因子收益矩阵 (情景数 × K)，历史情景行为 0
+        overrides: 资产收益覆盖矩阵 (情景数 × N)，NaN 表示使用因子模型推算的收益
+        model: 风险模型，默认使用 get_risk_model()
+
+    返回:
+        dict: pnl (情景 × 组合), asset_returns (情景 × N), factor_contribution (情景 × K × 组合)
+    """
+    model = model or get_risk_model()
+    ticker_index = model["ticker_index"]
+    rows = np.array([ticker_index.get(symbol, -1) for symbol in symbols], dtype=np.int64)
+    exposures = np.zeros((len(symbols), len(model["factors"])))
+    exposures[rows >= 0] = model["exposures"][rows[rows >= 0]]
+
+    factor_implied = factor_returns @ exposures.T                     # 情景 × N
+    overridden = np.isfinite(overrides)
+    asset_returns = np.where(overridden, overrides, factor_implied)
+    pnl = asset_returns @ weight_matrix                               # 情景 × 组合
+
+    # 因子贡献只计入未被价格冲击覆盖的资产：先计算所有资产的组合暴露度 (K × 组合)，再对有覆盖的情景
+    # 减去被覆盖资产（通常只有几行）的暴露度，不构建 情景 × N × 组合 的中间数组
+    portfolio_exposure = exposures.T @ weight_matrix
+    effective_exposure = np.repeat(portfolio_exposure[None, :, :], len(factor_returns), axis=0)  # 情景 × K × 组合
+    fully_overridden = overridden.all(axis=1)
+    effective_exposure[fully_overridden] = 0.0
+    for s in np.flatnonzero(overridden.any(axis=1) & ~fully_overridden):
+        mask = overridden[s]
+        effective_exposure[s] -= exposures[mask].T @ weight_matrix[mask]
+    factor_contribution = factor_returns[:, :, None] * effective_exposure
+
+    return {
+        "pnl": pnl,
+        "asset_returns": asset_returns,
+        "factor_contribution": factor_contribution,
+        "effective_exposure": effective_exposure,
+        "unmapped": [symbol for symbol, row in zip(symbols, rows) if row < 0],
+    }
+
+
+def stress_test_portfolios(portfolios, scenarios, prices=None, benchmark_column=None, horizon=DEFAULT_HORIZON):
+    """
+    运行压力测试并返回前端所需格式（百分比单位）
+
+    参数:
+        portfolios: 组合列表，每项为 {"id", "name", "symbols", "weights"}
+        scenarios: 情景定义列表（预定义情景或自定义情景，格式同 PREDEFINED_SCENARIOS）
+        prices: 价格 DataFrame，历史情景需要
+        benchmark_column: prices 中的基准列
+        horizon: 以 sigma 表示的冲击所对应的持有期（交易日）
+
+    异常:
+        ValueError: 情景定义无效
+    """
+    model = get_risk_model()
+
+    # 所有组合的资产并集及权重矩阵 (N × 组合数)
+    symbols = sorted({symbol for portfolio in portfolios for symbol in portfolio["symbols"]})
+    column = {symbol: i for i, symbol in enumerate(symbols)}
+    weight_matrix = np.zeros((len(symbols), len(portfolios)))
+    for j, portfolio in enumerate(portfolios):
+        weights = np.asarray(portfolio["weights"], dtype=float)
+        weights = weights / weights.sum() if weights.sum() > 0 else np.full(len(weights), 1.0 / len(weights))
+        np.add.at(weight_matrix[:, j], [column[symbol] for symbol in portfolio["symbols"]], weights)
+
+    static_data = get_static_data()
+    sectors = static_data["sector"].reindex(symbols).fillna("Other").tolist() if "sector" in static_data else []
+
+    library = get_scenario_library(horizon)
+    factor_returns = np.zeros((len(scenarios), len(model["factors"])))
+    overrides = np.full((len(scenarios), len(symbols)), np.nan)
+    notes = [[] for _ in scenarios]
+    available = np.ones(len(scenarios), dtype=bool)
+
+    for i, scenario in enumerate(scenarios):
+        scenario_type = scenario.get("type", "factor")
+        if scenario_type == "factor":
+            cached = library.get(scenario.get("id")) if get_predefined_scenario(scenario.get("id")) is scenario else None
+            factor_returns[i] = cached if cached is not None else compile_factor_scenario(scenario, model, horizon)
+            overrides[i] = _price_overrides(scenario, symbols, sectors)
+        elif scenario_type == "historical":
+            returns, missing, window = (None, [], None)
+            if prices is not None and not prices.empty:
+                returns, missing, window = historical_asset_returns(
+                    prices, symbols, scenario["startDate"], scenario["endDate"], benchmark_column
+                )
+            if returns is None:
+                available[i] = False
+                notes[i].append("No price history available for this period")
+                overrides[i] = 0.0
+                continue
+            overrides[i] = returns
+            tolerance = pd.Timedelta(days=COVERAGE_TOLERANCE_DAYS)
+            if window[0] - pd.Timestamp(scenario["startDate"]) > tolerance \
+                    or pd.Timestamp(scenario["endDate"]) - window[1] > tolerance:
+                notes[i].append(
+                    f"Price history only covers {window[0]:%Y-%m-%d} to {window[1]:%Y-%m-%d} of this period"
+                )
+            if missing:
+                notes[i].append(f"Benchmark return used for assets without data: {', '.join(missing[:10])}")
+        else:
+            raise ValueError(f"Unknown scenario type: {scenario_type}")
+
+    result = run_stress_test(symbols, weight_matrix, factor_returns, overrides, model)
+    factor_names = model["factors"].tolist()
+
+    scenario_results = []
+    for i, scenario in enumerate(scenarios):
+        portfolio_results = []
+        for j, portfolio in enumerate(portfolios):
+            held = np.flatnonzero(weight_matrix[:, j])
+            asset_contribution = result["asset_returns"][i, held] * weight_matrix[held, j]
+            top_assets = held[np.argsort(-np.abs(asset_contribution))[:TOP_CONTRIBUTORS]]
+            item = {
+                "portfolioId": portfolio["id"],
+                "portfolioName": portfolio["name"],
+                "pnl": round(float(result["pnl"][i, j]) * 100, 2) + 0.0 if available[i] else None,
+                "topAssets": [
+                    {
+                        "symbol": symbols[n],
+                        "weight": round(float(weight_matrix[n, j]) * 100, 2),
+                        "return": round(float(result["asset_returns"][i, n]) * 100, 2) + 0.0,
+                        "contribution": round(float(result["asset_returns"][i, n] * weight_matrix[n, j]) * 100, 2) + 0.0,
+                    }
+                    for n in top_assets
+                ] if available[i] else [],
+            }
+            if scenario.get("type", "factor") == "factor":
+                contribution = result["factor_contribution"][i, :, j]
+                top_factors = np.argsort(-np.abs(contribution))[:TOP_CONTRIBUTORS]
+                item["topFactors"] = [
+                    {
+                        "name": factor_names[k],
+                        "exposure": round(float(result["effective_exposure"][i, k, j]), 4) + 0.0,
+                        "factorReturn": round(float(factor_returns[i, k]) * 100, 2) + 0.0,
+                        "contribution": round(float(contribution[k]) * 100, 2) + 0.0,
+                    }
+                    for k in top_factors
+                    if contribution[k] != 0
+                ]
+            portfolio_results.append(item)
+
+        scenario_results.append({
+            "id": scenario.get("id"),
+            "name": scenario.get("name", scenario.get("id") or f"Scenario {i + 1}"),
+            "description": scenario.get("description"),
+            "type": scenario.get("type", "factor"),
+            "available": bool(available[i]),
+            "notes": notes[i],
+            "results": portfolio_results,
+        })
+
+    return {
+        "horizon": horizon,
+        "scenarios": scenario_results,
+        "unmappedTickers": result["unmapped"],
+    }
@@ -0,0 +1,369 @@
+"""
+时间序列计算工具 - 基于 NumPy 数组的向量化内核
+
+所有函数接收一维收益率数组，复杂度为 O(n)，不使用 rolling().apply 等逐窗口的 Python 回调。
+"""
+
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS_PER_YEAR = 252
+RISK_FREE_RATE = 0.03  # 假设3%无风险利率（与风险指标计算保持一致）
+
+
+def _window_sums(x, window):
+    """滑动窗口求和：利用前缀和，结果第 i 个元素对应以 x[i + window - 1] 结尾的窗口"""
+    prefix = np.concatenate(([0.0], np.cumsum(x)))
+    return prefix[window:] - prefix[:-window]
+
+
+def rolling_mean(x, window):
+    """滑动窗口均值，长度为 len(x) - window + 1"""
+    return _window_sums(x, window) / window
+
+
+def rolling_cov(x, y, window):
+    """
+    滑动窗口样本协方差
+
+    先减去全样本均值再计算前缀和（与Welford方法同样的中心化思路），
+    避免长序列上平方和相减造成的精度损失。
+    """
+    x = x - x.mean()
+    y = y - y.mean()
+    sum_x = _window_sums(x, window)
+    sum_y = _window_sums(y, window)
+    sum_xy = _window_sums(x * y, window)
+    return (sum_xy - sum_x * sum_y / window) / (window - 1)
+
+
+def rolling_var(x, window):
+    """滑动窗口样本方差"""
+    return np.clip(rolling_cov(x, x, window), 0.0, None)
+
+
+def rolling_metrics(portfolio_returns, benchmark_returns=None, window=63, metrics=("vol", "beta", "sharpe", "te"),
+                    risk_free_rate=RISK_FREE_RATE):
+    """
+    计算滚动风险与业绩指标（年化，小数单位）
+
+    参数:
+        portfolio_returns: 组合日收益率数组
+        benchmark_returns: 基准日收益率数组（与组合对齐），beta/te 需要
+        window: 窗口长度（交易日）
+        metrics: 需要计算的指标，可选 return, vol, sharpe, beta, te
+
+    返回:
+        dict: 指标名称 -> 长度为 len(portfolio_returns) - window + 1 的数组；无法计算的指标为 NaN
+    """
+    n = len(portfolio_returns) - window + 1
+    result = {}
+    if n <= 0 or window < 2:
+        return {metric: np.array([]) for metric in metrics}
+
+    annual_return = rolling_mean(portfolio_returns, window) * TRADING_DAYS_PER_YEAR
+    volatility = np.sqrt(rolling_var(portfolio_returns, window) * TRADING_DAYS_PER_YEAR)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for metric in metrics:
+            if metric == "return":
+                result[metric] = annual_return
+            elif metric == "vol":
+                result[metric] = volatility
+            elif metric == "sharpe":
+                result[metric] = np.where(volatility > 0, (annual_return - risk_free_rate) / volatility, np.nan)
+            elif benchmark_returns is None:
+                result[metric] = np.full(n, np.nan)
+            elif metric == "beta":
+                benchmark_var = rolling_var(benchmark_returns, window)
+                result[metric] = np.where(
+                    benchmark_var > 0, rolling_cov(portfolio_returns, benchmark_returns, window) / benchmark_var, np.nan
+                )
+            elif metric == "te":
+                result[metric] = np.sqrt(
+                    rolling_var(portfolio_returns - benchmark_returns, window) * TRADING_DAYS_PER_YEAR
+                )
+            else:
+                raise ValueError(f"Unknown rolling metric: {metric}")
+
+    return result
+
+
+def downsample_index(length, points):
+    """
+    为图表展示选择均匀分布的索引（始终包含最后一个点）
+
+    参数:
+        length: 序列长度
+        points: 目标点数，None 或不小于长度时返回全部索引
+    """
+    if points is None or points >= length:
+        return np.arange(length)
+    if points <= 1:
+        return np.array([length - 1])
+    return np.unique(np.linspace(0, length - 1, points).round().astype(np.int64))
+
+
+# 标准业绩时间段
+TIMEFRAMES = ("ytd", "oneYear", "threeYear", "fiveYear")
+
+
+def timeframe_starts(end):
+    """各标准时间段的起始日期（含），end 为时间段结束日期"""
+    end = pd.Timestamp(end)
+    return {
+        "ytd": pd.Timestamp(end.year, 1, 1),
+        "oneYear": end - pd.DateOffset(years=1),
+        "threeYear": end - pd.DateOffset(years=3),
+        "fiveYear": end - pd.DateOffset(years=5),
+    }
+
+
+def _window_statistics(returns, start_index, end_index):
+    """
+    利用前缀和一次性计算多个区间 [start, end) 的总收益、日均收益和样本波动率
+
+    参数:
+        returns: 日收益率数组
+        start_index, end_index: 区间起止下标数组
+    """
+    log_prefix = np.concatenate(([0.0], np.cumsum(np.log1p(returns))))
+    centered = returns - returns.mean()
+    sum_prefix = np.concatenate(([0.0], np.cumsum(centered)))
+    square_prefix = np.concatenate(([0.0], np.cumsum(centered * centered)))
+
+    count = end_index - start_index
+    total_return = np.expm1(log_prefix[end_index] - log_prefix[start_index])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        window_sum = sum_prefix[end_index] - sum_prefix[start_index]
+        mean = window_sum / count + returns.mean()
+        variance = (square_prefix[end_index] - square_prefix[start_index] - window_sum ** 2 / count) / (count - 1)
+    volatility = np.sqrt(np.clip(variance, 0.0, None)) * np.sqrt(TRADING_DAYS_PER_YEAR)
+    return total_return, mean, volatility
+
+
+def timeframe_performance(dates, portfolio_returns, benchmark_returns=None, end=None, timeframes=TIMEFRAMES,
+                          risk_free_rate=RISK_FREE_RATE):
+    """
+    一次性计算多个时间段的业绩（小数单位）
+
+    收益率序列只处理一次：对数收益率前缀和给出区间复合收益，中心化的一阶/二阶前缀和给出波动率，
+    区间边界通过在日期索引上 searchsorted 得到，不需要为每个时间段构造布尔掩码。
+
+    参数:
+        dates: 已排序的日期索引（与收益率对齐）
+        portfolio_returns: 组合日收益率数组
+        benchmark_returns: 基准日收益率数组（可选）
+        end: 时间段结束日期，默认为最后一个数据日期
+        timeframes: 需要计算的时间段名称
+        risk_free_rate: 计算夏普比率使用的无风险利率
+
+    返回:
+        dict: 时间段名称 -> 指标字典；该时间段没有数据时为 None。
+        年化收益率和夏普比率只对超过一年的时间段计算，否则为 None。
+    """
+    dates = pd.DatetimeIndex(dates)
+    portfolio_returns = np.asarray(portfolio_returns, dtype=float)
+    if len(dates) == 0:
+        return {name: None for name in timeframes}
+
+    end = dates[-1] if end is None else pd.Timestamp(end)
+    starts = timeframe_starts(end)
+    start_index = dates.searchsorted(pd.DatetimeIndex([starts[name] for name in timeframes]), side="left")
+    end_index = np.full(len(timeframes), dates.searchsorted(end, side="right"))
+    has_data = end_index > start_index
+    # 没有数据的时间段使用 [0, 1) 占位，结果随后被丢弃
+    safe_start = np.where(has_data, start_index, 0)
+    safe_end = np.where(has_data, end_index, 1)
+
+    span_days = (dates[safe_end - 1] - dates[safe_start]).days.to_numpy()
+    annualize = span_days > 365
+    exponent = np.where(annualize, 365 / np.maximum(span_days, 1), 1.0)
+
+    def _series_statistics(returns):
+        total, mean, volatility = _window_statistics(returns, safe_start, safe_end)
+        annualized = np.where(annualize, (1 + total) ** exponent - 1, np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sharpe = np.where(annualize & (volatility > 0), (annualized - risk_free_rate) / volatility, np.nan)
+        return total, annualized, volatility, sharpe
+
+    portfolio_stats = _series_statistics(portfolio_returns)
+    benchmark_stats = None
+    if benchmark_returns is not None:
+        benchmark_stats = _series_statistics(np.asarray(benchmark_returns, dtype=float))
+
+    def _value(array, i):
+        value = float(array[i])
+        return value if np.isfinite(value) else None
+
+    result = {}
+    for i, name in enumerate(timeframes):
+        if not has_data[i]:
+            result[name] = None
+            continue
+        frame = {
+            "return": _value(portfolio_stats[0], i),
+            "annualized": _value(portfolio_stats[1], i),
+            "volatility": _value(portfolio_stats[2], i),
+            "sharpe": _value(portfolio_stats[3], i),
+            "observations": int(safe_end[i] - safe_start[i]),
+        }
+        if benchmark_stats is not None:
+            frame.update({
+                "benchmarkReturn": _value(benchmark_stats[0], i),
+                "benchmarkAnnualized": _value(benchmark_stats[1], i),
+                "benchmarkVolatility": _value(benchmark_stats[2], i),
+                "benchmarkSharpe": _value(benchmark_stats[3], i),
+                "excessReturn": _value(portfolio_stats[0] - benchmark_stats[0], i),
+            })
+        result[name] = frame
+    return result
+
+
+# 收益率聚合周期 -> pandas 周期频率
+PERIOD_FREQUENCIES = {"month": "M", "quarter": "Q", "year": "Y"}
+
+
+def period_boundaries(dates, period="month"):
+    """
+    计算已排序日期序列中每个周期（月/季/年）的起始下标
+
+    返回:
+        tuple: (各周期起始下标数组, 对应的 PeriodIndex)
+    """
+    if period not in PERIOD_FREQUENCIES:
+        raise ValueError(f"Unknown aggregation period: {period}")
+    periods = pd.DatetimeIndex(dates).to_period(PERIOD_FREQUENCIES[period])
+    codes = periods.asi8
+    if len(codes) == 0:
+        return np.array([], dtype=np.int64), periods
+    starts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+    return starts, periods[starts]
+
+
+def aggregate_returns(dates, returns, period="month"):
+    """
+    将日收益率复合为周期收益率，并同时给出周期末的累积收益率
+
+    对数收益率按预先计算的周期边界用 np.add.reduceat 一次求和，支持二维数组
+    （每列一个序列，例如组合与基准），所有列共用同一组边界。NaN 视为当日收益为 0。
+
+    参数:
+        dates: 已排序的日期索引（与收益率对齐）
+        returns: 日收益率数组，形状为 (n,) 或 (n, k)
+        period: 'month'、'quarter' 或 'year'
+
+    返回:
+        tuple: (PeriodIndex, 周期收益率数组, 周期末累积收益率数组)，小数单位
+    """
+    returns = np.asarray(returns, dtype=float)
+    starts, labels = period_boundaries(dates, period)
+    if len(starts) == 0:
+        empty = np.empty((0,) + returns.shape[1:])
+        return labels, empty, empty
+
+    log_returns = np.log1p(np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0))
+    period_log_returns = np.add.reduceat(log_returns, starts, axis=0)
+    return labels, np.expm1(period_log_returns), np.expm1(np.cumsum(period_log_returns, axis=0))
+
+
+def cumulative_returns(period_returns):
+    """由周期收益率序列计算累积收益率（小数单位），NaN/Inf 视为 0"""
+    period_returns = np.nan_to_num(np.asarray(period_returns, dtype=float), nan=0.0, posinf=0.0, neginf=0.0)
+    return np.cumprod(1 + period_returns, axis=0) - 1
+
+
+def drawdown_series(returns):
+    """由日收益率计算回撤序列（相对历史最高净值，小数单位，<= 0），NaN 视为 0"""
+    returns = np.nan_to_num(np.asarray(returns, dtype=float), nan=0.0, posinf=0.0, neginf=0.0)
+    wealth = np.cumprod(1 + returns)
+    # 初始净值 1 视为第一个高点
+    peak = np.maximum(np.maximum.accumulate(wealth), 1.0)
+    return wealth / peak - 1
+
+
+def drawdown_episodes(drawdown):
+    """
+    将回撤序列划分为回撤区间，复杂度 O(n)
+
+    区间为连续的水下（回撤 < 0）交易日。高点为区间开始前一个交易日（区间从第一天开始时为 -1，
+    即初始净值），恢复日为区间结束后第一个回到高点的交易日（尚未恢复时为 -1）。
+
+    返回:
+        dict: peak, trough, recovery 下标数组和 depth 回撤深度数组（按时间顺序）
+    """
+    underwater = drawdown < 0
+    edges = np.diff(np.concatenate(([False], underwater, [False])).astype(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)  # 区间结束后的第一个下标
+    if len(starts) == 0:
+        empty = np.array([], dtype=np.int64)
+        return {"peak": empty, "trough": empty, "recovery": empty, "depth": np.array([])}
+
+    depth = np.minimum.reduceat(drawdown, starts)
+    # 每个区间内第一次达到最低点的位置
+    episode_id = np.cumsum(edges[:-1] == 1) - 1
+    in_episode = np.flatnonzero(underwater)
+    at_trough = in_episode[drawdown[in_episode] == depth[episode_id[in_episode]]]
+    _, first = np.unique(episode_id[at_trough], return_index=True)
+    trough = at_trough[first]
+
+    recovery = np.where(ends < len(drawdown), ends, -1)
+    return {"peak": starts - 1, "trough": trough, "recovery": recovery, "depth": depth}
+
+
+def drawdown_analysis(dates, returns, top_n=5):
+    """
+    回撤分析：最大回撤、持续时间、恢复时间和最深的 top_n 个回撤区间（小数单位，时长为交易日数）
+
+    参数:
+        dates: 与收益率对齐的日期索引
+        returns: 日收益率数组
+        top_n: 返回的回撤区间数量
+
+    返回:
+        dict: maxDrawdown, currentDrawdown, maxDrawdownDuration（最长水下时间）, 最大回撤区间的
+        peakDate/troughDate/recoveryDate/timeToRecovery, 以及 episodes 列表和完整回撤序列 drawdown
+    """
+    dates = pd.DatetimeIndex(dates)
+    drawdown = drawdown_series(returns)
+    episodes = drawdown_episodes(drawdown)
+    n = len(drawdown)
+
+    def _date(index):
+        # 下标 -1 的高点对应第一个交易日之前的初始净值，以第一个日期表示
+        return dates[max(index, 0)].strftime("%Y-%m-%d") if n else None
+
+    # 各区间的水下时长：从高点到恢复（未恢复时到最后一个交易日）
+    end = np.where(episodes["recovery"] >= 0, episodes["recovery"], n - 1)
+    duration = end - episodes["peak"]
+    time_to_trough = episodes["trough"] - episodes["peak"]
+    time_to_recovery = np.where(episodes["recovery"] >= 0, episodes["recovery"] - episodes["trough"], -1)
+
+    order = np.argsort(episodes["depth"], kind="stable")[:top_n]
+    episode_list = [
+        {
+            "peakDate": _date(episodes["peak"][i]),
+            "troughDate": _date(episodes["trough"][i]),
+            "recoveryDate": _date(episodes["recovery"][i]) if episodes["recovery"][i] >= 0 else None,
+            "depth": float(episodes["depth"][i]),
+            "duration": int(duration[i]),
+            "timeToTrough": int(time_to_trough[i]),
+            "timeToRecovery": int(time_to_recovery[i]) if time_to_recovery[i] >= 0 else None,
+            "recovered": bool(episodes["recovery"][i] >= 0),
+        }
+        for i in order
+    ]
+
+    worst = episode_list[0] if episode_list else None
+    return {
+        "maxDrawdown": worst["depth"] if worst else 0.0,
+        "currentDrawdown": float(drawdown[-1]) if n else 0.0,
+        "maxDrawdownDuration": int(duration.max()) if len(duration) else 0,
+        "peakDate": worst["peakDate"] if worst else None,
+        "troughDate": worst["troughDate"] if worst else None,
+        "recoveryDate": worst["recoveryDate"] if worst else None,
+        "timeToRecovery": worst["timeToRecovery"] if worst else None,
+        "episodes": episode_list,
+        "drawdown": drawdown,
+    }
@@ -0,0 +1,213 @@
+"""
+阶段计时 - 轻量级 span 计时器、请求级计时汇总和进程内直方图
+
+用法:
+    with span("risk"):
+        ...
+
+    @timed("load_price_history")
+    def _load_price_history(...):
+        ...
+
+每个 span 结束时:
+    1. 耗时计入进程内直方图（按 span 名称，固定毫秒分桶）
+    2. 如果当前处于请求上下文（start_request 之后），耗时累加到该请求的计时汇总，
+       由 HTTP 中间件写入 Server-Timing 响应头，并在请求超过阈值时记录结构化日志
+
+通过环境变量 TIMING_ENABLED=false 关闭计时，此时 span() 返回共享的空上下文管理器，
+timed() 包装的函数只多一次全局变量判断。
+"""
+
+import os
+import time
+import threading
+from bisect import bisect_left
+from contextlib import nullcontext
+from contextvars import ContextVar
+from functools import wraps
+import inspect
+
+TIMING_ENABLED = os.environ.get("TIMING_ENABLED", "true").lower() == "true"
+
+# 请求总耗时超过该值（毫秒）时记录结构化日志
+SLOW_REQUEST_THRESHOLD_MS = float(os.environ.get("SLOW_REQUEST_THRESHOLD_MS", 1000))
+
+# 直方图分桶上界（毫秒），最后一个桶为 +Inf
+HISTOGRAM_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_NOOP_SPAN = nullcontext()
+
+# 当前请求的计时汇总：span 名称 -> [累计秒数, 次数]，未处于请求上下文时为 None
+_request_spans = ContextVar("request_spans", default=None)
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def set_timing_enabled(enabled):
+    """运行时开启或关闭计时"""
+    global TIMING_ENABLED
+    TIMING_ENABLED = bool(enabled)
+
+
+def observe(name, duration_ms, labels=()):
+    """
+    把一次耗时计入名为 name 的直方图
+
+    参数:
+        name: 直方图名称（span 名称）
+        duration_ms: 耗时（毫秒）
+        labels: 标签，(键, 值) 元组的元组，如 (("method", "GET"), ("route", "/api/health"))
+    """
+    index = bisect_left(HISTOGRAM_BUCKETS_MS, duration_ms)
+    key = (name, labels)
+    with _histograms_lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"counts": [0] * (len(HISTOGRAM_BUCKETS_MS) + 1),
+                                            "count": 0, "sum": 0.0}
+        histogram["counts"][index] += 1
+        histogram["count"] += 1
+        histogram["sum"] += duration_ms
+
+
+def get_histograms():
+    """
+    获取所有直方图的快照
+
+    返回:
+        list: 按名称和标签排序的 {name, labels, buckets: [(上界毫秒, 累计次数)], count, sumMs}，
+              最后一个上界为 float("inf")
+    """
+    bounds = list(HISTOGRAM_BUCKETS_MS) + [float("inf")]
+    with _histograms_lock:
+        snapshot = [(key, list(h["counts"]), h["count"], h["sum"]) for key, h in _histograms.items()]
+    result = []
+    for (name, labels), counts, count, total in sorted(snapshot, key=lambda item: item[0]):
+        cumulative, buckets = 0, []
+        for bound, value in zip(bounds, counts):
+            cumulative += value
+            buckets.append((bound, cumulative))
+        result.append({"name": name, "labels": dict(labels), "buckets": buckets, "count": count, "sumMs": total})
+    return result
+
+
+def reset_histograms():
+    """清空直方图"""
+    with _histograms_lock:
+        _histograms.clear()
+
+
+def _record(name, seconds):
+    spans = _request_spans.get()
+    if spans is not None:
+        entry = spans.get(name)
+        if entry is None:
+            spans[name] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+    observe(name, seconds * 1000)
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def span(name):
+    """计时上下文管理器；计时关闭时返回空上下文"""
+    if not TIMING_ENABLED:
+        return _NOOP_SPAN
+    return _Span(name)
+
+
+def timed(name):
+    """计时装饰器，支持同步函数和协程函数"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not TIMING_ENABLED:
+                    return await func(*args, **kwargs)
+                with _Span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TIMING_ENABLED:
+                return func(*args, **kwargs)
+            with _Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start_request():
+    """
+    开始收集当前请求的计时（在请求的上下文中调用）
+
+    返回:
+        token: 传给 finish_request 以恢复上一个上下文
+    """
+    return _request_spans.set({})
+
+
+def finish_request(token):
+    """
+    结束当前请求的计时收集
+
+    返回:
+        dict: span 名称 -> {durMs, count}，按首次出现顺序排列
+    """
+    spans = _request_spans.get() or {}
+    _request_spans.reset(token)
+    return {name: {"durMs": round(seconds * 1000, 3), "count": count}
+            for name, (seconds, count) in spans.items()}
+
+
+def get_request_span(name):
+    """当前请求中名为 name 的 span 的累计秒数，不存在时返回 None"""
+    spans = _request_spans.get()
+    if not spans or name not in spans:
+        return None
+    return spans[name][0]
+
+
+def record_span(name, seconds):
+    """直接记录一段已测量的耗时（秒）"""
+    if TIMING_ENABLED:
+        _record(name, seconds)
+
+
+def server_timing_header(spans, total_ms=None):
+    """
+    生成 Server-Timing 响应头的值
+
+    参数:
+        spans: finish_request 的返回值
+        total_ms: 请求总耗时（毫秒），可选
+
+    返回:
+        str: 如 'prices;dur=120.5, risk;dur=3.2;desc="2 calls", total;dur=130.1'
+    """
+    parts = []
+    for name, item in spans.items():
+        part = f"{name};dur={item['durMs']:.1f}"
+        if item["count"] > 1:
+            part += f';desc="{item["count"]} calls"'
+        parts.append(part)
+    if total_ms is not None:
+        parts.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(parts)
@@ -0,0 +1,206 @@
+"""
+增量分析引擎 - 权重变化时在缓存的基础状态上做低秩更新，无需重新加载价格
+
+基础状态保存未标准化的权重 u（初始为组合权重）以及与 u 线性/二次相关的量:
+    r_u = R u                 组合日收益（T）
+    x_u = Xᵀ u                因子暴露度（K）
+    q   = x_uᵀ F x_u          因子方差
+    p   = x_uᵀ F x_b          与基准因子暴露度的交叉项
+    s   = Σ dᵢ uᵢ²            特异方差
+    c   = Σ dᵢ uᵢ bᵢ          与基准权重的特异交叉项
+
+权重变化 Δ 只涉及少数资产（下标集合 J），更新只需要 R[:, J]、X[J] 和 F Δx:
+    r_u' = r_u + R[:, J] Δ_J
+    Δx   = X[J]ᵀ Δ_J
+    q'   = q + 2 Δxᵀ F x_u + Δxᵀ F Δx
+    p'   = p + Δxᵀ F x_b
+    s'   = s + Σ_J dᵢ (2 uᵢ Δᵢ + Δᵢ²)
+    c'   = c + Σ_J dᵢ Δᵢ bᵢ
+
+输出时除以权重和 m = Σ u' 完成标准化:
+    因子方差 q'/m²，特异方差 s'/m²，
+    主动因子方差 q'/m² - 2p'/m + x_bᵀ F x_b，主动特异方差 bᵀDb + s'/m² - 2c'/m
+"""
+
+import logging
+
+import numpy as np
+
+from .risk_model import get_risk_model, get_portfolio_arrays
+from .timeseries import TRADING_DAYS_PER_YEAR, timeframe_performance, drawdown_series
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+TOP_FACTORS = 10
+
+
+def build_base_state(dates, asset_returns, symbols, weights, benchmark_returns=None, model=None):
+    """
+    构建增量分析的基础状态
+
+    参数:
+        dates: 日收益对应的日期 (T)
+        asset_returns: 资产日收益矩阵 (T×N)，列与 symbols 对应，缺失值按 0 处理
+        symbols: 资产代码列表 (N)，不含重复
+        weights: 组合权重 (N)，自动标准化
+        benchmark_returns: 基准日收益 (T)，可选
+        model: 风险模型，默认使用 get_risk_model()
+
+    返回:
+        dict: 基础状态（数组均为只读）
+    """
+    model = model or get_risk_model()
+    arrays = get_portfolio_arrays(symbols, weights, model)
+    if arrays["symbols"] != list(symbols):
+        raise ValueError("Symbols must be unique")
+
+    returns = np.nan_to_num(np.asarray(asset_returns, dtype=float), nan=0.0, posinf=0.0, neginf=0.0)
+    u = arrays["weights"]
+    covariance = model["covariance"]
+    benchmark_exposure = model["benchmark_exposure"]
+    exposure = arrays["exposures"].T @ u
+    cov_exposure = covariance @ exposure
+    cov_benchmark = covariance @ benchmark_exposure
+
+    state = {
+        "version": model["version"],
+        "dates": dates,
+        "symbols": list(symbols),
+        "index": {symbol: i for i, symbol in enumerate(symbols)},
+        "factors": model["factors"].tolist(),
+        "returns": returns,
+        "benchmark_returns": benchmark_returns,
+        "exposures": arrays["exposures"],
+        "specific_var": arrays["specific_var"],
+        "benchmark_weights": arrays["benchmark_weights"],
+        "covariance": covariance,
+        "cov_benchmark": cov_benchmark,
+        "benchmark_factor_var": float(benchmark_exposure @ cov_benchmark),
+        "benchmark_specific_var": model["benchmark_specific_var"],
+        # 随权重变化的量（未标准化）
+        "weights": u,
+        "portfolio_returns": returns @ u,
+        "exposure": exposure,
+        "cov_exposure": cov_exposure,
+        "factor_var": float(exposure @ cov_exposure),
+        "benchmark_cross": float(exposure @ cov_benchmark),
+        "specific_total": float(arrays["specific_var"] @ u ** 2),
+        "specific_cross": float(arrays["specific_var"] @ (u * arrays["benchmark_weights"])),
+    }
+    for key in ("returns", "exposures", "specific_var", "benchmark_weights", "weights",
+                "portfolio_returns", "exposure", "cov_exposure", "cov_benchmark"):
+        state[key].setflags(write=False)
+    return state
+
+
+def apply_weight_delta(state, delta):
+    """
+    在基础状态上应用权重变化，返回更新后的（未标准化）量，基础状态不变
+
+    参数:
+        state: build_base_state 返回的基础状态
+        delta: 股票代码 -> 权重变化（与组合权重同单位，即标准化后的权重）
+
+    异常:
+        ValueError: 股票不在组合中或权重变为负数
+    """
+    unknown = [symbol for symbol in delta if symbol not in state["index"]]
+    if unknown:
+        raise ValueError(f"Tickers not in portfolio: {', '.join(unknown)}")
+
+    columns = np.array([state["index"][symbol] for symbol in delta], dtype=np.int64)
+    change = np.array(list(delta.values()), dtype=float)
+    u = state["weights"]
+    if np.any(u[columns] + change < -1e-12):
+        raise ValueError("Weights cannot become negative")
+
+    weights = u.copy()
+    weights[columns] = np.maximum(u[columns] + change, 0.0)
+    if weights.sum() <= 0:
+        raise ValueError("At least one weight must remain positive")
+    change = weights[columns] - u[columns]
+
+    d = state["specific_var"][columns]
+    exposure_change = state["exposures"][columns].T @ change
+    cov_change = state["covariance"] @ exposure_change
+    return {
+        "weights": weights,
+        "portfolio_returns": state["portfolio_returns"] + state["returns"][:, columns] @ change,
+        "exposure": state["exposure"] + exposure_change,
+        "cov_exposure": state["cov_exposure"] + cov_change,
+        "factor_var": state["factor_var"] + 2 * float(exposure_change @ state["cov_exposure"])
+                      + float(exposure_change @ cov_change),
+        "benchmark_cross": state["benchmark_cross"] + float(exposure_change @ state["cov_benchmark"]),
+        "specific_total": state["specific_total"] + float(d @ (2 * u[columns] * change + change ** 2)),
+        "specific_cross": state["specific_cross"]
+                          + float(d @ (change * state["benchmark_weights"][columns])),
+    }
+
+
+def summarize_state(state, updated=None, risk_free_rate=0.0):
+    """
+    由（更新后的）状态计算组合业绩与风险摘要（百分比单位，前端格式）
+
+    参数:
+        state: 基础状态
+        updated: apply_weight_delta 的结果，None 表示基础组合
+        risk_free_rate: 计算夏普比率时的无风险利率（与完整分析一致，默认 0）
+    """
+    current = updated or state
+    total = float(current["weights"].sum())
+    scale = 1.0 / total if total > 0 else 0.0
+
+    returns = current["portfolio_returns"] * scale
+    annual_return = float(returns.mean()) * TRADING_DAYS_PER_YEAR if len(returns) else 0.0
+    volatility = float(returns.std(ddof=1)) * np.sqrt(TRADING_DAYS_PER_YEAR) if len(returns) > 1 else 0.0
+    total_return = float(np.prod(1 + returns) - 1) if len(returns) else 0.0
+    max_drawdown = float(drawdown_series(returns).min()) if len(returns) else 0.0
+    timeframes = timeframe_performance(state["dates"], returns, state["benchmark_returns"])
+
+    factor_var = max(current["factor_var"] * scale ** 2, 0.0)
+    specific_var = max(current["specific_total"] * scale ** 2, 0.0)
+    active_factor_var = max(
+        factor_var - 2 * current["benchmark_cross"] * scale + state["benchmark_factor_var"], 0.0
+    )
+    active_specific_var = max(
+        state["benchmark_specific_var"] + specific_var - 2 * current["specific_cross"] * scale, 0.0
+    )
+    total_risk = np.sqrt(factor_var + specific_var)
+
+    # 因子成分贡献 x_k (F x)_k / σ，之和等于因子风险部分
+    exposure = current["exposure"] * scale
+    contribution = exposure * current["cov_exposure"] * scale / total_risk if total_risk > 0 else np.zeros_like(exposure)
+    top = np.argsort(-np.abs(contribution))[:TOP_FACTORS]
+
+    return {
+        "weights": [
+            {"symbol": symbol, "weight": round(float(weight) * scale * 100, 2)}
+            for symbol, weight in zip(state["symbols"], current["weights"])
+        ],
+        "performance": {
+            "totalReturn": round(total_return * 100, 2) + 0.0,
+            "annualizedReturn": round(annual_return * 100, 2) + 0.0,
+            "volatility": round(volatility * 100, 2),
+            "sharpeRatio": round((annual_return - risk_free_rate) / volatility, 2) + 0.0 if volatility > 0 else None,
+            "maxDrawdown": round(max_drawdown * 100, 2) + 0.0,
+            "timeFrames": timeframes,
+        },
+        "risk": {
+            "totalRisk": round(total_risk * 100, 2),
+            "factorRisk": round(np.sqrt(factor_var) * 100, 2),
+            "specificRisk": round(np.sqrt(specific_var) * 100, 2),
+            "trackingError": round(np.sqrt(active_factor_var + active_specific_var) * 100, 2),
+            "activeFactorRisk": round(np.sqrt(active_factor_var) * 100, 2),
+            "activeSpecificRisk": round(np.sqrt(active_specific_var) * 100, 2),
+            "factorContributions": [
+                {
+                    "name": state["factors"][k],
+                    "exposure": round(float(exposure[k]), 4) + 0.0,
+                    "contribution": round(float(contribution[k]) * 100, 4) + 0.0,
+                }
+                for k in top
+                if exposure[k] != 0
+            ],
+        },
+    }
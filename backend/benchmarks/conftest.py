@@ -0,0 +1,115 @@
+"""
+基准测试配置
+
+运行（在 backend 目录下）:
+    python -m pytest benchmarks -q
+    python -m pytest benchmarks -q --bench-scales 10x1,500x5,5000x20 --bench-iterations 20
+    python -m pytest benchmarks -q --bench-update-baseline
+
+选项也可以通过环境变量 BENCH_SCALES、BENCH_ITERATIONS、BENCH_TOLERANCE 设置。基线按机器类别保存，
+BENCH_MACHINE（或 --bench-machine）可为同一规格的机器指定固定名称；没有当前机器的基线时只记录结果，不做比较。
+"""
+
+import os
+import sys
+import platform
+import warnings
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from benchmarks.harness import (  # noqa: E402
+    BASELINE_PATH, RESULTS_PATH, load_baseline, save_results, save_baseline, machine_key
+)
+from benchmarks.synthetic import generate_dataset  # noqa: E402
+
+DEFAULT_SCALES = "10x1,100x5"
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("benchmarks")
+    group.addoption("--bench-scales", default=os.environ.get("BENCH_SCALES", DEFAULT_SCALES),
+                    help="Comma-separated dataset scales as <tickers>x<years>, e.g. 10x1,5000x20")
+    group.addoption("--bench-iterations", type=int, default=int(os.environ.get("BENCH_ITERATIONS", 5)),
+                    help="Timed iterations per benchmark")
+    group.addoption("--bench-tolerance", type=float, default=float(os.environ.get("BENCH_TOLERANCE", 0.5)),
+                    help="Allowed p50 slowdown against the baseline before failing (0.5 = 50%%)")
+    group.addoption("--bench-baseline", default=str(BASELINE_PATH), help="Baseline JSON file")
+    group.addoption("--bench-machine", default=None,
+                    help="Machine class whose baseline is used (default: BENCH_MACHINE or the detected host class)")
+    group.addoption("--bench-update-baseline", action="store_true",
+                    help="Write this run's results to the baseline file instead of comparing")
+
+
+def pytest_configure(config):
+    # 分析代码中已知的 pandas 弃用警告与基准测试无关
+    config.addinivalue_line("filterwarnings", "ignore::FutureWarning")
+    config.addinivalue_line("filterwarnings", "ignore::pandas.errors.PerformanceWarning")
+
+
+def _parse_scales(value):
+    scales = []
+    for item in value.split(","):
+        tickers, _, years = item.strip().lower().partition("x")
+        scales.append((int(tickers), int(years or 1)))
+    return scales
+
+
+def pytest_generate_tests(metafunc):
+    if "bench_scale" in metafunc.fixturenames:
+        scales = _parse_scales(metafunc.config.getoption("--bench-scales"))
+        metafunc.parametrize("bench_scale", scales, ids=[f"{t}x{y}" for t, y in scales], scope="module")
+
+
+@pytest.fixture(scope="session")
+def bench_results(request):
+    """本次运行的全部结果，会话结束时写入 results/latest.json（以及可选的基线文件）"""
+    results = {}
+    yield results
+    if not results:
+        return
+    config = request.config
+    machine = _machine(config)
+    metadata = {"machineClass": machine, "python": platform.python_version(), "machine": platform.machine(),
+                "iterations": config.getoption("--bench-iterations")}
+    save_results(results, RESULTS_PATH, metadata)
+    if config.getoption("--bench-update-baseline"):
+        save_baseline(results, config.getoption("--bench-baseline"), metadata, machine)
+
+
+def _machine(config):
+    return config.getoption("--bench-machine") or machine_key()
+
+
+@pytest.fixture(scope="session")
+def bench_baseline(request):
+    config = request.config
+    if config.getoption("--bench-update-baseline"):
+        return {}
+    machine = _machine(config)
+    baseline = load_baseline(config.getoption("--bench-baseline"), machine)
+    if not baseline:
+        warnings.warn(f"No benchmark baseline for machine class '{machine}'; results are recorded "
+                      f"but not compared (run with --bench-update-baseline to create one)")
+    return baseline
+
+
+@pytest.fixture(scope="session")
+def bench_options(request):
+    config = request.config
+    return {
+        "iterations": config.getoption("--bench-iterations"),
+        "tolerance": config.getoption("--bench-tolerance"),
+    }
+
+
+@pytest.fixture(scope="module")
+def bench_dataset(bench_scale, tmp_path_factory):
+    """按规模生成的合成数据集（每个规模生成一次）"""
+    tickers, years = bench_scale
+    directory = tmp_path_factory.mktemp(f"dataset_{tickers}x{years}")
+    return generate_dataset(directory, tickers=tickers, years=years)
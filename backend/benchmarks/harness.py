@@ -0,0 +1,234 @@
+"""
+基准测试工具 - 计时、内存统计、数据集切换和基线比较
+
+measure() 对一个函数重复计时，返回 p50/p95/平均延迟（毫秒）、进程峰值 RSS（MB）以及
+单次调用在 tracemalloc 下的峰值分配量（MB）和分配块数。tracemalloc 会显著拖慢执行，
+因此分配统计在计时之外单独运行一次。
+
+use_dataset() 在上下文中把 app 各模块的数据文件路径指向合成数据集，并清空模块级缓存，
+退出时恢复原路径并再次清空缓存。
+
+绝对延迟只在同一类机器上可比，因此基线文件按机器类别（machine_key()：操作系统、架构、CPU 型号、
+核数和 Python 版本，或 BENCH_MACHINE 环境变量指定的名称）分别保存，没有匹配基线时不做比较。
+"""
+
+import gc
+import os
+import re
+import json
+import time
+import platform
+import resource
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from app.utils import market_data, risk_model, corporate_actions, benchmarks as benchmark_registry
+from app.services import stocks_service, portfolio_service, analysis_service
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+RESULTS_PATH = Path(__file__).resolve().parent / "results" / "latest.json"
+
+# 各模块中指向数据文件的属性：(模块, 属性名, 文件名, 是否为 Path 对象)
+_DATA_PATHS = [
+    (market_data, "FACTOR_EXPOSURES_PATH", "Factor_Exposures.csv", False),
+    (market_data, "FACTOR_COVARIANCE_PATH", "Factor_Covariance_Matrix.csv", False),
+    (market_data, "STATIC_DATA_PATH", "Static_Data.csv", False),
+    (market_data, "COMPANIES_JSON_PATH", "companies.json", False),
+    (market_data, "BENCHMARK_WEIGHTS_PATH", "Benchmark_Weights.csv", False),
+    (risk_model, "FACTOR_EXPOSURES_PATH", "Factor_Exposures.csv", False),
+    (risk_model, "FACTOR_COVARIANCE_PATH", "Factor_Covariance_Matrix.csv", False),
+    (risk_model, "BENCHMARK_WEIGHTS_PATH", "Benchmark_Weights.csv", False),
+    (risk_model, "SPECIFIC_RISK_PATH", "Specific_Risk.csv", False),
+    (benchmark_registry, "BENCHMARK_PRICE_PATH", "Constituent_Price_History.csv", False),
+    (benchmark_registry, "CORPORATE_ACTIONS_PATH", "Corporate_Actions.csv", False),
+    (corporate_actions, "CORPORATE_ACTIONS_PATH", "Corporate_Actions.csv", False),
+    (analysis_service, "CORPORATE_ACTIONS_PATH", "Corporate_Actions.csv", False),
+    (stocks_service, "PRICE_HISTORY_FILE", "Constituent_Price_History.csv", True),
+    (stocks_service, "COMPANIES_FILE", "companies.json", True),
+    (analysis_service, "PRICE_HISTORY_FILE", "Constituent_Price_History.csv", True),
+    (portfolio_service, "PORTFOLIOS_FILE", "portfolios.json", True),
+]
+
+# 模块级缓存及其初始值
+_CACHES = [
+    (market_data, "_static_data", None),
+    (market_data, "_price_history", None),
+    (market_data, "_price_data", None),
+    (market_data, "_factor_exposures", None),
+    (market_data, "_factor_exposures_version", None),
+    (market_data, "_factor_covariance", None),
+    (market_data, "_factor_covariance_version", None),
+    (market_data, "_benchmark_exposure_cache", None),
+    (risk_model, "_risk_model", None),
+    (benchmark_registry, "_benchmark_cache", dict),
+    (benchmark_registry, "_benchmark_cache_version", None),
+    (corporate_actions, "_events", None),
+    (corporate_actions, "_events_version", None),
+    (corporate_actions, "_factor_cache", dict),
+    (stocks_service, "_stocks_cache", dict),
+    (stocks_service, "_price_history_cache", dict),
+    (portfolio_service, "_portfolios_cache", dict),
+    (analysis_service, "_what_if_cache", dict),
+    (analysis_service, "_frontier_cache", dict),
+]
+
+
+def reset_caches():
+    """清空 app 各模块的数据缓存"""
+    for module, name, initial in _CACHES:
+        setattr(module, name, initial() if callable(initial) else initial)
+
+
+@contextmanager
+def use_dataset(directory):
+    """在上下文中使用 directory 下的数据文件"""
+    directory = Path(directory)
+    originals = [(module, name, getattr(module, name)) for module, name, _, _ in _DATA_PATHS]
+    for module, name, filename, as_path in _DATA_PATHS:
+        path = directory / filename
+        setattr(module, name, path if as_path else str(path))
+    reset_caches()
+    try:
+        yield directory
+    finally:
+        for module, name, value in originals:
+            setattr(module, name, value)
+        reset_caches()
+
+
+def measure(fn, iterations=10, warmup=1, setup=None):
+    """
+    测量函数的延迟和内存
+
+    参数:
+        fn: 被测函数（无参数）
+        iterations: 计时次数
+        warmup: 预热次数（不计时）
+        setup: 每次调用前执行的函数（不计时），如清空缓存以测量冷启动
+
+    返回:
+        dict: p50Ms, p95Ms, meanMs, minMs, iterations, peakRssMb, peakAllocMb, allocBlocks
+    """
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+
+    timings = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    # 分配统计单独运行一次
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+
+    timings = np.array(timings)
+    return {
+        "p50Ms": round(float(np.percentile(timings, 50)), 3),
+        "p95Ms": round(float(np.percentile(timings, 95)), 3),
+        "meanMs": round(float(timings.mean()), 3),
+        "minMs": round(float(timings.min()), 3),
+        "iterations": iterations,
+        # Linux 上 ru_maxrss 的单位为 KB
+        "peakRssMb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peakAllocMb": round(peak / 1024 / 1024, 3),
+        "allocBlocks": int(blocks),
+    }
+
+
+def _cpu_model():
+    """CPU 型号（Linux 读取 /proc/cpuinfo，其他系统使用 platform.processor()）"""
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or "unknown-cpu"
+
+
+def machine_key():
+    """
+    当前机器的类别名称，作为基线文件中的键
+
+    BENCH_MACHINE 环境变量优先（例如在 CI 中为同一规格的运行器指定固定名称），否则由操作系统、
+    架构、CPU 型号、核数和 Python 主次版本组成。
+    """
+    name = os.environ.get("BENCH_MACHINE")
+    if name:
+        return name
+    parts = [platform.system(), platform.machine(), _cpu_model(), f"{os.cpu_count() or 1}cpu",
+             "py" + ".".join(platform.python_version_tuple()[:2])]
+    return "-".join(re.sub(r"[^A-Za-z0-9.]+", "_", part).strip("_") for part in parts)
+
+
+def _read(path):
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def load_baseline(path=BASELINE_PATH, machine=None):
+    """读取指定机器类别（默认为当前机器）的基线结果，文件或该机器的基线不存在时返回空字典"""
+    machines = _read(path).get("machines", {})
+    return machines.get(machine or machine_key(), {}).get("results", {})
+
+
+def save_results(results, path, metadata=None):
+    """保存一次运行的结果（按键排序，便于比较差异）"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"metadata": metadata or {}, "results": dict(sorted(results.items()))}, f, indent=2)
+        f.write("\n")
+
+
+def save_baseline(results, path=BASELINE_PATH, metadata=None, machine=None):
+    """将结果合并到指定机器类别的基线中，其他机器的基线保持不变"""
+    path = Path(path)
+    data = _read(path)
+    machines = data.get("machines", {})
+    machine = machine or machine_key()
+    merged = {**machines.get(machine, {}).get("results", {}), **results}
+    machines[machine] = {"metadata": metadata or {}, "results": dict(sorted(merged.items()))}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"machines": dict(sorted(machines.items()))}, f, indent=2)
+        f.write("\n")
+
+
+def compare_with_baseline(result, baseline, tolerance=0.5, floor_ms=1.0):
+    """
+    与基线比较，返回回归说明；没有基线或未回归时返回 None
+
+    p50 超过基线 (1 + tolerance) 倍且绝对差超过 floor_ms 毫秒时视为回归（绝对阈值避免
+    亚毫秒级测量的噪声被误判）。
+    """
+    if not baseline:
+        return None
+    limit = baseline["p50Ms"] * (1 + tolerance)
+    if result["p50Ms"] > limit and result["p50Ms"] - baseline["p50Ms"] > floor_ms:
+        return (f"p50 {result['p50Ms']:.2f} ms exceeds baseline {baseline['p50Ms']:.2f} ms "
+                f"by more than {tolerance:.0%}")
+    return None
@@ -0,0 +1,162 @@
+"""
+合成数据集 - 按指定规模（股票数 × 年数）生成与 app/data 相同格式的数据文件
+
+生成的文件:
+    Constituent_Price_History.csv  日频价格长表（date, code, PRC, value），含 SPX 指数；PRC 为未调整价格
+    Corporate_Actions.csv          稀疏的拆股和分红事件（date, code, type, value）
+    Factor_Exposures.csv           因子暴露度（Ticker + 因子列）
+    Factor_Covariance_Matrix.csv   因子协方差矩阵（百分比的平方）
+    Specific_Risk.csv              特异风险（Ticker, SpecificRisk，年化百分比）
+    Benchmark_Weights.csv          基准权重（Ticker, Weight）
+    Static_Data.csv                静态数据（ticker, assetClass, name, sector）
+    companies.json                 公司信息（行业、地区、市值）
+    portfolios.json                一个包含全部合成股票的组合（ID 为 BENCH_PORTFOLIO_ID）
+
+价格由单因子模型生成（市场收益 × beta + 特异收益），因此组合与 SPX 的相关性接近真实数据。
+因子名称沿用仓库中的因子协方差矩阵，保证因子分类映射可用。
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+REPO_DATA_DIR = Path(__file__).resolve().parent.parent / "app" / "data"
+BENCH_PORTFOLIO_ID = "port-bench"
+TRADING_DAYS_PER_YEAR = 252
+SECTORS = [
+    "Information Technology", "Health Care", "Financials", "Consumer Discretionary", "Communication",
+    "Industrials", "Consumer Staples", "Energy", "Utilities", "Real Estate", "Materials",
+]
+REGIONS = ["United States", "Europe", "Asia"]
+MARKET_CAPS = ["Large Cap", "Mid Cap", "Small Cap"]
+
+
+def _factor_names():
+    """使用仓库中的因子名称；找不到协方差文件时使用通用名称"""
+    path = REPO_DATA_DIR / "Factor_Covariance_Matrix.csv"
+    if path.exists():
+        return [name for name in pd.read_csv(path, nrows=0).columns if name != "Factor"]
+    return [f"Factor {i + 1}" for i in range(40)]
+
+
+def generate_dataset(directory, tickers=100, years=5, seed=0):
+    """
+    在 directory 中生成合成数据集
+
+    参数:
+        directory: 输出目录
+        tickers: 股票数量
+        years: 价格历史年数
+        seed: 随机种子
+
+    返回:
+        dict: symbols, factors, dates 和 directory
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    symbols = [f"S{i:04d}" for i in range(tickers)]
+    factors = _factor_names()
+    n_factors = len(factors)
+    sectors = [SECTORS[i % len(SECTORS)] for i in range(tickers)]
+
+    # 因子协方差（百分比的平方）：随机低秩结构 + 对角项，保证正定
+    loadings = rng.normal(0, 1, (n_factors, 5))
+    covariance = loadings @ loadings.T * 4.0 + np.diag(rng.uniform(1.0, 25.0, n_factors))
+    pd.DataFrame(covariance, index=pd.Index(factors, name="Factor"), columns=factors).to_csv(
+        directory / "Factor_Covariance_Matrix.csv"
+    )
+
+    exposures = rng.normal(0, 0.5, (tickers, n_factors)).round(4)
+    pd.DataFrame(exposures, index=pd.Index(symbols, name="Ticker"), columns=factors).to_csv(
+        directory / "Factor_Exposures.csv"
+    )
+
+    specific_risk = rng.uniform(15.0, 45.0, tickers).round(2)
+    pd.DataFrame({"Ticker": symbols, "SpecificRisk": specific_risk}).to_csv(
+        directory / "Specific_Risk.csv", index=False
+    )
+
+    market_caps = rng.lognormal(0, 1, tickers)
+    pd.DataFrame({"Ticker": symbols, "Weight": market_caps / market_caps.sum()}).to_csv(
+        directory / "Benchmark_Weights.csv", index=False
+    )
+
+    pd.DataFrame({
+        "ticker": symbols,
+        "assetClass": "Equity",
+        "name": [f"SYNTHETIC {symbol}" for symbol in symbols],
+        "sector": sectors,
+    }).to_csv(directory / "Static_Data.csv", index=False)
+
+    companies = {
+        symbol: {
+            "name": f"SYNTHETIC {symbol}",
+            "sector": sector,
+            "industry": sector,
+            "region": REGIONS[i % len(REGIONS)],
+            "marketCap": MARKET_CAPS[i % len(MARKET_CAPS)],
+        }
+        for i, (symbol, sector) in enumerate(zip(symbols, sectors))
+    }
+    with open(directory / "companies.json", "w") as f:
+        json.dump({"companies": companies}, f)
+
+    # 单因子价格模型：r = β m + ε
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=years * TRADING_DAYS_PER_YEAR)
+    market = rng.normal(0.0004, 0.011, len(dates))
+    betas = rng.uniform(0.6, 1.4, tickers)
+    idiosyncratic = rng.normal(0, 1, (len(dates), tickers)) * (specific_risk / 100 / np.sqrt(TRADING_DAYS_PER_YEAR))
+    prices = 100 * np.exp(np.cumsum(np.outer(market, betas) + idiosyncratic, axis=0))
+    index_level = 3000 * np.exp(np.cumsum(market))
+
+    # 稀疏公司行动：每 10 只股票一次拆股，半数股票季度分红（股息率 0.5%）。
+    # PRC 为未调整价格，按事件调整后恰好还原上面的总收益价格
+    split_ratio = np.ones_like(prices)
+    dividend_yield = np.zeros_like(prices)
+    split_columns = np.arange(0, tickers, 10)
+    split_ratio[rng.integers(1, len(dates), len(split_columns)), split_columns] = rng.choice([2.0, 4.0], len(split_columns))
+    for column in range(1, tickers, 2):
+        dividend_yield[np.arange(rng.integers(1, 63), len(dates), 63), column] = 0.005
+    prices = prices * np.cumprod((1 - dividend_yield) / split_ratio, axis=0)
+
+    split_rows, split_cols = np.nonzero(split_ratio != 1)
+    dividend_rows, dividend_cols = np.nonzero(dividend_yield)
+    dividends = (dividend_yield[dividend_rows, dividend_cols] * prices[dividend_rows - 1, dividend_cols]
+                 / split_ratio[dividend_rows, dividend_cols])
+    pd.DataFrame({
+        "date": dates[np.concatenate([split_rows, dividend_rows])].strftime("%Y-%m-%d"),
+        "code": np.array(symbols)[np.concatenate([split_cols, dividend_cols])],
+        "type": ["split"] * len(split_rows) + ["dividend"] * len(dividend_rows),
+        "value": np.concatenate([split_ratio[split_rows, split_cols], dividends]).round(6),
+    }).to_csv(directory / "Corporate_Actions.csv", index=False)
+
+    date_strings = dates.strftime("%Y-%m-%d")
+    stock_rows = pd.DataFrame({
+        "date": np.tile(date_strings, tickers),
+        "code": np.repeat(symbols, len(dates)),
+        "PRC": prices.T.ravel().round(4),
+        "value": np.nan,
+    })
+    index_rows = pd.DataFrame({"date": date_strings, "code": "SPX", "PRC": np.nan, "value": index_level.round(4)})
+    pd.concat([stock_rows, index_rows], ignore_index=True).to_csv(
+        directory / "Constituent_Price_History.csv", index=False
+    )
+
+    portfolio = {
+        "id": BENCH_PORTFOLIO_ID,
+        "name": f"Synthetic {tickers} x {years}y",
+        "created_at": "2024-01-01T00:00:00",
+        "user_id": "default_user",
+        "tickers": [
+            {"symbol": symbol, "weight": round(weight, 8), "name": f"SYNTHETIC {symbol}", "sector": sector}
+            for symbol, weight, sector in zip(symbols, np.full(tickers, 1.0 / tickers), sectors)
+        ],
+    }
+    with open(directory / "portfolios.json", "w") as f:
+        json.dump({BENCH_PORTFOLIO_ID: portfolio}, f)
+
+    return {"directory": directory, "symbols": symbols, "factors": factors, "dates": dates}
@@ -0,0 +1,107 @@
+"""
+分析流程基准测试 - 在合成数据集上测量各环节和 HTTP 接口的延迟与内存
+
+每个结果以 "<名称>[<股票数>x<年数>]" 为键记录，并与 baseline.json 中的同名结果比较。
+"""
+
+import asyncio
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import stocks_service
+from app.services.analysis_service import analyze_portfolio
+from app.services.portfolio_service import get_portfolio_service
+from app.utils.market_data import get_portfolio_factor_exposure, get_real_asset_allocation
+from benchmarks.harness import measure, use_dataset, compare_with_baseline
+from benchmarks.synthetic import BENCH_PORTFOLIO_ID
+
+HTTP_ROUTES = [
+    f"/api/analysis/analysis/{BENCH_PORTFOLIO_ID}",
+    f"/api/analysis/analysis/{BENCH_PORTFOLIO_ID}/risk-model",
+    f"/api/analysis/analysis/{BENCH_PORTFOLIO_ID}/rolling",
+    f"/api/analysis/analysis/{BENCH_PORTFOLIO_ID}/drawdowns",
+    f"/api/portfolios/{BENCH_PORTFOLIO_ID}/analyze",
+]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def quiet_logging():
+    # 分析代码按股票逐条记录日志，基准测试中只保留警告以上
+    logging.disable(logging.INFO)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+@pytest.fixture(scope="module")
+def dataset(bench_dataset):
+    with use_dataset(bench_dataset["directory"]):
+        yield bench_dataset
+
+
+@pytest.fixture(scope="module")
+def event_loop_runner():
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
+
+
+@pytest.fixture(scope="module")
+def portfolio(dataset, event_loop_runner):
+    return event_loop_runner(get_portfolio_service(BENCH_PORTFOLIO_ID))
+
+
+@pytest.fixture
+def record(request, bench_scale, bench_results, bench_baseline, bench_options):
+    """记录结果并与基线比较，回归时测试失败"""
+    def _record(name, result):
+        key = f"{name}[{bench_scale[0]}x{bench_scale[1]}]"
+        bench_results[key] = result
+        regression = compare_with_baseline(result, bench_baseline.get(key), bench_options["tolerance"])
+        if regression:
+            pytest.fail(f"{key}: {regression}")
+        return result
+    return _record
+
+
+def _clear_price_history():
+    stocks_service._price_history_cache = {}
+
+
+def test_load_price_history(dataset, record, bench_options):
+    """冷启动读取价格历史 CSV"""
+    result = measure(stocks_service._load_price_history, bench_options["iterations"],
+                     warmup=0, setup=_clear_price_history)
+    record("load_price_history", result)
+
+
+def test_analyze_portfolio(dataset, portfolio, event_loop_runner, record, bench_options):
+    """完整组合分析（价格缓存已加载）"""
+    result = measure(lambda: event_loop_runner(analyze_portfolio(portfolio, 1825, "5year")),
+                     bench_options["iterations"])
+    record("analyze_portfolio", result)
+
+
+def test_portfolio_factor_exposure(dataset, portfolio, record, bench_options):
+    result = measure(lambda: get_portfolio_factor_exposure(portfolio.tickers), bench_options["iterations"])
+    record("get_portfolio_factor_exposure", result)
+
+
+def test_real_asset_allocation(dataset, portfolio, record, bench_options):
+    result = measure(lambda: get_real_asset_allocation(portfolio.tickers), bench_options["iterations"])
+    record("get_real_asset_allocation", result)
+
+
+@pytest.mark.parametrize("route", HTTP_ROUTES)
+def test_http_route(dataset, route, record, bench_options):
+    """通过 ASGI 测试客户端端到端调用接口"""
+    client = TestClient(app)
+
+    def call():
+        response = client.get(route)
+        assert response.status_code == 200, response.text
+
+    result = measure(call, bench_options["iterations"])
+    record(f"GET {route.replace(BENCH_PORTFOLIO_ID, '{id}')}", result)
@@ -0,0 +1,13 @@
+"""
+单元测试配置
+
+运行（在 backend 目录下）:
+    python -m pytest tests -q
+"""
+
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
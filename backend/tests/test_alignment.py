@@ -0,0 +1,61 @@
+"""缺失数据对齐：晚上市的股票不应截断其他持仓的历史"""
+
+import asyncio
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services import analysis_service
+from app.utils.alignment import align_returns, portfolio_returns
+
+DAYS = 756
+IPO_DAYS = 60
+
+
+@pytest.fixture
+def histories(monkeypatch):
+    dates = pd.bdate_range("2021-01-04", periods=DAYS)
+    rng = np.random.default_rng(7)
+    prices = {
+        symbol: 100 * np.cumprod(1 + rng.normal(0.0004, 0.01, DAYS))
+        for symbol in ("S0000", "S0001", "S0002")
+    }
+    # S0000 只有最后 60 个交易日的数据
+    starts = {"S0000": DAYS - IPO_DAYS, "S0001": 0, "S0002": 0}
+
+    async def get_stock_history(ticker, days):
+        start = starts[ticker]
+        return [{"date": date.strftime("%Y-%m-%d"), "PRC": price}
+                for date, price in zip(dates[start:], prices[ticker][start:])]
+
+    monkeypatch.setattr(analysis_service, "get_stock_history_service", get_stock_history)
+    monkeypatch.setattr(analysis_service, "get_benchmark", lambda benchmark: None)
+    return dates
+
+
+@pytest.mark.parametrize("tickers", [
+    ["S0001", "S0002", "S0000"],
+    ["S0000", "S0001", "S0002"],
+], ids=["ipo-last", "ipo-first"])
+def test_late_ipo_keeps_full_history(histories, tickers):
+    data = asyncio.run(analysis_service._get_historical_data(tickers, DAYS * 2))
+
+    assert len(data) == DAYS
+    assert data.index.equals(histories)
+    assert data["S0000"].notna().sum() == IPO_DAYS
+    assert data[["S0001", "S0002"]].notna().all().all()
+
+    aligned = align_returns(data, analysis_service.BENCHMARK_COLUMN, policy="renormalize")
+    returns = portfolio_returns(aligned, [1 / 3] * 3, min_coverage=0.5)
+    assert returns.count() == DAYS - 1
+
+
+def test_expected_returns_use_each_symbols_history(histories):
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", FutureWarning)
+        expected = asyncio.run(analysis_service._estimate_expected_returns(["S0000", "S0001"], {}))
+
+    assert np.isfinite(expected).all()
+    assert expected.shape == (2,)